@@ -47,14 +47,19 @@ SUBCOMMAND_QUERY_IMPORT = "import"
 SUBCOMMAND_QUERY_RESULT = "result"
 
 COMMAND_DELETE = "delete"
+COMMAND_QUARANTINE = "quarantine"
 COMMANDS_ALL = (COMMAND_ANALYZE, COMMAND_EVAL, COMMAND_IMPORT,
                 COMMAND_QUERY, COMMAND_SYNC,
-                COMMAND_DELETE,)
+                COMMAND_DELETE, COMMAND_QUARANTINE)
 
 # available commands for delete
 SUBCOMMAND_DELETE_IMPORT = "import"
 SUBCOMMAND_DELETE_RESULT = "result"
 
+# available commands for quarantine
+SUBCOMMAND_QUARANTINE_LIST = "list"
+SUBCOMMAND_QUARANTINE_CLEAR = "clear"
+
 ############################################################
 # Symlink names                                            #
 ############################################################
@@ -80,6 +85,9 @@ SYMLINK_DELETE = SYMLINK_PREFIX + COMMAND_DELETE
 # symlink name for androlyze sync
 SYMLINK_SYNC = SYMLINK_PREFIX + COMMAND_SYNC
 
+# symlink name for androlyze quarantine
+SYMLINK_QUARANTINE = SYMLINK_PREFIX + COMMAND_QUARANTINE
+
 ############################################################
 # Cli Default Settings                                     #
 ############################################################
@@ -168,7 +176,10 @@ def __create_subparsers(parser, parents):
     dblyze_parser = subparser.add_parser(COMMAND_EVAL, conflict_handler='resolve',
                                        parents = parents, add_help = True, help = "Run scripts on the database")
 
-    return analyze_parser, import_parser, query_parser, delete_parser, sync_parser, dblyze_parser
+    quarantine_parser = subparser.add_parser(COMMAND_QUARANTINE, conflict_handler='resolve',
+                                             parents = parents, add_help = True, help = "List or clear the apks which repeatedly failed during the analysis")
+
+    return analyze_parser, import_parser, query_parser, delete_parser, sync_parser, dblyze_parser, quarantine_parser
 
     ############################################################
     #---  Parser setup
@@ -195,6 +206,8 @@ Will not import the apks into the import database!''')
     p.add_argument("--no-sort-code-size", "-nscs", action="store_true", help = "By default sort apks by code size (descending) -> Analyze bigger code first. Use this switch to disable this behavior")
     p.add_argument("--concurrency", type = int, help = "Number of workers to spawn. Only for parallel mode")
     p.add_argument("-si", "--send-id", action = "store_true", help = "Send id of apk file rather than actual file. Needs import with -cdb first! ")
+    analyze_parser.add_argument("-inc", "--incremental", action = "store_true", help = "Only run the scripts whose results (for the current script version) are not yet in the result database. Skip apks with all results available.")
+    analyze_parser.add_argument("-dd", "--dedup-dex", action = "store_true", help = "Run scripts which only depend on the .dex files only once for imported apks sharing the same .dex files (e.g. re-signed builds). The results are stored for each apk.")
 
     ############################################################
     #---  Parser setup import
@@ -242,6 +255,21 @@ def __setup_delete_parser(delete_parser, parents=[]):
     __setup_result_db_filter_args(del_res_parser)
     del_res_parser.add_argument("-nd", "--non-document", action="store_true", help="Signalize that the data is not a normal document. Meaning that it's not json data")
 
+    ############################################################
+    #---  Parser setup quarantine
+    ############################################################
+
+def __setup_quarantine_parser(quarantine_parser, parents=[]):
+    qsp = quarantine_parser.add_subparsers(dest=COMMAND_QUARANTINE, help="List or clear the entries of the quarantine database (see config file).")
+
+    list_parser = qsp.add_parser(SUBCOMMAND_QUARANTINE_LIST, parents=parents, help="List the recorded failures.")
+    __add_hashes_filter_option(list_parser)
+
+    clear_parser = qsp.add_parser(SUBCOMMAND_QUARANTINE_CLEAR, parents=parents, help="Release apks from the quarantine.")
+    cme = clear_parser.add_mutually_exclusive_group(required=True)
+    __add_hashes_filter_option(cme)
+    __setup_shared_args_db(cme)
+
 def __setup_shared_args_db(del_parser):
     del_parser.add_argument("--all", action="store_true", help="Select whole database.")
 
@@ -427,9 +455,9 @@ def __setup_parser(program_license, program_version_message, cmd=None):
                             parents=[shared_args_parser], conflict_handler='resolve')
 
     # if no symlink given, add the available commands as subparsers
-    analyze_parser, import_parser, query_parser, del_parser, sync_parser, dblyze_parser = 6 * [None]
+    analyze_parser, import_parser, query_parser, del_parser, sync_parser, dblyze_parser, quarantine_parser = 7 * [None]
     if not symlink_call:
-        analyze_parser, import_parser, query_parser, del_parser, sync_parser, dblyze_parser = __create_subparsers(parser, parents=[shared_args_parser])
+        analyze_parser, import_parser, query_parser, del_parser, sync_parser, dblyze_parser, quarantine_parser = __create_subparsers(parser, parents=[shared_args_parser])
 
     # otherwise set the respective parser as root parser
     if symlink_call:
@@ -445,6 +473,8 @@ def __setup_parser(program_license, program_version_message, cmd=None):
             sync_parser = parser
         elif cmd == COMMAND_EVAL:
             dblyze_parser = parser
+        elif cmd == COMMAND_QUARANTINE:
+            quarantine_parser = parser
 
     # setup subparsers
     if analyze_parser is not None:
@@ -457,6 +487,8 @@ def __setup_parser(program_license, program_version_message, cmd=None):
         __setup_sync_parser(sync_parser)
     if dblyze_parser is not None:
         __setup_dblyze_parser(dblyze_parser)
+    if quarantine_parser is not None:
+        __setup_quarantine_parser(quarantine_parser)
 
     if query_parser is not None:
         query_import_parser, query_results_parser = __setup_query_parser(query_parser)
@@ -485,6 +517,8 @@ def get_cmd_from_symlink_name(symlink_name):
         cmd = COMMAND_DELETE
     elif symlink_name.endswith(SYMLINK_SYNC):
         cmd = COMMAND_SYNC
+    elif symlink_name.endswith(SYMLINK_QUARANTINE):
+        cmd = COMMAND_QUARANTINE
 
     return cmd
 
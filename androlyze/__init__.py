@@ -353,7 +353,7 @@ ANALYZE_MODE_DISTRIBUTED = 'distributed'
 
 def action_analyze(storage, script_list, apks_or_paths = None,
                    mode = ANALYZE_MODE_PARALLEL, concurrency = None,
-                   serialize_apks = True
+                   serialize_apks = True, incremental = False, dedup_dex = False
                    ):
     '''
     Analyze the `apks_or_paths` with the given `script_list`.
@@ -375,14 +375,20 @@ def action_analyze(storage, script_list, apks_or_paths = None,
         If true, serialize .apk .
         Otherwise id (hash) of the apk will be send and fetched by the worker from the result db.
         Be sure to import the apks to the result db first!
+    incremental : bool, optional (default is False)
+        If true, only run the scripts whose results (for the current script version)
+        are not yet in the result database. Apks with all results available will be skipped.
+    dedup_dex : bool, optional (default is False)
+        If true, run the dex only scripts only once for imported apks sharing the same .dex files.
+        See :py:meth:`.AndroScript.is_dex_only`.
     '''
-    analyzer = create_analyzer(storage, script_list, apks_or_paths, mode, concurrency, serialize_apks)
+    analyzer = create_analyzer(storage, script_list, apks_or_paths, mode, concurrency, serialize_apks, incremental, dedup_dex)
     if analyzer is not None:
         return run_analysis(analyzer)
 
 def create_analyzer(storage, script_list, apks_or_paths = None,
                    mode = ANALYZE_MODE_PARALLEL, concurrency = None,
-                   serialize_apks = True
+                   serialize_apks = True, incremental = False, dedup_dex = False
                    ):
     '''
     Create the analyzer only.
@@ -404,6 +410,12 @@ def create_analyzer(storage, script_list, apks_or_paths = None,
         If true, serialize .apk .
         Otherwise id (hash) of the apk will be send and fetched by the worker from the result db.
         Be sure to import the apks to the result db first!
+    incremental : bool, optional (default is False)
+        If true, only run the scripts whose results (for the current script version)
+        are not yet in the result database. Apks with all results available will be skipped.
+    dedup_dex : bool, optional (default is False)
+        If true, run the dex only scripts only once for imported apks sharing the same .dex files.
+        See :py:meth:`.AndroScript.is_dex_only`.
     '''
     from androlyze.model.script import ScriptUtil
     from androlyze.analyze.exception import AndroScriptError
@@ -417,6 +429,9 @@ def create_analyzer(storage, script_list, apks_or_paths = None,
             log.warn("No scripts supplied!")
             return
 
+        # all scripts a script depends on have to be loaded
+        ScriptUtil.check_dependencies(instantiated_scripts)
+
         # get hashes for `AndroScript`s so that we can set the hash directly next time we instantiate the script
         script_hashes = [s.hash for s in instantiated_scripts]
         min_script_needs = ScriptUtil.get_minimum_script_options(instantiated_scripts)
@@ -425,6 +440,23 @@ def create_analyzer(storage, script_list, apks_or_paths = None,
         clilog.info('Loaded scripts:\n%s', '\n'.join((str(s) for s in instantiated_scripts)))
         log.info(ScriptUtil.androscript_options_descr(instantiated_scripts))
 
+        script_filter = None
+        if apks_or_paths and incremental:
+            apks_or_paths, script_filter = incremental_apks_n_script_filter(storage, apks_or_paths, instantiated_scripts)
+
+        # before the deduplication, otherwise the duplicates of a skipped apk are lost
+        if apks_or_paths:
+            apks_or_paths = quarantine_apks(storage, apks_or_paths, instantiated_scripts)
+
+        dex_duplicates = None
+        if apks_or_paths and dedup_dex:
+            apks_or_paths, script_filter, dex_duplicates = dedup_dex_apks_n_script_filter(apks_or_paths, instantiated_scripts, script_filter)
+
+        if script_filter:
+            # the filtered scripts still need the scripts they depend on
+            script_filter = dict((apk_hash, ScriptUtil.add_dependencies(script_names, instantiated_scripts))
+                                 for apk_hash, script_names in script_filter.items())
+
         if apks_or_paths:
 
             def create_analyzer():
@@ -437,15 +469,15 @@ def create_analyzer(storage, script_list, apks_or_paths = None,
                 # normal analyzer
                 if mode == ANALYZE_MODE_NON_PARALLEL:
                     from androlyze.analyze.Analyzer import Analyzer
-                    analyzer = Analyzer(*args)
+                    analyzer = Analyzer(*args, script_filter = script_filter, dex_duplicates = dex_duplicates)
                 # use parallel analyzer
                 elif mode == ANALYZE_MODE_PARALLEL:
                     from androlyze.analyze.parallel.ParallelAnalyzer import ParallelAnalyzer
-                    analyzer = ParallelAnalyzer(*args, concurrency = concurrency)
+                    analyzer = ParallelAnalyzer(*args, concurrency = concurrency, script_filter = script_filter, dex_duplicates = dex_duplicates)
                 # use distributed one
                 elif mode == ANALYZE_MODE_DISTRIBUTED:
                     from androlyze.analyze.distributed.DistributedAnalyzer import DistributedAnalyzer
-                    analyzer = DistributedAnalyzer(*args, concurrency = concurrency, serialize_apks = serialize_apks)
+                    analyzer = DistributedAnalyzer(*args, concurrency = concurrency, serialize_apks = serialize_apks, script_filter = script_filter, dex_duplicates = dex_duplicates)
 
                 return analyzer
 
@@ -461,6 +493,163 @@ def create_analyzer(storage, script_list, apks_or_paths = None,
     except Exception as e:
         log.exception(e)
 
+def incremental_apks_n_script_filter(storage, apks_or_paths, androscripts):
+    '''
+    Drop the apks for which the results of all `androscripts` are already in the result database
+    and determine which scripts still have to be run for the others.
+
+    Paths will be hashed to get the id of the results.
+
+    Parameters
+    ----------
+    storage : RedundantStorage
+        The store to use.
+    apks_or_paths: list<str> or list<Apk>
+    androscripts : list<AndroScript>
+        Instantiated scripts.
+
+    Returns
+    -------
+    tuple<list<str> or list<Apk>, dict<str, list<str>>>
+        The apks (or paths) to analyze and the script filter.
+        See :py:method:`.BaseAnalyzer.script_filter`.
+
+    Raises
+    ------
+    DatabaseLoadException
+    '''
+    from androlyze.analyze import AnalyzeUtil
+
+    clilog.info("Incremental analysis: looking for existing results ...")
+    apks_n_hashes = [(apk_or_path, AnalyzeUtil.get_apk_hash(apk_or_path)) for apk_or_path in apks_or_paths]
+    apk_hashes = [apk_hash for _, apk_hash in apks_n_hashes if apk_hash is not None]
+
+    missing_scripts = AnalyzeUtil.get_missing_scripts(storage.result_db_storage, apk_hashes, androscripts)
+
+    apks_or_paths = []
+    script_filter = {}
+    cnt_all_scripts = len(androscripts)
+    for apk_or_path, apk_hash in apks_n_hashes:
+        # could not be hashed -> let the analyzer log the error
+        if apk_hash is None:
+            apks_or_paths.append(apk_or_path)
+            continue
+
+        scripts = missing_scripts[apk_hash]
+        if scripts:
+            apks_or_paths.append(apk_or_path)
+            # only need to filter if some results are available
+            if len(scripts) < cnt_all_scripts:
+                script_filter[apk_hash] = scripts
+
+    clilog.info("Incremental analysis: skipping %d of %d apks, %d apks will be analyzed partially",
+                len(apks_n_hashes) - len(apks_or_paths), len(apks_n_hashes), len(script_filter))
+
+    return apks_or_paths, script_filter
+
+def quarantine_apks(storage, apks_or_paths, androscripts):
+    '''
+    Skip or deprioritize (analyze last) the apks which are quarantined for the `androscripts`
+    depending on the policy in the settings. See :py:class:`.QuarantineStorage`.
+
+    `Apk`s are matched by their hash, paths by the paths of the quarantined apks in the import database,
+    so no apk has to be read and hashed. Paths which have not been imported will not be matched.
+
+    Parameters
+    ----------
+    storage : RedundantStorage
+    apks_or_paths: list<str> or list<Apk>
+    androscripts : list<AndroScript>
+        Instantiated scripts.
+
+    Returns
+    -------
+    list<str> or list<Apk>
+        The apks (or paths) to analyze.
+    '''
+    from androlyze.analyze import AnalyzeUtil
+    from androlyze.model.android.apk.Apk import Apk
+    from androlyze.storage.exception import DatabaseLoadException
+    from androlyze.storage.importdb.exception import ImportQueryError
+    from androlyze.storage.quarantine.QuarantineStorage import get_quarantine, get_quarantine_settings, \
+        POLICY_OFF, POLICY_SKIP
+
+    _, policy, _ = get_quarantine_settings()
+    quarantine = get_quarantine()
+    if quarantine is None or policy == POLICY_OFF:
+        return apks_or_paths
+
+    try:
+        quarantined = quarantine.get_quarantined([AnalyzeUtil.script_name(s) for s in androscripts])
+    except DatabaseLoadException as e:
+        log.warn(e)
+        return apks_or_paths
+
+    if not quarantined:
+        return apks_or_paths
+
+    apks_or_paths = list(apks_or_paths)
+
+    # paths of the quarantined apks (if imported)
+    quarantined_paths = set()
+    if not all(isinstance(apk_or_path, Apk) for apk_or_path in apks_or_paths):
+        try:
+            quarantined_paths = set(os.path.abspath(path) for path in storage.get_apk_paths(hashes = quarantined.keys()))
+        except ImportQueryError as e:
+            log.warn(e)
+
+    healthy, poisoned = [], []
+    for apk_or_path in apks_or_paths:
+        if isinstance(apk_or_path, Apk):
+            is_quarantined = apk_or_path.hash in quarantined
+        else:
+            is_quarantined = os.path.abspath(apk_or_path) in quarantined_paths
+        if is_quarantined:
+            poisoned.append(apk_or_path)
+        else:
+            healthy.append(apk_or_path)
+
+    if poisoned:
+        action = "skipping" if policy == POLICY_SKIP else "analyzing them last"
+        clilog.info("Quarantine: %d of %d apks are quarantined, %s (see %s)", len(poisoned), len(apks_or_paths), action, quarantine)
+        log.debug("Quarantined apks:\n%s", '\n'.join(str(apk_or_path) for apk_or_path in poisoned))
+
+    if policy == POLICY_SKIP:
+        return healthy
+    return healthy + poisoned
+
+def dedup_dex_apks_n_script_filter(apks_or_paths, androscripts, script_filter = None):
+    '''
+    Analyze apks sharing the same .dex files only once with the dex only scripts
+    and store the results for each of them.
+
+    Only works for imported apks (the dex hash is recorded at import time).
+
+    Parameters
+    ----------
+    apks_or_paths: list<str> or list<Apk>
+    androscripts : list<AndroScript>
+        Instantiated scripts.
+    script_filter : dict<str, list<str>>, optional (default is None)
+        See :py:method:`.BaseAnalyzer.script_filter`.
+
+    Returns
+    -------
+    tuple<list<str> or list<Apk>, dict<str, list<str>>, dict<str, list<Apk>>>
+        The apks (or paths) to analyze, the script filter and the dex duplicates.
+        See :py:method:`.AnalyzeUtil.dedup_dex_script_filter`.
+    '''
+    from androlyze.analyze import AnalyzeUtil
+
+    apks_or_paths = list(apks_or_paths)
+    cnt_apks = len(apks_or_paths)
+    apks_or_paths, script_filter, dex_duplicates = AnalyzeUtil.dedup_dex_script_filter(apks_or_paths, androscripts, script_filter)
+
+    clilog.info("Dex deduplication: %d apks share their .dex files with another apk, %d apks will not be opened at all",
+                sum(len(dups) for dups in dex_duplicates.values()), cnt_apks - len(apks_or_paths))
+
+    return apks_or_paths, script_filter, dex_duplicates
+
 def run_analysis(analyzer):
     ''' Run the analysis with the `analyzer`.
 
@@ -575,6 +764,72 @@ def action_delete_apks_res(storage,
 
     return storage.delete_results(where, non_document, **kwargs)
 
+############################################################
+#---Quarantine
+############################################################
+
+def action_quarantine_list(quarantine, hashes = None):
+    '''
+    Describe the failures recorded in the quarantine (most recent first).
+
+    Parameters
+    ----------
+    quarantine : QuarantineStorage
+    hashes : iterable<str>, optional (default is None)
+        Only list the entries of these apks. Otherwise all.
+
+    Returns
+    -------
+    list<str>
+
+    Raises
+    ------
+    DatabaseLoadException
+    '''
+    from androlyze.storage.quarantine.QuarantineStorage import TABLE_QUARANTINE_KEY_HASH, \
+        TABLE_QUARANTINE_KEY_FAILURE, TABLE_QUARANTINE_KEY_COUNT, TABLE_QUARANTINE_KEY_SCRIPTS, \
+        TABLE_QUARANTINE_KEY_LAST_DATE, TABLE_QUARANTINE_KEY_DETAILS
+
+    res = []
+    for entry in quarantine.get_entries(hashes):
+        quarantined = entry[TABLE_QUARANTINE_KEY_COUNT] >= quarantine.threshold
+        res.append('%s: %s x %s%s (last: %s, %s)\n\tscripts: %s' % (entry[TABLE_QUARANTINE_KEY_HASH],
+                                                               entry[TABLE_QUARANTINE_KEY_COUNT],
+                                                               entry[TABLE_QUARANTINE_KEY_FAILURE],
+                                                               ' [quarantined]' if quarantined else '',
+                                                               entry[TABLE_QUARANTINE_KEY_LAST_DATE],
+                                                               entry[TABLE_QUARANTINE_KEY_DETAILS],
+                                                               ', '.join(entry[TABLE_QUARANTINE_KEY_SCRIPTS])))
+    return res
+
+def action_quarantine_clear(quarantine, hashes = None, whole_db = False):
+    '''
+    Release apks from the quarantine (e.g. after a fix in androguard).
+
+    Parameters
+    ----------
+    quarantine : QuarantineStorage
+    hashes : iterable<str>, optional (default is None)
+    whole_db : bool, optional (default is False)
+        If true, clear all entries (`hashes` will be ignored).
+
+    Returns
+    -------
+    int
+        Number of deleted entries.
+
+    Raises
+    ------
+    ValueError
+        If neither `hashes` nor `whole_db` given.
+    DatabaseDeleteException
+    '''
+    if whole_db:
+        return quarantine.clear()
+    if not hashes:
+        raise ValueError("Neither hashes specified nor `whole_db` set!")
+    return quarantine.clear(hashes)
+
 ############################################################
 #---Sync
 ############################################################
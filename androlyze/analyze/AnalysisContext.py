@@ -0,0 +1,646 @@
+# encoding: utf-8
+
+__author__ = "Nils Tobias Schmidt"
+__email__ = "schmidt89 at informatik.uni-marburg.de"
+
+from collections import OrderedDict
+import os
+import sys
+from time import time
+
+from androguard.core.analysis.analysis import uVMAnalysis
+from androguard.core.analysis.ganalysis import GVMAnalysis
+from androguard.core.bytecodes.dvm import DalvikVMFormat
+from androguard.misc import RunDecompiler
+from androlyze.analyze.exception import DexError
+from androlyze.log.Log import log
+from androlyze.util.Util import get_rss
+
+# names of the androguard analysis phases
+PHASE_DEX_READ = "dex read"
+PHASE_DALVIK_VM_FORMAT = "DalvikVMFormat"
+PHASE_VM_ANALYSIS = "uVMAnalysis"
+PHASE_GVM_ANALYSIS = "GVMAnalysis"
+PHASE_DECOMPILER = "decompiler"
+PHASE_XREF = "xref"
+PHASE_DREF = "dref"
+PHASE_CACHE_LOAD = "cache load"
+PHASE_CACHE_STORE = "cache store"
+
+# androguard objects are deeply nested (needed to pickle them)
+PICKLE_RECURSION_LIMIT = 50000
+
+# methods working with indices (or returning per .dex objects) which cannot be merged
+# the merged view calls them on classes.dex only,
+# use :py:meth:`.MergedAnalysisObject.get_part_for` to get the part of the .dex file
+UNMERGEABLE_METHODS = frozenset(["get_method_by_idx", "get_class_manager",
+                                 "get_cm_field", "get_cm_method", "get_cm_type", "get_cm_string"])
+
+class LazyAnalysisObject(object):
+    ''' Proxy for an androguard analysis object that will be created
+    the first time an attribute of it is accessed.
+
+    Only forwards the attribute access (no special methods, no `isinstance`),
+    so it is only handed to androguard (e.g. the decompiler), never to the scripts.
+    '''
+
+    def __init__(self, factory):
+        '''
+        Parameters
+        ----------
+        factory : function
+            Function without arguments that returns the actual object.
+        '''
+        # bypass own attribute lookup
+        object.__setattr__(self, "_factory", factory)
+
+    def __getattr__(self, name):
+        return getattr(self._factory(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._factory(), name, value)
+
+    def __repr__(self):
+        # don't create the object just for its representation
+        return '%s(%s)' % (self.__class__.__name__, getattr(self._factory, "__name__", self._factory))
+
+class MergedAnalysisObject(object):
+    ''' Merged view on the analysis objects of all .dex files of a multidex apk.
+
+    Calling a method calls it on every part and merges the results:
+    Lists get concatenated, dicts merged (lists for the same key concatenated, numbers summed up),
+    numbers (e.g. counts and sizes) summed up, bools or-ed
+    and for everything else the first result not being None is returned.
+    If the first argument of the call belongs to a specific .dex file (e.g. an `EncodedMethod`),
+    only the part for that .dex file is called.
+    The view remembers the .dex file of the objects in the merged results,
+    so that they can be mapped back to it (see :py:meth:`.get_part_for`).
+    Methods working with indices (see `UNMERGEABLE_METHODS`) have to be called on the part of the .dex file
+    the index belongs to, the merged view only calls them on classes.dex (and logs a warning).
+
+    Other attributes which are objects again are merged the same way,
+    primitive values are taken from the classes.dex part.
+    '''
+
+    def __init__(self, parts, class_managers, part_indices = None):
+        '''
+        Parameters
+        ----------
+        parts : list<object>
+            The objects for each .dex file (classes.dex first).
+        class_managers : list<ClassManager>
+            The `ClassManager` of the .dex file for each part.
+        part_indices : dict<int, tuple<object, int>>, optional (default is None)
+            Shared with the nested merged views.
+            See :py:meth:`.tag`.
+        '''
+        self._parts = parts
+        self._class_managers = class_managers
+        # id of returned object -> (object, index of its .dex file)
+        # the object is referenced to keep its id unique
+        # (not stored in the object itself, because it would end up in the `DexAnalysisCache`)
+        self._part_indices = {} if part_indices is None else part_indices
+        # unmergeable methods already warned about
+        self._warned = set()
+
+    def __repr__(self):
+        return '%s(%s)' % (self.__class__.__name__, self._parts)
+
+    def get_parts(self):
+        ''' Get the objects for each .dex file (classes.dex first) '''
+        return self._parts
+
+    def get_part_index(self, obj):
+        ''' Get the index of the .dex file `obj` belongs to.
+
+        Parameters
+        ----------
+        obj : object
+            Object returned by a merged call (e.g. a `PathP`) or an object having a `ClassManager` (e.g. an `EncodedMethod`).
+
+        Returns
+        -------
+        int
+        None
+            If unknown.
+        '''
+        obj_idx = self._part_indices.get(id(obj))
+        if obj_idx is not None and obj_idx[0] is obj:
+            return obj_idx[1]
+        class_manager = getattr(obj, "CM", None)
+        if class_manager is not None and class_manager in self._class_managers:
+            return self._class_managers.index(class_manager)
+        return None
+
+    def get_part_for(self, obj):
+        ''' Get the object of the .dex file `obj` belongs to (see :py:meth:`.get_part_index`).
+
+        Raises
+        ------
+        ValueError
+            If the .dex file of `obj` is unknown.
+        '''
+        idx = self.get_part_index(obj)
+        if idx is None:
+            raise ValueError("%r does not belong to a known .dex file" % obj)
+        return self._parts[idx]
+
+    def __getattr__(self, name):
+        # don't merge special attributes (e.g. needed for pickling)
+        if name.startswith('__'):
+            raise AttributeError(name)
+
+        values = [getattr(part, name) for part in self._parts]
+        first = values[0]
+
+        if callable(first):
+            def merged_method(*args, **kwargs):
+                # route call to the part of the .dex file the argument belongs to
+                if args:
+                    idx = self.get_part_index(args[0])
+                    if idx is not None:
+                        return self.tag(values[idx](*args, **kwargs), idx)
+                if name in UNMERGEABLE_METHODS:
+                    if name not in self._warned:
+                        self._warned.add(name)
+                        log.warn("%s cannot be merged for multidex apps, using classes.dex only (call it on the part of the .dex file, see get_part_for)" % name)
+                    return self.tag(values[0](*args, **kwargs), 0)
+                return self.merge([self.tag(method(*args, **kwargs), idx) for idx, method in enumerate(values)])
+            merged_method.__name__ = name
+            return merged_method
+
+        if isinstance(first, (list, dict)):
+            return self.merge(values)
+
+        # objects which are no primitives
+        if hasattr(first, "__dict__") and not isinstance(first, type):
+            return MergedAnalysisObject(values, self._class_managers, self._part_indices)
+
+        return first
+
+    def tag(self, value, idx):
+        ''' Remember the index of the .dex file for the objects in `value` (the result of the part `idx`).
+        Objects already tagged (by a nested merged view) and primitives are left untouched. '''
+        part_indices = self._part_indices
+        def tag_obj(obj):
+            if hasattr(obj, "__dict__") and not isinstance(obj, type) and id(obj) not in part_indices:
+                part_indices[id(obj)] = (obj, idx)
+
+        if isinstance(value, list):
+            for v in value:
+                tag_obj(v)
+        elif isinstance(value, dict):
+            for v in value.values():
+                if isinstance(v, list):
+                    for elem in v:
+                        tag_obj(elem)
+                else:
+                    tag_obj(v)
+        else:
+            tag_obj(value)
+        return value
+
+    @staticmethod
+    def merge(values):
+        ''' Merge the results of the parts. See class doc '''
+        values = [v for v in values if v is not None]
+        if not values:
+            return None
+
+        first = values[0]
+        if isinstance(first, list):
+            res = []
+            for v in values:
+                res.extend(v)
+            return res
+
+        if isinstance(first, dict):
+            res = first.__class__()
+            for d in values:
+                for k, v in d.items():
+                    if isinstance(v, list) and isinstance(res.get(k), list):
+                        res[k] = res[k] + v
+                    elif _is_number(v) and _is_number(res.get(k)):
+                        res[k] = res[k] + v
+                    elif k not in res:
+                        res[k] = v
+            return res
+
+        if isinstance(first, bool):
+            return any(values)
+
+        if _is_number(first):
+            return sum(values)
+
+        return first
+
+def _is_number(value):
+    ''' Check if `value` is a number (counts, sizes, ...) but no bool '''
+    return isinstance(value, (int, long, float)) and not isinstance(value, bool)
+
+class AnalysisContext(object):
+    '''
+    Holds the androguard analysis objects for the .dex files of one apk.
+
+    The objects (and the .dex files) will only be created (read) before the first script needing them runs.
+    So if no script needs e.g. the `GVMAnalysis`, nobody pays for its creation.
+
+    Multidex apps (classes.dex, classes2.dex, ...) are supported.
+    Each .dex file gets its own analysis objects, the scripts get a `MergedAnalysisObject` view on them.
+
+    The time each phase took will be recorded in `timings`, the RSS after each phase in `phase_rss`.
+
+    If a `DexAnalysisCache` is given, the objects will be loaded from it (if available)
+    instead of parsing the .dex files again. Use :py:meth:`.store_in_cache` to fill it.
+    '''
+
+    def __init__(self, filepath_or_raw, raw = False, decompiler = "dad", cache = None, cache_key = None):
+        '''
+        Parameters
+        ----------
+        filepath_or_raw : path to file or raw data or list of them (multidex)
+             Set raw to True if `filepath_or_raw` is raw data.
+             Can also be a function without arguments returning the list of raw data,
+             which will be called the first time the .dex files are needed (implies `raw`).
+        raw : bool, optional (default is False)
+        decompiler : str, optional (default is "dad")
+        cache : DexAnalysisCache, optional (default is None)
+            Cache for the analysis objects.
+        cache_key : str or function, optional (default is None)
+            Key of the entry in the `cache`. See :py:meth:`DexAnalysisCache.gen_key`.
+            A function gets the .dex files and will only be called on the first cache lookup.
+        '''
+        self.__dex_loader = None
+        if callable(filepath_or_raw):
+            self.__dex_loader, filepath_or_raw, raw = filepath_or_raw, [], True
+        elif not isinstance(filepath_or_raw, (list, tuple)):
+            filepath_or_raw = [filepath_or_raw]
+        self.__dex_list = filepath_or_raw
+        self.__raw = raw
+        self.__decompiler = decompiler
+
+        self.__cache = cache
+        self.__cache_key = cache_key
+        # only try once to load from the cache
+        self.__cache_lookup_done = cache is None or cache_key is None
+        # something has been created which is not in the cache yet
+        self.__cache_dirty = False
+
+        # analysis objects for each .dex file
+        self.__dalvik_vm_formats = None
+        self.__vm_analyses = None
+        self.__gvm_analyses = None
+
+        # the (merged) objects passed to the scripts
+        self.__dalvik_vm_format = None
+        self.__vm_analysis = None
+        self.__gvm_analysis = None
+
+        self.__xref_created = False
+        self.__dref_created = False
+        self.__decompiler_set_up = False
+
+        self.__timings = OrderedDict()
+        self.__phase_rss = OrderedDict()
+
+        # objects shared by the scripts for this apk
+        self.__memo = {}
+
+    def get_timings(self):
+        return self.__timings
+
+    def get_phase_rss(self):
+        return self.__phase_rss
+
+    def get_memo(self):
+        return self.__memo
+
+    def get_cnt_dex(self):
+        return len(self.__dex_list)
+
+    timings = property(get_timings, None, None, "OrderedDict<str, float> : Time in seconds each analysis phase took. See `PHASE_` prefixed variables.")
+    phase_rss = property(get_phase_rss, None, None, "OrderedDict<str, int> : RSS (KB) of the process after each analysis phase (the last run of it). See `PHASE_` prefixed variables.")
+    cnt_dex = property(get_cnt_dex, None, None, "int : Number of .dex files (0 if they have not been read, because no script needed them).")
+    memo = property(get_memo, None, None, "dict : Results computed by one script which can be reused by the other scripts for the same apk (e.g. see :py:func:`AnaUtil.get_string_hits`).")
+
+    def get_total_time(self):
+        ''' Get the time in seconds all analysis phases took yet '''
+        return sum(self.timings.values())
+
+    def __timeit(self, phase, func, *args, **kwargs):
+        ''' Run the `func` and record the time for the `phase`.
+
+        Raises
+        ------
+        DexError
+            If androguard caused an error.
+        '''
+        start = time()
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            # androguard caused error -> propagate as DexError
+            raise DexError(caused_by = e), None, sys.exc_info()[2]
+        finally:
+            self.timings[phase] = self.timings.get(phase, 0) + time() - start
+            self.phase_rss[phase] = get_rss(os.getpid())
+
+    def __merge(self, parts):
+        ''' Get the object for the scripts (only merge for multidex) '''
+        if len(parts) == 1:
+            return parts[0]
+        return MergedAnalysisObject(parts, [dvm.CM for dvm in self.__dalvik_vm_formats])
+
+    ############################################################
+    #---Analysis objects (created on demand)
+    ############################################################
+
+    def get_dalvik_vm_formats(self):
+        '''
+        Get the `DalvikVMFormat` for each .dex file.
+
+        Raises
+        ------
+        DexError
+            Also if the apk has no .dex file.
+        '''
+        if self.__dex_loader is not None:
+            self.__dex_list = self.__timeit(PHASE_DEX_READ, self.__dex_loader)
+            self.__dex_loader = None
+
+        if not self.__dex_list:
+            raise DexError(msg = "No .dex file to analyze")
+
+        if self.__dalvik_vm_formats is None:
+            self.__load_from_cache()
+
+        if self.__dalvik_vm_formats is None:
+            dex_list = self.__dex_list
+            if not self.__raw:
+                def read_dex():
+                    res = []
+                    for dex in dex_list:
+                        with open(dex, "rb") as f:
+                            res.append(f.read())
+                    return res
+                dex_list = self.__timeit(PHASE_DEX_READ, read_dex)
+
+            self.__dalvik_vm_formats = self.__timeit(PHASE_DALVIK_VM_FORMAT, map, DalvikVMFormat, dex_list)
+            self.__cache_dirty = True
+
+        return self.__dalvik_vm_formats
+
+    def get_vm_analyses(self):
+        '''
+        Get the `VMAnalysis` for each .dex file.
+
+        Raises
+        ------
+        DexError
+        '''
+        if self.__vm_analyses is None:
+            dalvik_vm_formats = self.get_dalvik_vm_formats()
+            self.__vm_analyses = self.__timeit(PHASE_VM_ANALYSIS, map, uVMAnalysis, dalvik_vm_formats)
+            for dvm, vm_analysis in zip(dalvik_vm_formats, self.__vm_analyses):
+                dvm.set_vmanalysis(vm_analysis)
+            self.__cache_dirty = True
+
+        return self.__vm_analyses
+
+    def get_gvm_analyses(self):
+        '''
+        Get the `GVMAnalysis` for each .dex file.
+
+        Raises
+        ------
+        DexError
+        '''
+        if self.__gvm_analyses is None:
+            vm_analyses = self.get_vm_analyses()
+            self.__gvm_analyses = self.__timeit(PHASE_GVM_ANALYSIS, map, lambda vm_analysis: GVMAnalysis(vm_analysis, None), vm_analyses)
+            for dvm, gvm_analysis in zip(self.get_dalvik_vm_formats(), self.__gvm_analyses):
+                dvm.set_gvmanalysis(gvm_analysis)
+            self.__cache_dirty = True
+
+        return self.__gvm_analyses
+
+    def get_dalvik_vm_format(self):
+        '''
+        Raises
+        ------
+        DexError
+        '''
+        if self.__dalvik_vm_format is None:
+            self.__dalvik_vm_format = self.__merge(self.get_dalvik_vm_formats())
+        return self.__dalvik_vm_format
+
+    def get_vm_analysis(self):
+        '''
+        Raises
+        ------
+        DexError
+        '''
+        if self.__vm_analysis is None:
+            self.__vm_analysis = self.__merge(self.get_vm_analyses())
+        return self.__vm_analysis
+
+    def get_gvm_analysis(self):
+        '''
+        Raises
+        ------
+        DexError
+        '''
+        if self.__gvm_analysis is None:
+            self.__gvm_analysis = self.__merge(self.get_gvm_analyses())
+        return self.__gvm_analysis
+
+    dalvik_vm_format = property(get_dalvik_vm_format, None, None, "DalvikVMFormat : Parsed .dex file(s) (created on first access)")
+    vm_analysis = property(get_vm_analysis, None, None, "uVMAnalysis : Dex analyzer (created on first access)")
+    gvm_analysis = property(get_gvm_analysis, None, None, "GVMAnalysis (created on first access)")
+
+    def create_xref(self):
+        ''' Create the cross references (only once).
+        The `GVMAnalysis` will be created if not already done.
+
+        Raises
+        ------
+        DexError
+        '''
+        if not self.__xref_created:
+            self.get_gvm_analyses()
+            for dvm in self.get_dalvik_vm_formats():
+                # we optimize through not exporting the references into the python objects
+                self.__timeit(PHASE_XREF, dvm.create_xref, python_export = False)
+            self.__xref_created = True
+            self.__cache_dirty = True
+
+    def create_dref(self):
+        ''' Create the data references (only once).
+        The `GVMAnalysis` will be created if not already done.
+
+        Raises
+        ------
+        DexError
+        '''
+        if not self.__dref_created:
+            self.get_gvm_analyses()
+            for dvm in self.get_dalvik_vm_formats():
+                self.__timeit(PHASE_DREF, dvm.create_dref, python_export = False)
+            self.__dref_created = True
+            self.__cache_dirty = True
+
+    def setup_decompiler(self):
+        ''' Set up the decompiler for the `DalvikVMFormat` (only once).
+
+        Raises
+        ------
+        DexError
+        '''
+        if not self.__decompiler_set_up:
+            for idx, dvm in enumerate(self.get_dalvik_vm_formats()):
+                # the decompiler uses the `VMAnalysis` only if a method gets decompiled
+                lazy_vm_analysis = LazyAnalysisObject(lambda idx = idx: self.get_vm_analyses()[idx])
+                self.__timeit(PHASE_DECOMPILER, RunDecompiler, dvm, lazy_vm_analysis, self.__decompiler)
+            self.__decompiler_set_up = True
+
+    ############################################################
+    #---Cache
+    ############################################################
+
+    def __load_from_cache(self):
+        ''' Load the analysis objects from the cache (only tried once) '''
+        if not self.__cache_lookup_done:
+            self.__cache_lookup_done = True
+            start = time()
+            if callable(self.__cache_key):
+                self.__cache_key = self.__cache_key(self.__dex_list)
+            entry = self.__cache.get(self.__cache_key)
+            self.timings[PHASE_CACHE_LOAD] = time() - start
+            self.phase_rss[PHASE_CACHE_LOAD] = get_rss(os.getpid())
+
+            if entry is not None:
+                self.__dalvik_vm_formats, self.__vm_analyses, self.__gvm_analyses, self.__xref_created, self.__dref_created = entry
+
+    def store_in_cache(self):
+        ''' Store the analysis objects in the cache if something has been created
+        that is not already cached (the cache has been looked up then).
+
+        The decompiler will not be stored.
+
+        Returns
+        -------
+        bool
+            If the objects have been stored.
+        '''
+        if self.__cache is None or self.__cache_key is None or not self.__cache_dirty:
+            return False
+
+        dalvik_vm_formats = self.__dalvik_vm_formats
+        decompilers = None
+        if self.__decompiler_set_up:
+            # the decompiler references the lazy proxies and cannot be pickled
+            decompilers = [dvm.CM.get_decompiler() for dvm in dalvik_vm_formats]
+            for dvm in dalvik_vm_formats:
+                dvm.set_decompiler(None)
+
+        try:
+            entry = dalvik_vm_formats, self.__vm_analyses, self.__gvm_analyses, self.__xref_created, self.__dref_created
+            start = time()
+            stored = self.__cache.put(self.__cache_key, entry)
+            self.timings[PHASE_CACHE_STORE] = time() - start
+            self.phase_rss[PHASE_CACHE_STORE] = get_rss(os.getpid())
+            if stored:
+                self.__cache_dirty = False
+            return stored
+        finally:
+            if decompilers is not None:
+                for dvm, decompiler in zip(dalvik_vm_formats, decompilers):
+                    dvm.set_decompiler(decompiler)
+
+    ############################################################
+    #---Script arguments
+    ############################################################
+
+    def script_args(self, min_script_needs):
+        ''' Get the analysis objects which will be passed to `AndroScript.analyze`
+        (created now if not already done).
+
+        Objects not needed will be None (like before).
+
+        Parameters
+        ----------
+        min_script_needs : tuple<bool>
+            See :py:meth:`ScriptUtil.get_minimum_script_options`
+
+        Returns
+        -------
+        tuple<DalvikVMFormat, VMAnalysis, GVMAnalysis>
+
+        Raises
+        ------
+        DexError
+        '''
+        needs_dalvik_vm_format, needs_vm_analysis, needs_gvm_analysis, needs_xref, needs_dref, needs_decompiler = min_script_needs
+        cross_ref = needs_xref or needs_dref
+        # every requirement implies the need for the `dalvik_vm_format`
+        needs_dalvik_vm_format = any((needs_dalvik_vm_format, needs_vm_analysis, needs_gvm_analysis, cross_ref, needs_decompiler))
+
+        dalvik_vm_format, vm_analysis, gvm_analysis = None, None, None
+        if needs_dalvik_vm_format:
+            dalvik_vm_format = self.get_dalvik_vm_format()
+        if needs_vm_analysis or needs_gvm_analysis or cross_ref or needs_decompiler:
+            vm_analysis = self.get_vm_analysis()
+        if needs_gvm_analysis or cross_ref:
+            gvm_analysis = self.get_gvm_analysis()
+
+        return dalvik_vm_format, vm_analysis, gvm_analysis
+
+    def prepare_for_script(self, script):
+        ''' Create the references and set up the decompiler if the `script` needs them.
+        This cannot be done lazily on access, so do it before the script runs.
+
+        Parameters
+        ----------
+        script : AndroScript
+
+        Raises
+        ------
+        DexError
+        '''
+        if script.needs_xref():
+            self.create_xref()
+        if script.needs_dref():
+            self.create_dref()
+        if script.needs_decompiler():
+            self.setup_decompiler()
+
+    def create_all(self, min_script_needs):
+        ''' Eagerly create all analysis objects described by `min_script_needs`.
+
+        Used before forking processes which shall share the objects (copy-on-write),
+        otherwise each child would create them on its own.
+
+        Parameters
+        ----------
+        min_script_needs : tuple<bool>
+            See :py:meth:`ScriptUtil.get_minimum_script_options`
+
+        Raises
+        ------
+        DexError
+        '''
+        needs_dalvik_vm_format, needs_vm_analysis, needs_gvm_analysis, needs_xref, needs_dref, needs_decompiler = min_script_needs
+        cross_ref = needs_xref or needs_dref
+
+        if any((needs_dalvik_vm_format, needs_vm_analysis, needs_gvm_analysis, cross_ref, needs_decompiler)):
+            self.get_dalvik_vm_format()
+        if needs_vm_analysis or needs_gvm_analysis or cross_ref or needs_decompiler:
+            self.get_vm_analysis()
+        if needs_gvm_analysis or cross_ref:
+            self.get_gvm_analysis()
+        if needs_xref:
+            self.create_xref()
+        if needs_dref:
+            self.create_dref()
+        if needs_decompiler:
+            self.setup_decompiler()
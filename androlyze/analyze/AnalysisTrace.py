@@ -0,0 +1,134 @@
+
+# encoding: utf-8
+
+__author__ = "Nils Tobias Schmidt"
+__email__ = "schmidt89 at informatik.uni-marburg.de"
+
+from collections import OrderedDict
+import json
+import os
+from os.path import expanduser, dirname, exists
+
+from androlyze.log.Log import log
+from androlyze.model.analysis.result.StaticResultKeys import RESOBJ_APK_META_PACKAGE_NAME, \
+    RESOBJ_APK_META_VERSION_NAME, RESOBJ_APK_META_HASH
+
+# keys of a trace record
+TRACE_SIZE_APP_CODE = "size app code"
+TRACE_CNT_DEX = "dex files"
+TRACE_PHASES = "phases"
+TRACE_SCRIPTS = "scripts"
+TRACE_TIME_ANDROGUARD = "time androguard"
+TRACE_PHASES_RSS = "rss after phases"
+TRACE_SCRIPTS_RSS = "rss after scripts"
+TRACE_LIBRARY_CLASSES = "library classes skipped"
+TRACE_PID = "pid"
+
+class AnalysisTrace(object):
+    '''
+    Writes one JSON record per analyzed apk into a trace file (JSON lines).
+
+    A record holds the time of each androguard phase (see :py:meth:`.AnalysisContext.timings`),
+    the run time of each script, the number of library classes each script skipped,
+    the size of the code and the RSS of the analyzing process after each phase and each script (see :py:meth:`.AnalysisContext.phase_rss`).
+    Use it to find out which phase dominates for which apk size.
+
+    The file is opened in append mode for every record, so it can be shared by the local workers.
+    '''
+
+    def __init__(self, trace_file):
+        '''
+        Parameters
+        ----------
+        trace_file : str
+            Path of the trace file.
+            The directory will be created if not existing.
+        '''
+        self.__trace_file = expanduser(trace_file)
+
+        trace_dir = dirname(self.__trace_file)
+        if trace_dir and not exists(trace_dir):
+            try:
+                os.makedirs(trace_dir)
+            except OSError:
+                # created concurrently
+                pass
+
+    def __str__(self):
+        return '%s(%s)' % (self.__class__.__name__, self.trace_file)
+
+    def get_trace_file(self):
+        return self.__trace_file
+
+    trace_file = property(get_trace_file, None, None, "str : Path of the trace file.")
+
+    @staticmethod
+    def create_record(fastapk, ana_ctx, scripts):
+        ''' Create the trace record.
+
+        Parameters
+        ----------
+        fastapk : FastApk
+            The analyzed apk.
+        ana_ctx : AnalysisContext
+        scripts : list<AndroScript>
+            The scripts that have been run.
+
+        Returns
+        -------
+        OrderedDict
+        '''
+        return OrderedDict([
+                            (RESOBJ_APK_META_HASH, fastapk.hash),
+                            (RESOBJ_APK_META_PACKAGE_NAME, fastapk.package_name),
+                            (RESOBJ_APK_META_VERSION_NAME, fastapk.version_name),
+                            (TRACE_SIZE_APP_CODE, fastapk.size_app_code),
+                            (TRACE_CNT_DEX, ana_ctx.cnt_dex),
+                            (TRACE_TIME_ANDROGUARD, ana_ctx.get_total_time()),
+                            (TRACE_PHASES, ana_ctx.timings),
+                            (TRACE_SCRIPTS, OrderedDict((s.name, s.time_script) for s in scripts)),
+                            (TRACE_LIBRARY_CLASSES, OrderedDict((s.name, s.cnt_library_classes) for s in scripts)),
+                            (TRACE_PHASES_RSS, ana_ctx.phase_rss),
+                            (TRACE_SCRIPTS_RSS, OrderedDict((s.name, s.rss_script) for s in scripts)),
+                            (TRACE_PID, os.getpid())
+                            ])
+
+    def write(self, fastapk, ana_ctx, scripts):
+        ''' Append the trace record for the analyzed apk.
+        Errors will only be logged.
+
+        See :py:meth:`.create_record` for the parameters.
+        '''
+        try:
+            line = json.dumps(self.create_record(fastapk, ana_ctx, scripts), default = str)
+            # one write per record -> records of different processes don't get mixed
+            with open(self.trace_file, "a") as f:
+                f.write(line + "\n")
+        except (IOError, TypeError, ValueError) as e:
+            log.warn("Could not write trace for %s to %s: %s", fastapk.short_description(), self, e)
+
+# per process trace instance
+_analysis_trace = None
+
+def get_analysis_trace():
+    ''' Get the `AnalysisTrace` as configured in the settings.
+
+    Returns
+    -------
+    AnalysisTrace
+    None
+        If tracing is not enabled.
+    '''
+    global _analysis_trace
+
+    from androlyze import settings
+    from androlyze.settings import SECTION_ANALYSIS_TRACE, KEY_ANALYSIS_TRACE_ENABLED, \
+        KEY_ANALYSIS_TRACE_FILE
+
+    if _analysis_trace is None:
+        s = settings.singleton
+        if s is not None and s.get_bool((SECTION_ANALYSIS_TRACE, KEY_ANALYSIS_TRACE_ENABLED), default = False):
+            _analysis_trace = AnalysisTrace(s[(SECTION_ANALYSIS_TRACE, KEY_ANALYSIS_TRACE_FILE)])
+            log.info("Using %s", _analysis_trace)
+
+    return _analysis_trace
@@ -4,24 +4,33 @@
 __author__ = "Nils Tobias Schmidt"
 __email__ = "schmidt89 at informatik.uni-marburg.de"
 
+import cPickle
 from datetime import timedelta
+import errno
 from itertools import repeat, chain
+import os
+import select
+import signal
 import struct
 import sys
+import threading
 from time import time
 from zipfile import BadZipfile
 
-from androguard.core.analysis.analysis import uVMAnalysis
-from androguard.core.analysis.ganalysis import GVMAnalysis
-from androguard.core.bytecodes.dvm import DalvikVMFormat
-from androguard.misc import *
-from androlyze.analyze.exception import DexError
+from androlyze.analyze.AnalysisContext import AnalysisContext, PICKLE_RECURSION_LIMIT
+from androlyze.analyze.AnalysisTrace import get_analysis_trace
+from androlyze.analyze.ApkFacts import ApkFacts
+from androlyze.analyze.DexAnalysisCache import get_dex_analysis_cache
+from androlyze.analyze.ResourceBudget import apk_budget, script_budget, BUDGET_APK
+from androlyze.analyze.exception import DexError, AnalyzeError, BudgetExceededError
 from androlyze.loader.exception import CouldNotOpenApk
 from androlyze.log.Log import log
 from androlyze.model.analysis.result.ResultObject import ResultObject
 from androlyze.model.android.apk.Apk import Apk
 from androlyze.model.android.apk.EAndroApk import EAndroApk
 from androlyze.model.android.apk.FastApk import FastApk
+from androlyze.storage.quarantine.QuarantineStorage import record_failure, failure_from_budget, \
+    FAILURE_DEX
 from androlyze.util import Util
 
 '''
@@ -80,21 +89,44 @@ def open_apk(apk_or_path = None, apk = None, raw = False, path = None):
     except Exception as e:
         log.exception(e)
 
+def get_script_concurrency():
+    ''' Get the number of processes running the scripts on one apk (from the settings) '''
+    from androlyze import settings
+    from androlyze.settings import SECTION_PARALLELIZATION, KEY_PARALLELIZATION_SCRIPT_CONCURRENCY
+
+    if settings.singleton is None:
+        return 1
+    return settings.singleton.get_int((SECTION_PARALLELIZATION, KEY_PARALLELIZATION_SCRIPT_CONCURRENCY), default = None) or 1
+
+def get_script_concurrency_timeout():
+    ''' Get the seconds to wait for the results of the processes running the scripts on one apk (from the settings).
+    None means no timeout. '''
+    from androlyze import settings
+    from androlyze.settings import SECTION_PARALLELIZATION, KEY_PARALLELIZATION_SCRIPT_CONCURRENCY_TIMEOUT
+
+    if settings.singleton is None:
+        return None
+    return settings.singleton.get_int((SECTION_PARALLELIZATION, KEY_PARALLELIZATION_SCRIPT_CONCURRENCY_TIMEOUT), default = None)
+
 def analyze_dex(filepath_or_raw, needs_dalvik_vm_format=True, needs_vm_analysis=True, needs_gvm_analysis=True,
-                 needs_xref=True, needs_dref=True, raw=False, decompiler="dad"):
+                 needs_xref=True, needs_dref=True, needs_decompiler=True, raw=False, decompiler="dad"):
     '''
     Open the classes.dex file `needs_dalvik_vm_format`
     and set up an analyzer for it `needs_vm_analysis`.
 
+    All needed objects are created eagerly.
+    Use an `AnalysisContext` to create them on demand.
+
     Parameters
     ----------
-    filepath_or_raw : path to file or raw data
+    filepath_or_raw : path to file or raw data or list of them (multidex)
          Set raw to True if `filepath_or_raw` is raw data.
     needs_dalvik_vm_format : bool, optional (default is True)
     needs_vm_analysis : bool, optional (default is True)
     needs_gvm_analysis : bool, optional (default is True)
     needs_xref : bool, optional (default is True)
     needs_dref : bool, optional (default is True)
+    needs_decompiler : bool, optional (default is True)
     raw : bool, optional (default is False)
     decompiler : str, optional (default is "dad")
 
@@ -108,40 +140,30 @@ def analyze_dex(filepath_or_raw, needs_dalvik_vm_format=True, needs_vm_analysis=
         If an error occurred while creating the analysis objects.
     '''
 
+    ana_ctx = AnalysisContext(filepath_or_raw, raw = raw, decompiler = decompiler)
+
     dalvik_vm_format, vm_analysis, gvm_analysis = None, None, None
     # every requirement implies the need for the `dalvik_vm_format`
-    needs_dalvik_vm_format = any((needs_dalvik_vm_format, needs_vm_analysis, needs_gvm_analysis, needs_xref, needs_dref))
+    needs_dalvik_vm_format = any((needs_dalvik_vm_format, needs_vm_analysis, needs_gvm_analysis, needs_xref, needs_dref, needs_decompiler))
     cross_ref = any((needs_xref, needs_dref))
 
-    try:
-        if needs_dalvik_vm_format:
-            if raw == False:
-                with open(filepath_or_raw, "rb") as f:
-                    dalvik_vm_format = DalvikVMFormat(f.read())
-            else:
-                dalvik_vm_format = DalvikVMFormat(filepath_or_raw)
+    if needs_dalvik_vm_format:
+        dalvik_vm_format = ana_ctx.dalvik_vm_format
 
-            if needs_vm_analysis or cross_ref or needs_gvm_analysis:
-                vm_analysis = uVMAnalysis(dalvik_vm_format)
-                dalvik_vm_format.set_vmanalysis(vm_analysis)
+        if needs_vm_analysis or cross_ref or needs_gvm_analysis or needs_decompiler:
+            vm_analysis = ana_ctx.vm_analysis
 
-            if needs_gvm_analysis or cross_ref:
-                gvm_analysis = GVMAnalysis(vm_analysis, None)
-                dalvik_vm_format.set_gvmanalysis(gvm_analysis)
+        if needs_gvm_analysis or cross_ref:
+            gvm_analysis = ana_ctx.gvm_analysis
 
-            if dalvik_vm_format:
-                RunDecompiler(dalvik_vm_format, vm_analysis, decompiler)
+        # create references, gvm_analysis needed!
+        if needs_xref:
+            ana_ctx.create_xref()
+        if needs_dref:
+            ana_ctx.create_dref()
 
-            # create references, gvm_analysis needed!
-            # we optimize through not exporting the references into the python objects
-            if needs_xref:
-                dalvik_vm_format.create_xref(python_export = False)
-            if needs_dref:
-                dalvik_vm_format.create_dref(python_export = False)
-
-    except Exception as e:
-        # androguard caused error -> propagate as DexError
-        raise DexError(caused_by = e), None, sys.exc_info()[2]
+        if needs_decompiler:
+            ana_ctx.setup_decompiler()
 
     return dalvik_vm_format, vm_analysis, gvm_analysis
 
@@ -175,6 +197,17 @@ def analyze_apk(eandro_apk, scripts, min_script_needs, propagate_error = False,
     ''' Analyze the `eandro_apk` with the given `scripts` assuming each `AndroScript`
     neads at least `min_script_needs`.
 
+    If enabled in the settings, the analysis objects will be taken from the `DexAnalysisCache`.
+    If enabled, a record with the time of each androguard phase will be written to the `AnalysisTrace`.
+    If a script concurrency is set in the settings, the scripts will be run in forked processes
+    (see :py:meth:`.analyze_apk_ana_objs`).
+
+    The scripts run within the resource budgets configured in the settings (see :py:class:`.ResourceBudget`).
+    If the budget for the apk is exceeded, the remaining scripts are skipped
+    and the partial results are returned (see :py:meth:`.run_scripts`).
+
+    An exceeded apk budget or a `DexError` will be recorded in the quarantine (if enabled in the settings).
+
     Be sure that you reseted the `scripts`!
 
     Parameters
@@ -197,8 +230,6 @@ def analyze_apk(eandro_apk, scripts, min_script_needs, propagate_error = False,
     None
         If error happened.
     '''
-    from androlyze.analyze.exception import AndroScriptError
-
     try:
         # reset scripts
         if reset_scripts:
@@ -206,108 +237,617 @@ def analyze_apk(eandro_apk, scripts, min_script_needs, propagate_error = False,
                 s.reset()
 
         if eandro_apk is not None:
-            fastapk = None
-            # analyze classes.dex with script requirements and get time
-            args = [eandro_apk.get_dex()] + list(min_script_needs)
-
-            time_s, analysis_objs = Util.timeit(analyze_dex, *args, raw = True)
-
-            script_results = []
-            for s in scripts:
-                try:
-                    result_obj = s.analyze(eandro_apk, *analysis_objs)
-
-                    # we only need the meta infos of the apk
-                    if eandro_apk is not None:
-                        fastapk = FastApk.load_from_eandroapk(eandro_apk)
-
-                    # set androguard analysis time if script wants stats
-                    s.add_apk_androguard_analyze_time(time_s)
-
-                    # link to apk
-                    if isinstance(result_obj, ResultObject):
-                        result_obj.set_apk(fastapk)
+            # all .dex files (multidex) will be read before the first script needing them
+            # analysis objects will be created on demand for the scripts (or loaded from the cache)
+            cache = get_dex_analysis_cache()
+            cache_key = None
+            if cache is not None:
+                cache_key = lambda dex: cache.gen_key(dex, min_script_needs)
+            ana_ctx = AnalysisContext(eandro_apk.get_all_dex, cache = cache, cache_key = cache_key)
+
+            res = None
+            budget = apk_budget()
+            try:
+                with budget:
+                    res = analyze_apk_ana_objs(ana_ctx, eandro_apk, scripts, min_script_needs,
+                                                propagate_error = propagate_error, reset_scripts = False,
+                                                script_concurrency = get_script_concurrency())
+            except BudgetExceededError as e:
+                # not handled by the scripts, e.g. exceeded in the parent process while the scripts were forked
+                log.warn("%s: %s", eandro_apk.short_description(), e)
+
+            # the analysis objects may be incomplete
+            if budget.exceeded is None:
+                ana_ctx.store_in_cache()
+            else:
+                record_failure(eandro_apk.hash, [script_name(s) for s in scripts], failure_from_budget(budget), str(budget))
 
-                    script_results.append(s)
-                except Exception as e:
-                    if propagate_error:
-                        raise
-                    else:
-                        log.exception(AndroScriptError(s, e))
+            trace = get_analysis_trace()
+            if trace is not None and res is not None:
+                fastapk, script_results = res
+                trace.write(fastapk, ana_ctx, script_results)
 
-            if fastapk is not None:
-                # use fastapk to only store the meta information, not the apk data!
-                return [fastapk, script_results]
+            return res
 
     # interrupt analysis if analysis objects could not be created!
     except DexError as e:
         log.exception(e)
+        if eandro_apk is not None:
+            record_failure(eandro_apk.hash, [script_name(s) for s in scripts], FAILURE_DEX, str(e))
 
-def analyze_apk_ana_objs(ana_objs, time_s, eandro_apk, scripts, propagate_error = False, reset_scripts = True):
+def analyze_apk_ana_objs(ana_ctx, eandro_apk, scripts, min_script_needs, propagate_error = False, reset_scripts = True,
+                         script_concurrency = 1):
     ''' Analyze the `eandro_apk` with the given `scripts` assuming each `AndroScript`
     neads at least `min_script_needs`.
 
+    The analysis objects will be taken from `ana_ctx` and are only created
+    the first time a script accesses them.
+
+    If `script_concurrency` > 1, all analysis objects the scripts need will be created first.
+    Afterwards forked processes run a subset of the scripts each on the shared (copy-on-write) objects
+    and send the scripts with their results back (see :py:meth:`.run_scripts_forked`).
+
     Be sure that you reseted the `scripts`!
 
     Parameters
     ----------
+    ana_ctx : AnalysisContext
+        Holds the (lazy) androguard analysis objects.
     eandro_apk : EAndroApk
         The apk.
     scripts : iterable<AndroScript>
         The scripts to use for the analysis.
+    min_script_needs : tuple<bool>
+        See :py:meth:ScriptUtil.get_maximal_script_options`
     propagate_error : bool, optional (default is False)
         If true propagate errors.
     reset_scripts : bool, optional (default is True)
         If given, reset the `AndroScript` before analyzing.
+    script_concurrency : int, optional (default is 1)
+        Number of processes running the scripts.
+        Only used on systems supporting `os.fork` and if the current process has no other threads
+        (forking them is not safe, the children could deadlock on locks held by the other threads).
 
     Returns
     -------
     list<FastApk, list<AndroScript>>
         Uses `FastApk` to only store the meta information, not the apk data!
+        The scripts may be copies of `scripts` if they have been run in forked processes.
     None
         If error happened.
+
+    Raises
+    ------
+    DexError
+        If the analysis objects could not be created.
+        The analysis of the apk is interrupted.
+    '''
+    # reset scripts
+    if reset_scripts:
+        for s in scripts:
+            s.reset()
+
+    if eandro_apk is not None:
+        scripts = list(scripts)
+        cnt_processes = min(script_concurrency, len(scripts))
+
+        if cnt_processes > 1 and hasattr(os, "fork") and threading.active_count() > 1:
+            _warn_fork_with_threads()
+            cnt_processes = 1
+
+        if cnt_processes > 1 and hasattr(os, "fork"):
+            fastapk, script_results = run_scripts_forked(ana_ctx, eandro_apk, scripts, min_script_needs,
+                                                         cnt_processes, propagate_error = propagate_error)
+        else:
+            fastapk, script_results = run_scripts(ana_ctx, eandro_apk, scripts, min_script_needs,
+                                                  propagate_error = propagate_error)
+
+        if fastapk is not None:
+            # use fastapk to only store the meta information, not the apk data!
+            return [fastapk, script_results]
+
+def run_scripts(ana_ctx, eandro_apk, scripts, min_script_needs, propagate_error = False):
+    ''' Run the `scripts` one after another in the current process.
+
+    Scripts run after the scripts they depend on (see :py:meth:`.AndroScript.depends_on`)
+    and get them passed. Scripts whose dependencies failed or did not run are skipped.
+
+    Each script runs within the script budget (see :py:func:`.ResourceBudget.script_budget`).
+    If a budget is exceeded, the partial results of the script are kept
+    and the exceeded budget is logged in its script meta infos.
+    The scripts depending on it are skipped.
+    If it has been the budget for the apk, the remaining scripts are skipped too.
+
+    See :py:meth:`.analyze_apk_ana_objs` for the parameters.
+
+    Returns
+    -------
+    tuple<FastApk, list<AndroScript>>
+        The `FastApk` is None if no script succeeded.
+
+    Raises
+    ------
+    DexError
     '''
     from androlyze.analyze.exception import AndroScriptError
+    from androlyze.model.script import ScriptUtil
+
+    fastapk = None
 
     try:
-        # reset scripts
-        if reset_scripts:
-            for s in scripts:
-                s.reset()
+        scripts = ScriptUtil.sort_by_dependencies(scripts)
+    except AndroScriptError as e:
+        log.warn(e)
+
+    # facts shared by the scripts
+    facts = ApkFacts(eandro_apk, scripts)
+
+    # successfully finished scripts by name
+    finished = {}
+
+    script_results = []
+    for s in scripts:
+        dependency_names = ScriptUtil.get_dependency_names(s)
+        unavailable = [dep for dep in dependency_names if dep not in finished]
+        if unavailable:
+            log.warn(AndroScriptError(s, additional_text = " Skipped, because the scripts it depends on failed or did not run: %s" % ', '.join(unavailable)))
+            facts.script_done(s)
+            continue
+
+        budget_exceeded = None
+        try:
+            try:
+                with script_budget():
+                    # create the objects the script needs (if not already done)
+                    analysis_objs = ana_ctx.script_args(ScriptUtil.get_minimum_script_options([s]))
+                    ana_ctx.prepare_for_script(s)
+
+                    dependencies = dict((dep, finished[dep]) for dep in dependency_names)
+                    result_obj = s.analyze(eandro_apk, *analysis_objs, analysis_context = ana_ctx, facts = facts,
+                                           dependencies = dependencies)
+            except BudgetExceededError as e:
+                # keep the partial results
+                log.warn("%s on %s: %s", s, eandro_apk.short_description(), e)
+                budget_exceeded = e.budget
+                s.add_budget_exceeded(budget_exceeded)
+                result_obj = s.res
+            finally:
+                facts.script_done(s)
+
+            # we only need the meta infos of the apk
+            if eandro_apk is not None:
+                fastapk = FastApk.load_from_eandroapk(eandro_apk)
+
+            # set androguard analysis time if script wants stats
+            s.add_apk_androguard_analyze_time(ana_ctx.get_total_time(), ana_ctx.timings, ana_ctx.phase_rss)
+
+            # link to apk
+            if isinstance(result_obj, ResultObject):
+                result_obj.set_apk(fastapk)
+
+            script_results.append(s)
+            # don't pass partial results to the depending scripts
+            if budget_exceeded is None:
+                finished[s.name] = s
+        except BudgetExceededError as e:
+            # exceeded apk budget outside of the script
+            log.warn("%s on %s: %s", s, eandro_apk.short_description(), e)
+            break
+        except DexError:
+            # analysis objects are created for the first script needing them, so the dex may fail in the middle
+            # -> interrupt the analysis of the apk rather than parsing the broken dex again for each script
+            raise
+        except Exception as e:
+            if propagate_error:
+                raise
+            else:
+                log.exception(AndroScriptError(s, e))
 
-        if eandro_apk is not None:
-            fastapk = None
+        # skip the remaining scripts
+        if budget_exceeded is not None and budget_exceeded.name == BUDGET_APK:
+            break
 
-            script_results = []
-            for s in scripts:
-                try:
-                    result_obj = s.analyze(eandro_apk, *ana_objs)
+    # intermediate results are not needed any more
+    for s in scripts:
+        s.output = None
 
-                    # we only need the meta infos of the apk
-                    if eandro_apk is not None:
-                        fastapk = FastApk.load_from_eandroapk(eandro_apk)
+    return fastapk, script_results
 
-                    # set androguard analysis time if script wants stats
-                    s.add_apk_androguard_analyze_time(time_s)
+############################################################
+#---Fork after parse
+############################################################
 
-                    # link to apk
-                    if isinstance(result_obj, ResultObject):
-                        result_obj.set_apk(fastapk)
+def run_scripts_forked(ana_ctx, eandro_apk, scripts, min_script_needs, cnt_processes, propagate_error = False):
+    ''' Create the analysis objects needed by the `scripts` once
+    and fork `cnt_processes` processes which run a subset of the `scripts` each.
 
-                    script_results.append(s)
-                except Exception as e:
-                    if propagate_error:
-                        raise
-                    else:
-                        log.exception(AndroScriptError(s, e))
+    The children share the analysis objects with the parent (copy-on-write)
+    and send the (pickled) scripts including their results back through a pipe.
+    Scripts depending on each other run in the same process.
+    A subset whose process died or did not send its results within the `script_concurrency_timeout`
+    won't be part of the results (will be logged).
 
-            if fastapk is not None:
-                # use fastapk to only store the meta information, not the apk data!
-                return [fastapk, script_results]
+    See :py:meth:`.analyze_apk_ana_objs` for the parameters.
 
-    # interrupt analysis if analysis objects could not be created!
-    except DexError as e:
-        log.exception(e)
+    Returns
+    -------
+    tuple<FastApk, list<AndroScript>>
+        The `FastApk` is None if no script succeeded.
+        The scripts are copies of `scripts` (in the same order).
+
+    Raises
+    ------
+    DexError
+        If the analysis objects could not be created.
+    Exception
+        The error of a script if `propagate_error`.
+    '''
+    from androlyze.model.script import ScriptUtil
+
+    # the children shall not create the objects on their own
+    ana_ctx.create_all(ScriptUtil.get_minimum_script_options(scripts))
+
+    # distribute the groups of dependent scripts (biggest first) to the process with the fewest scripts,
+    # keep the position to restore the order
+    positions = dict((id(s), pos) for pos, s in enumerate(scripts))
+    subsets = [[] for _ in range(cnt_processes)]
+    for group in sorted(ScriptUtil.group_by_dependencies(scripts), key = len, reverse = True):
+        min(subsets, key = len).extend((positions[id(s)], s) for s in group)
+    subsets = [subset for subset in subsets if subset]
+
+    children = []
+    for subset in subsets:
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            _run_scripts_child(write_fd, ana_ctx, eandro_apk, subset, min_script_needs, propagate_error)
+
+        os.close(write_fd)
+        children.append((pid, read_fd, subset))
+
+    # collect results of all children before raising an error (don't leave zombies)
+    results = []
+    error = None
+    running = dict((pid, read_fd) for pid, read_fd, _ in children)
+    timeout = get_script_concurrency_timeout()
+    deadline = time() + timeout if timeout is not None else None
+    try:
+        for pid, read_fd, subset in children:
+            data = _read_until_eof(read_fd, deadline)
+            os.close(read_fd)
+            if data is None:
+                log.error("Process %d running %s on %s did not finish within %s seconds, killing it!",
+                          pid, [s.name for _, s in subset], eandro_apk.short_description(), timeout)
+                os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+            del running[pid]
+
+            if data is None:
+                continue
+
+            if not data:
+                log.error("Process %d running %s on %s died without results!",
+                          pid, [s.name for _, s in subset], eandro_apk.short_description())
+                continue
+
+            recursion_limit = sys.getrecursionlimit()
+            sys.setrecursionlimit(max(recursion_limit, PICKLE_RECURSION_LIMIT))
+            try:
+                succeeded, payload = cPickle.loads(data)
+            finally:
+                sys.setrecursionlimit(recursion_limit)
+
+            if succeeded:
+                results.extend(payload)
+            elif error is None:
+                error = payload
+    finally:
+        # e.g. interrupted by a time limit
+        for pid, read_fd in running.items():
+            try:
+                os.close(read_fd)
+            except OSError:
+                pass
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            except OSError:
+                pass
+
+    if error is not None:
+        raise error
+
+    fastapk = None
+    script_results = []
+    if results:
+        fastapk = FastApk.load_from_eandroapk(eandro_apk)
+        for _, s in sorted(results):
+            # link to apk of this process
+            if isinstance(s.res, ResultObject):
+                s.res.set_apk(fastapk)
+            script_results.append(s)
+
+    return fastapk, script_results
+
+def _read_until_eof(fd, deadline = None):
+    ''' Read all data from the `fd` (not closed).
+
+    Parameters
+    ----------
+    fd : int
+    deadline : float, optional (default is None)
+        Point in time (see `time.time`) after which to give up.
+
+    Returns
+    -------
+    str
+    None
+        If the deadline passed.
+    '''
+    chunks = []
+    while True:
+        timeout = None
+        if deadline is not None:
+            timeout = deadline - time()
+            if timeout <= 0:
+                return None
+        try:
+            readable, _, _ = select.select([fd], [], [], timeout)
+            if not readable:
+                continue
+            chunk = os.read(fd, 65536)
+        except (select.error, OSError) as e:
+            # interrupted by a signal (e.g. the `ResourceBudget` timer)
+            if e.args[0] == errno.EINTR:
+                continue
+            raise
+        if not chunk:
+            return ''.join(chunks)
+        chunks.append(chunk)
+
+_warned_fork_with_threads = False
+
+def _warn_fork_with_threads():
+    ''' Log (once) that the scripts run in the current process because it has other threads '''
+    global _warned_fork_with_threads
+    if not _warned_fork_with_threads:
+        _warned_fork_with_threads = True
+        log.warn("Process has %d threads, not forking to run the scripts (script_concurrency)", threading.active_count())
+
+def _run_scripts_child(write_fd, ana_ctx, eandro_apk, subset, min_script_needs, propagate_error):
+    ''' Run the scripts of the `subset` (position, script) in the forked process
+    and write the pickled result to `write_fd`.
+
+    The result is a tuple of a bool (success) and the (position, script) pairs or the error.
+    Never returns!
+    '''
+    exit_code = 0
+    try:
+        try:
+            positions = dict((id(s), pos) for pos, s in subset)
+            _, script_results = run_scripts(ana_ctx, eandro_apk, [s for _, s in subset], min_script_needs,
+                                            propagate_error = propagate_error)
+            res = (True, [(positions[id(s)], s) for s in script_results])
+        except Exception as e:
+            exit_code = 1
+            res = (False, e)
+
+        sys.setrecursionlimit(max(sys.getrecursionlimit(), PICKLE_RECURSION_LIMIT))
+        try:
+            data = cPickle.dumps(res, cPickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            # e.g. error not picklable
+            exit_code = 1
+            data = cPickle.dumps((False, AnalyzeError(caused_by = e)), cPickle.HIGHEST_PROTOCOL)
+
+        with os.fdopen(write_fd, "wb") as f:
+            f.write(data)
+    except:
+        exit_code = 1
+        log.exception("Error in forked process %d", os.getpid())
+    finally:
+        # don't run exit handlers of the parent
+        os._exit(exit_code)
+
+############################################################
+#---Incremental analysis
+############################################################
+
+def script_name(script):
+    ''' Get the name of the `script` (instantiated or not) '''
+    if isinstance(script, type):
+        return script.__name__
+    return script.name
+
+def get_apk_hash(apk_or_path):
+    ''' Get the hash of an `Apk` or calculate it from the file at the given path.
+
+    Returns
+    -------
+    str
+    None
+        If the file could not be read (error will be logged).
+    '''
+    if isinstance(apk_or_path, Apk):
+        return apk_or_path.hash
+    try:
+        with open(apk_or_path, "rb") as f:
+            return Util.sha256(f.read())
+    except IOError as e:
+        log.warn(e)
+
+def get_missing_scripts(result_db_storage, apk_hashes, androscripts):
+    ''' Get the scripts whose results are not yet in the result database
+    (or have been created by a different version of the script or are partial because the script exceeded its budget).
+
+    All ids will be queried at once (in chunks).
+
+    Parameters
+    ----------
+    result_db_storage : ResultDatabaseStorage
+    apk_hashes : iterable<str>
+    androscripts : list<AndroScript>
+        Instantiated scripts (need the hash).
+
+    Returns
+    -------
+    dict<str, list<str>>
+        Apk hash to the names of the scripts that still have to be run.
+        Apks which are fully covered map to an empty list.
+
+    Raises
+    ------
+    DatabaseLoadException
+    '''
+    from androlyze.model.script.AndroScript import AndroScript
+
+    # apk hash, script, result id
+    expected = [(apk_hash, s, AndroScript.unique_id(apk_hash, s.name)) for apk_hash in set(apk_hashes) for s in androscripts]
+
+    stored_script_hashes = result_db_storage.get_script_hashes_for_ids([_id for _, _, _id in expected], exclude_partial = True)
+
+    missing_scripts = dict((apk_hash, []) for apk_hash, _, _ in expected)
+    for apk_hash, s, _id in expected:
+        if stored_script_hashes.get(_id) != s.hash:
+            missing_scripts[apk_hash].append(s.name)
+
+    return missing_scripts
+
+def filter_scripts(scripts, apk_hash, script_filter):
+    ''' Get the `scripts` that shall be run on the apk with `apk_hash`.
+
+    Parameters
+    ----------
+    scripts : list<AndroScript> or list<type<AndroScript>>
+    apk_hash : str
+    script_filter : dict<str, iterable<str>>
+        Apk hash to script names. See :py:method:`.BaseAnalyzer.script_filter`.
+        If None or `apk_hash` not in it, use all scripts.
+
+    Returns
+    -------
+    list<AndroScript> or list<type<AndroScript>>
+    '''
+    if not script_filter or apk_hash not in script_filter:
+        return scripts
+    script_names = script_filter[apk_hash]
+    return [s for s in scripts if script_name(s) in script_names]
+
+############################################################
+#---Dex deduplication
+############################################################
+
+def dedup_dex_script_filter(apks, androscripts, script_filter = None):
+    ''' Group the `apks` by the hash of their .dex files.
+
+    The first apk of each group (representative) will be analyzed with all scripts.
+    The other ones only with the scripts which are not dex only (see :py:meth:`.AndroScript.is_dex_only`),
+    the results of the dex only scripts will be copied from the representative.
+    Apks which would not run any script are dropped.
+
+    Apks without a dex hash (e.g. paths or imported before the hash has been recorded) are not grouped.
+
+    Parameters
+    ----------
+    apks : list<str> or list<Apk>
+    androscripts : list<AndroScript>
+        Instantiated scripts.
+    script_filter : dict<str, iterable<str>>, optional (default is None)
+        See :py:method:`.BaseAnalyzer.script_filter`.
+
+    Returns
+    -------
+    tuple<list<str> or list<Apk>, dict<str, list<str>>, dict<str, list<Apk>>>
+        The apks to analyze, the script filter and the dex duplicates.
+        See :py:method:`.BaseAnalyzer.script_filter` and :py:method:`.BaseAnalyzer.dex_duplicates`.
+    '''
+    if script_filter is None:
+        script_filter = {}
+
+    all_script_names = [s.name for s in androscripts]
+    dex_only_script_names = set(s.name for s in androscripts if s.is_dex_only())
+
+    def needed_scripts(apk_hash):
+        return script_filter.get(apk_hash, all_script_names)
+
+    # dex hash -> representative
+    representatives = {}
+    res_apks = []
+    dex_duplicates = {}
+    for apk in apks:
+        # the dex hash reads all .dex files, only compute it if needed
+        dex_hash = apk.dex_hash if dex_only_script_names and isinstance(apk, Apk) else None
+        if dex_hash is None:
+            res_apks.append(apk)
+            continue
+
+        representative = representatives.get(dex_hash)
+        if representative is None:
+            representatives[dex_hash] = apk
+            res_apks.append(apk)
+            continue
+
+        scripts = needed_scripts(apk.hash)
+        dex_only_scripts = [sn for sn in scripts if sn in dex_only_script_names]
+        if not dex_only_scripts:
+            res_apks.append(apk)
+            continue
+
+        # representative has to run the dex only scripts for the duplicate too
+        rep_scripts = needed_scripts(representative.hash)
+        missing = [sn for sn in dex_only_scripts if sn not in rep_scripts]
+        if missing:
+            script_filter[representative.hash] = list(rep_scripts) + missing
+
+        dex_duplicates.setdefault(representative.hash, []).append(apk)
+
+        other_scripts = [sn for sn in scripts if sn not in dex_only_script_names]
+        if other_scripts:
+            script_filter[apk.hash] = other_scripts
+            res_apks.append(apk)
+
+    return res_apks, script_filter, dex_duplicates
+
+def store_dex_only_results(store_func, fastapk, script_results, dex_duplicates):
+    ''' Store the results of the dex only scripts also for the apks sharing the .dex files with `fastapk`.
+
+    Parameters
+    ----------
+    store_func : Apk, AndroScript -> object
+        Stores the result of the script for the apk (e.g. :py:meth:`.store_script_res`).
+    fastapk : FastApk
+        The analyzed apk.
+    script_results : list<AndroScript>
+    dex_duplicates : dict<str, list<Apk>>
+        See :py:method:`.BaseAnalyzer.dex_duplicates`.
+
+    Returns
+    -------
+    list<object>
+        The results of `store_func`.
+
+    Raises
+    ------
+    StorageException
+    '''
+    res = []
+    if not dex_duplicates:
+        return res
+
+    duplicates = dex_duplicates.get(fastapk.hash, ())
+    for script in script_results:
+        if not script.is_dex_only():
+            continue
+        try:
+            for duplicate in duplicates:
+                # link result to the duplicate
+                script.res.set_apk(duplicate)
+                res.append(store_func(duplicate, script))
+        finally:
+            script.res.set_apk(fastapk)
+
+    return res
 
 ############################################################
 #---Apk generators
@@ -375,6 +915,41 @@ def apk_id_or_raw_data_gen(apk_gen, force_raw_data = False):
             except IOError as e:
                 log.warn(e)
 
+def apk_id_via_apk_storage_gen(apk_gen, apk_storage):
+    ''' Generator over the apk ids.
+    The .apk files are copied into the `apk_storage` first,
+    which only stores each .apk once (identified by its hash).
+
+    Errors will be logged!.
+
+    Parameters
+    ----------
+    apk_gen : iterable<tuple<str, Apk, bool>>
+        See :py:method:`.AnalyzeUtil.apk_gen`
+    apk_storage : ApkCopyInterface
+
+    Returns
+    -------
+    generator<tuple<str, bool, Apk>>
+        Like :py:method:`.AnalyzeUtil.apk_id_or_raw_data_gen` but always the id.
+    '''
+    from androlyze.storage.exception import StorageException
+
+    for apk_path, _apk, _ in apk_gen:
+        try:
+            # already stored, don't read the .apk at all
+            if _apk is not None and apk_storage.is_blob_storage() and apk_storage.contains(_apk.hash):
+                yield _apk.hash, True, _apk
+                continue
+
+            with open(apk_path, mode = "rb") as f:
+                if _apk is None:
+                    _apk = FastApk.fast_load_from_io(f, apk_path)
+                apk_storage.copy_apk(_apk, f)
+            yield _apk.hash, True, _apk
+        except (IOError, CouldNotOpenApk, StorageException) as e:
+            log.warn(e)
+
 def apk_zipfile_gen(apk_gen):
     ''' Generator over the .apk files (raw data). Errors will be logged!.
 
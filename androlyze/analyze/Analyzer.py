@@ -54,8 +54,11 @@ class Analyzer(BaseAnalyzer):
             # otherwise proceed with analysis
             if eandro_apk is not None:
 
+                # only run the scripts needed for the apk
+                scripts = AnalyzeUtil.filter_scripts(androscripts, eandro_apk.hash, self.script_filter)
+
                 # tuple<FastApk, AndroScript>
-                res = AnalyzeUtil.analyze_apk(eandro_apk, androscripts, self.min_script_needs, reset_scripts = True)
+                res = AnalyzeUtil.analyze_apk(eandro_apk, scripts, self.min_script_needs, reset_scripts = True)
 
                 if res:
                     # unpack results
@@ -71,6 +74,14 @@ class Analyzer(BaseAnalyzer):
                                 self.add_storage_result(storage_result)
                             except StorageException as e:
                                 log.warn(e)
+
+                        # fan out results to the apks sharing the .dex files
+                        try:
+                            store_func = lambda apk, script: AnalyzeUtil.store_script_res(self.storage, script, apk)
+                            for storage_result in AnalyzeUtil.store_dex_only_results(store_func, fastapk, script_results, self.dex_duplicates):
+                                self.add_storage_result(storage_result)
+                        except StorageException as e:
+                            log.warn(e)
                     else:
                         # deliver result object in testing mode
                         test_results += [s.res for s in script_results]
@@ -0,0 +1,156 @@
+
+# encoding: utf-8
+
+__author__ = "Nils Tobias Schmidt"
+__email__ = "schmidt89 at informatik.uni-marburg.de"
+
+from collections import Counter
+
+from androlyze.log.Log import log
+
+# names of the facts
+FACT_ACTIVITIES = "activities"
+FACT_MAIN_ACTIVITY = "main activity"
+FACT_SERVICES = "services"
+FACT_RECEIVERS = "broadcast receivers"
+FACT_PROVIDERS = "content providers"
+# component category -> package names (see `get_components_cache`)
+FACT_COMPONENTS = "components"
+# component category -> package name -> intent filters (only components having some)
+FACT_INTENT_FILTERS = "intent filters"
+FACT_EXPORTED_COMPONENTS = "exported components"
+FACT_PUBLIC_COMPONENTS = "public components"
+FACT_PERMISSIONS = "permissions"
+FACT_LIBRARIES = "libraries"
+FACT_FILES = "files"
+
+# fact name -> function computing it
+FACT_FUNCS = {}
+
+def register_fact(name, func):
+    ''' Register the function computing the fact with `name`.
+
+    Parameters
+    ----------
+    name : str
+    func : EAndroApk, ApkFacts -> object
+        Gets the apk and the `ApkFacts` (to use other facts).
+    '''
+    FACT_FUNCS[name] = func
+
+class ApkFacts(object):
+    '''
+    Memoizing store for facts about one apk (e.g. the components from the manifest)
+    which are needed by several scripts.
+
+    Each fact is computed the first time a script requests it.
+    It will be dropped after the last script which declared it (see :py:meth:`.AndroScript.needed_facts`) has run.
+    Facts not declared by any script are kept until the store is dropped (after the apk has been analyzed).
+
+    The store is passed to `AndroScript._analyze` as keyword argument "facts".
+
+    Examples
+    --------
+    >>> facts = kwargs["facts"]
+    >>> facts[FACT_ACTIVITIES]
+    ['org.example.MainActivity', ...]
+    '''
+
+    def __init__(self, apk, scripts = ()):
+        '''
+        Parameters
+        ----------
+        apk : EAndroApk
+        scripts : iterable<AndroScript>, optional (default is ())
+            The scripts which will run on the `apk`.
+            Used to drop the facts they declared after they ran.
+        '''
+        self.__apk = apk
+        self.__facts = {}
+        # fact name -> number of scripts still needing it
+        self.__pending = Counter()
+        for script in scripts:
+            self.__pending.update(set(script.needed_facts()))
+
+    def __str__(self):
+        return '%s(%s)' % (self.__class__.__name__, self.__facts.keys())
+
+    def __contains__(self, name):
+        return name in self.__facts
+
+    def __getitem__(self, name):
+        return self.get(name)
+
+    def get(self, name):
+        ''' Get the fact with `name` (compute it if not done yet).
+
+        Raises
+        ------
+        KeyError
+            If no such fact has been registered.
+        '''
+        try:
+            return self.__facts[name]
+        except KeyError:
+            fact = FACT_FUNCS[name](self.__apk, self)
+            self.__facts[name] = fact
+            return fact
+
+    def script_done(self, script):
+        ''' Drop the facts which were declared by the `script` and are not needed by any other script '''
+        for name in set(script.needed_facts()):
+            self.__pending[name] -= 1
+            if self.__pending[name] <= 0 and name in self.__facts:
+                log.debug("Dropping fact %s of %s", name, self.__apk.short_description())
+                del self.__facts[name]
+
+############################################################
+#---Facts
+############################################################
+
+def get_intent_filters(apk, facts):
+    ''' Get the intent filters for all components '''
+    from androlyze.model.script.impl.manifest.components import component_key_2_intent_key
+
+    res = {}
+    for k, package_names in facts[FACT_COMPONENTS].items():
+        intents = {}
+        for package_name in package_names:
+            # get intent filter for activity, service or receiver
+            package_intents = apk.get_intent_filters(component_key_2_intent_key(k), package_name)
+            if package_intents:
+                intents[package_name] = package_intents
+        res[k] = intents
+    return res
+
+def get_public_components(apk, facts):
+    ''' Get the components either having an intent filter or being exported.
+    Like `Apk.get_manifest_public_components` '''
+    res = set()
+    for intents in facts[FACT_INTENT_FILTERS].values():
+        res.update(intents.keys())
+    return res.union(facts[FACT_EXPORTED_COMPONENTS])
+
+def get_components(apk, facts):
+    ''' Like `get_components_cache` '''
+    from androlyze.model.script.impl.manifest.components import CAT_ACTIVITIES, CAT_SERVICES, \
+        CAT_RECEIVERS, CAT_PROVIDERS
+    return {
+            CAT_ACTIVITIES : facts[FACT_ACTIVITIES],
+            CAT_SERVICES : facts[FACT_SERVICES],
+            CAT_RECEIVERS : facts[FACT_RECEIVERS],
+            CAT_PROVIDERS : facts[FACT_PROVIDERS]
+            }
+
+register_fact(FACT_ACTIVITIES, lambda apk, facts: apk.get_activities())
+register_fact(FACT_MAIN_ACTIVITY, lambda apk, facts: apk.get_main_activity())
+register_fact(FACT_SERVICES, lambda apk, facts: apk.get_services())
+register_fact(FACT_RECEIVERS, lambda apk, facts: apk.get_receivers())
+register_fact(FACT_PROVIDERS, lambda apk, facts: apk.get_providers())
+register_fact(FACT_COMPONENTS, get_components)
+register_fact(FACT_INTENT_FILTERS, get_intent_filters)
+register_fact(FACT_EXPORTED_COMPONENTS, lambda apk, facts: apk.get_manifest_exported_components())
+register_fact(FACT_PUBLIC_COMPONENTS, get_public_components)
+register_fact(FACT_PERMISSIONS, lambda apk, facts: apk.get_permissions())
+register_fact(FACT_LIBRARIES, lambda apk, facts: apk.get_libraries())
+register_fact(FACT_FILES, lambda apk, facts: apk.get_files())
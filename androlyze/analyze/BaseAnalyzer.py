@@ -38,6 +38,14 @@ class BaseAnalyzer(object):
             Storage results. First component is the id of the entry
             and the second a boolean indication if the result has been stored in gridfs.
             Will be created if not supplied!
+        script_filter : dict<str, iterable<str>>, optional (default is None)
+            Maps the hash of an apk to the names of the scripts which shall be run on it.
+            Apks not contained will be analyzed with all scripts.
+            Used for the incremental analysis.
+        dex_duplicates : dict<str, list<Apk>>, optional (default is None)
+            Maps the hash of an apk to the apks sharing the same .dex files.
+            The results of the dex only scripts will also be stored for them.
+            See :py:meth:`.AnalyzeUtil.dedup_dex_script_filter`.
 
         Raises
         ------
@@ -52,6 +60,8 @@ class BaseAnalyzer(object):
         self.__script_list = script_list
         self.__script_hashes = script_hashes
         self.__min_script_needs = min_script_needs
+        self.__script_filter = kwargs.get("script_filter", None)
+        self.__dex_duplicates = kwargs.get("dex_duplicates", None)
 
         if cnt_apks is None:
             # calculate cnt apks if not given
@@ -81,6 +91,12 @@ class BaseAnalyzer(object):
     def get_min_script_needs(self):
         return self.__min_script_needs
 
+    def get_script_filter(self):
+        return self.__script_filter
+
+    def get_dex_duplicates(self):
+        return self.__dex_duplicates
+
     def set_storage(self, value):
         self.__storage = value
 
@@ -116,6 +132,8 @@ class BaseAnalyzer(object):
     script_hashes = property(get_script_hashes, set_script_hashes, del_script_hashes, "list<str>, optional (default is None) : If given, set the hash for the `AndroScript`s")
     apks_or_paths = property(get_apks_or_paths, set_apks_or_paths, del_apks_or_paths, "iterable<str> or list<Apk>, optional (default is []) : List of `Apk` or paths to the apks which shall be analyzed with the given scripts. If you analyze from paths the `import_date` is not set!")
     min_script_needs = property(get_min_script_needs, set_min_script_needs, del_min_script_needs, "tuple<bool> : See :py:method:`ScriptUtil.get_maximal_script_options`.")
+    script_filter = property(get_script_filter, None, None, "dict<str, iterable<str>> : Maps the hash of an apk to the names of the scripts which shall be run on it. Apks not contained will be analyzed with all scripts.")
+    dex_duplicates = property(get_dex_duplicates, None, None, "dict<str, list<Apk>> : Maps the hash of an apk to the apks sharing the same .dex files. The results of the dex only scripts will also be stored for them.")
 
     def analyze(self, *args, **kwargs):
         '''
@@ -0,0 +1,273 @@
+
+# encoding: utf-8
+
+__author__ = "Nils Tobias Schmidt"
+__email__ = "schmidt89 at informatik.uni-marburg.de"
+
+import cPickle
+from os import makedirs
+import os
+from os.path import join, exists, expanduser
+import sys
+from tempfile import NamedTemporaryFile
+
+from androlyze.analyze.AnalysisContext import PICKLE_RECURSION_LIMIT
+from androlyze.log.Log import log
+from androlyze.util import Util
+
+# file extension of a cache entry
+CACHE_ENTRY_EXT = "pickle"
+
+# increase if the format of the entries changes (part of the cache key)
+CACHE_FORMAT_VERSION = 2
+
+class DexAnalysisCache(object):
+    '''
+    Content-addressed on-disk cache for the androguard analysis objects of the .dex files of an apk.
+
+    An entry is identified by the sha256 of each .dex file,
+    the androguard version and the script requirements (see :py:meth:`.gen_key`).
+    Least recently used entries will be evicted if the size of the cache exceeds `max_bytes`.
+
+    The cache directory can be shared between processes.
+    Entries are written to a temporary file and renamed afterwards.
+    '''
+
+    def __init__(self, cache_dir, max_bytes):
+        '''
+        Parameters
+        ----------
+        cache_dir : str
+            Directory where the entries will be kept.
+            Will be created if not existing.
+        max_bytes : int
+            Maximum size of the cache in bytes.
+        '''
+        self.__cache_dir = expanduser(cache_dir)
+        self.__max_bytes = max_bytes
+        # size of the cache, None means not calculated yet
+        self.__cur_bytes = None
+
+        if not exists(self.__cache_dir):
+            try:
+                makedirs(self.__cache_dir)
+            except OSError:
+                # created concurrently
+                pass
+
+    def __str__(self):
+        return '%s(%s, %s bytes)' % (self.__class__.__name__, self.cache_dir, self.max_bytes)
+
+    def get_cache_dir(self):
+        return self.__cache_dir
+
+    def get_max_bytes(self):
+        return self.__max_bytes
+
+    cache_dir = property(get_cache_dir, None, None, "str : Directory where the entries will be kept.")
+    max_bytes = property(get_max_bytes, None, None, "int : Maximum size of the cache in bytes.")
+
+    @staticmethod
+    def gen_key(dex, min_script_needs):
+        ''' Generate the cache key.
+
+        Parameters
+        ----------
+        dex : str or list<str>
+            The raw .dex file(s).
+        min_script_needs : tuple<bool>
+            See :py:meth:`ScriptUtil.get_minimum_script_options`
+
+        Returns
+        -------
+        str
+        '''
+        if not isinstance(dex, (list, tuple)):
+            dex = [dex]
+        dex_hashes = ','.join(Util.sha256(d) for d in dex)
+        return Util.sha256('%s%s%s%s' % (dex_hashes, get_androguard_version(), CACHE_FORMAT_VERSION, tuple(min_script_needs)))
+
+    def get_entry_path(self, key):
+        ''' Get the path for the entry with `key` (use the first two chars as sub directory) '''
+        return join(self.cache_dir, key[:2], '%s.%s' % (key, CACHE_ENTRY_EXT))
+
+    def get(self, key):
+        ''' Load the entry for `key`.
+
+        Parameters
+        ----------
+        key : str
+            See :py:meth:`.gen_key`
+
+        Returns
+        -------
+        object
+            The cached object.
+        None
+            If not in cache.
+        '''
+        path = self.get_entry_path(key)
+        try:
+            with open(path, "rb") as f:
+                obj = cPickle.load(f)
+            # mark as recently used
+            os.utime(path, None)
+            return obj
+        except IOError:
+            # cache miss
+            pass
+        except Exception as e:
+            log.warn("Removing corrupt cache entry %s: %s", path, e)
+            self.__remove(path)
+
+        return None
+
+    def put(self, key, obj):
+        ''' Store `obj` under `key` and evict old entries if needed.
+
+        Errors will only be logged, because the analysis does not depend on the cache.
+
+        Parameters
+        ----------
+        key : str
+            See :py:meth:`.gen_key`
+        obj : object
+            Picklable object.
+
+        Returns
+        -------
+        bool
+            If the entry has been written.
+        '''
+        path = self.get_entry_path(key)
+        entry_dir = os.path.dirname(path)
+        recursion_limit = sys.getrecursionlimit()
+        try:
+            if not exists(entry_dir):
+                try:
+                    makedirs(entry_dir)
+                except OSError:
+                    # created concurrently
+                    pass
+
+            sys.setrecursionlimit(max(recursion_limit, PICKLE_RECURSION_LIMIT))
+            with NamedTemporaryFile(dir = entry_dir, delete = False) as f:
+                tmp_path = f.name
+                try:
+                    cPickle.dump(obj, f, cPickle.HIGHEST_PROTOCOL)
+                except:
+                    f.close()
+                    self.__remove(tmp_path)
+                    raise
+            # atomic on posix
+            os.rename(tmp_path, path)
+            log.debug("Stored %s in %s", key, self)
+
+            self.__add_bytes(os.path.getsize(path))
+            return True
+
+        except Exception as e:
+            log.warn("Could not store %s in %s: %s", key, self, e)
+        finally:
+            sys.setrecursionlimit(recursion_limit)
+
+        return False
+
+    ############################################################
+    #---Eviction
+    ############################################################
+
+    def entries(self):
+        ''' Get all entries.
+
+        Returns
+        -------
+        list<tuple<float, int, str>>
+            Last usage time, size in bytes and path of each entry.
+        '''
+        res = []
+        for dirpath, _, filenames in os.walk(self.cache_dir):
+            for fn in filenames:
+                if fn.endswith(CACHE_ENTRY_EXT):
+                    path = join(dirpath, fn)
+                    try:
+                        st = os.stat(path)
+                        res.append((st.st_mtime, st.st_size, path))
+                    except OSError:
+                        # evicted concurrently
+                        pass
+        return res
+
+    def get_size(self):
+        ''' Get the size of all entries in bytes '''
+        return sum(size for _, size, _ in self.entries())
+
+    def __add_bytes(self, cnt_bytes):
+        ''' Add `cnt_bytes` to the cache size and evict if necessary.
+        The directory only gets scanned if the size probably exceeds `max_bytes`.
+        '''
+        if self.__cur_bytes is None:
+            self.__cur_bytes = self.get_size()
+        else:
+            self.__cur_bytes += cnt_bytes
+
+        if self.__cur_bytes > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        ''' Remove least recently used entries until the cache fits into `max_bytes` '''
+        entries = sorted(self.entries())
+        cur_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if cur_bytes <= self.max_bytes:
+                break
+            if self.__remove(path):
+                cur_bytes -= size
+                log.debug("Evicted %s from %s", path, self)
+
+        self.__cur_bytes = cur_bytes
+
+    @staticmethod
+    def __remove(path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+def get_androguard_version():
+    ''' Get the version of androguard (part of the cache key) '''
+    try:
+        from androguard.core import androconf
+        return androconf.ANDROGUARD_VERSION
+    except (ImportError, AttributeError):
+        return None
+
+# per process cache instance
+_dex_analysis_cache = None
+
+def get_dex_analysis_cache():
+    ''' Get the `DexAnalysisCache` as configured in the settings.
+
+    Returns
+    -------
+    DexAnalysisCache
+    None
+        If the cache is not enabled.
+    '''
+    global _dex_analysis_cache
+
+    from androlyze import settings
+    from androlyze.settings import SECTION_ANALYSIS_CACHE, KEY_ANALYSIS_CACHE_ENABLED, \
+        KEY_ANALYSIS_CACHE_DIR, KEY_ANALYSIS_CACHE_MAX_SIZE
+
+    if _dex_analysis_cache is None:
+        s = settings.singleton
+        if s is not None and s.get_bool((SECTION_ANALYSIS_CACHE, KEY_ANALYSIS_CACHE_ENABLED), default = False):
+            cache_dir = s[(SECTION_ANALYSIS_CACHE, KEY_ANALYSIS_CACHE_DIR)]
+            # MB -> bytes
+            max_bytes = s.get_int((SECTION_ANALYSIS_CACHE, KEY_ANALYSIS_CACHE_MAX_SIZE)) * 1024 ** 2
+            _dex_analysis_cache = DexAnalysisCache(cache_dir, max_bytes)
+            log.info("Using %s", _dex_analysis_cache)
+
+    return _dex_analysis_cache
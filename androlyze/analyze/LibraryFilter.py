@@ -0,0 +1,121 @@
+
+# encoding: utf-8
+
+__author__ = "Nils Tobias Schmidt"
+__email__ = "schmidt89 at informatik.uni-marburg.de"
+
+from androlyze.log.Log import log
+
+# used if no prefixes are configured (the framework classes have always been skipped)
+DEFAULT_LIBRARY_PREFIXES = ("android", "androidx")
+
+# marks the end of a prefix in the trie
+_END = None
+
+class LibraryFilter(object):
+    '''
+    Checks if a class belongs to a well-known library (framework, support libraries, ad sdks, ...)
+    so that scripts can skip it.
+
+    The package prefixes are kept in a trie over the package names (e.g. "com" -> "google" -> "gson"),
+    so a check only costs one dict lookup per package of the class name
+    and doesn't depend on the number of prefixes.
+    A prefix only matches whole package names ("android" matches "android/app/Activity" but not "androidx/Foo").
+    '''
+
+    def __init__(self, prefixes):
+        '''
+        Parameters
+        ----------
+        prefixes : iterable<str>
+            Package prefixes in java ("com.google.gson") or dalvik notation ("Lcom/google/gson/").
+        '''
+        self.__prefixes = []
+        self.__trie = {}
+        for prefix in prefixes:
+            self.add_prefix(prefix)
+
+    def __str__(self):
+        return '%s(%d prefixes)' % (self.__class__.__name__, len(self.prefixes))
+
+    def get_prefixes(self):
+        return self.__prefixes
+
+    prefixes = property(get_prefixes, None, None, "list<str> : The package prefixes (java notation).")
+
+    @staticmethod
+    def split_name(name):
+        ''' Split the class or package `name` (java or dalvik notation) into its parts.
+
+        Examples
+        --------
+        >>> LibraryFilter.split_name("Lcom/google/gson/Gson;")
+        ['com', 'google', 'gson', 'Gson']
+        >>> LibraryFilter.split_name("com.google.gson")
+        ['com', 'google', 'gson']
+        '''
+        name = name.strip()
+        if name.startswith("L") and ("/" in name or name.endswith(";")):
+            name = name[1:]
+        name = name.rstrip(";").replace(".", "/")
+        return [part for part in name.split("/") if part]
+
+    def add_prefix(self, prefix):
+        ''' Add the package `prefix` (java or dalvik notation) '''
+        parts = self.split_name(prefix)
+        if not parts:
+            return
+
+        node = self.__trie
+        for part in parts:
+            node = node.setdefault(part, {})
+        node[_END] = True
+        self.__prefixes.append('.'.join(parts))
+
+    def is_library_class(self, class_name):
+        ''' Check if the class with `class_name` (java or dalvik notation) belongs to a library.
+
+        Parameters
+        ----------
+        class_name : str
+
+        Returns
+        -------
+        bool
+        '''
+        node = self.__trie
+        # the last part is the class name itself
+        for part in self.split_name(class_name)[:-1]:
+            node = node.get(part)
+            if node is None:
+                return False
+            if _END in node:
+                return True
+
+        return False
+
+# per process filter instance
+_library_filter = None
+
+def get_library_filter():
+    ''' Get the `LibraryFilter` with the prefixes configured in the settings.
+    Uses `DEFAULT_LIBRARY_PREFIXES` if none are configured.
+
+    Returns
+    -------
+    LibraryFilter
+    '''
+    global _library_filter
+
+    from androlyze import settings
+    from androlyze.settings import SECTION_LIBRARY_FILTER, KEY_LIBRARY_FILTER_PREFIXES
+
+    if _library_filter is None:
+        prefixes = None
+        s = settings.singleton
+        if s is not None:
+            prefixes = s.get_list((SECTION_LIBRARY_FILTER, KEY_LIBRARY_FILTER_PREFIXES), default = None)
+        _library_filter = LibraryFilter(prefixes or DEFAULT_LIBRARY_PREFIXES)
+        log.debug("Using %s", _library_filter)
+
+    return _library_filter
@@ -0,0 +1,228 @@
+
+# encoding: utf-8
+
+__author__ = "Nils Tobias Schmidt"
+__email__ = "schmidt89 at informatik.uni-marburg.de"
+
+from collections import OrderedDict
+import os
+import signal
+import threading
+from time import time
+
+from androlyze.analyze.exception import BudgetExceededError
+from androlyze.log.Log import log
+from androlyze.util.Util import get_rss
+
+# names of the budgets
+BUDGET_APK = "apk"
+BUDGET_SCRIPT = "script"
+
+# exceeded resources
+RESOURCE_TIME = "time"
+RESOURCE_MEMORY = "memory"
+
+# seconds between two checks of the active budgets
+CHECK_INTERVAL = 0.5
+
+# active budgets (outermost first)
+_active = []
+# signal handler before the first budget has been entered
+_prev_handler = None
+
+class ResourceBudget(object):
+    '''
+    Wall time and memory (RSS) budget for a block of code (e.g. one script or all scripts on one apk).
+
+    The memory budget limits the growth of the RSS since the budget has been entered,
+    because the RSS of a long-lived worker process does not drop after a big apk.
+
+    If the budget is exceeded, a `BudgetExceededError` will be raised inside the block (only once).
+    The active budgets are checked periodically by a SIGALRM timer,
+    so budgets can be nested (the outermost exceeded budget is reported first).
+
+    The budget is only enforced in the main thread on platforms supporting `signal.setitimer`.
+
+    Examples
+    --------
+    >>> try:
+    ...     with ResourceBudget(BUDGET_SCRIPT, time_limit = 60):
+    ...         script.analyze(...)
+    ... except BudgetExceededError as e:
+    ...     print e.budget.exceeded
+    time
+    '''
+
+    def __init__(self, name, time_limit = None, max_rss_growth = None):
+        '''
+        Parameters
+        ----------
+        name : str
+            Name of the budget, e.g. `BUDGET_APK`.
+        time_limit : float, optional (default is None)
+            Wall time in seconds.
+        max_rss_growth : int, optional (default is None)
+            Maximum growth of the memory usage (RSS) of the process in KB.
+        '''
+        self.__name = name
+        self.__time_limit = time_limit
+        self.__max_rss_growth = max_rss_growth
+        self.__start = None
+        self.__start_rss = None
+        self.__exceeded = None
+        self.__enforced = False
+
+    def __str__(self):
+        return '%s budget(time limit: %s s, max rss growth: %s KB)' % (self.name, self.time_limit, self.max_rss_growth)
+
+    def get_name(self):
+        return self.__name
+
+    def get_time_limit(self):
+        return self.__time_limit
+
+    def get_max_rss_growth(self):
+        return self.__max_rss_growth
+
+    def get_exceeded(self):
+        return self.__exceeded
+
+    name = property(get_name, None, None, "str : Name of the budget.")
+    time_limit = property(get_time_limit, None, None, "float : Wall time in seconds (None means unlimited).")
+    max_rss_growth = property(get_max_rss_growth, None, None, "int : Maximum growth of the memory usage (RSS) in KB (None means unlimited).")
+    exceeded = property(get_exceeded, None, None, "str : The exceeded resource (`RESOURCE_TIME` or `RESOURCE_MEMORY`). None if not exceeded.")
+
+    def is_limited(self):
+        ''' Check if any limit is set '''
+        return self.time_limit is not None or self.max_rss_growth is not None
+
+    def check(self):
+        ''' Check if the budget is exceeded.
+
+        Returns
+        -------
+        str
+            The exceeded resource.
+        None
+            If not exceeded.
+        '''
+        if self.__exceeded is not None or self.__start is None:
+            return None
+
+        if self.time_limit is not None and time() - self.__start > self.time_limit:
+            return RESOURCE_TIME
+
+        if self.max_rss_growth is not None and self.__start_rss is not None:
+            rss = get_rss(os.getpid())
+            if rss is not None and rss - self.__start_rss > self.max_rss_growth:
+                return RESOURCE_MEMORY
+
+        return None
+
+    def description_dict(self):
+        ''' Describe the (exceeded) budget for the result meta infos '''
+        return OrderedDict([("budget", self.name), ("resource", self.exceeded),
+                            ("time limit", self.time_limit), ("max rss growth", self.max_rss_growth)])
+
+    def __enter__(self):
+        self.__start = time()
+        self.__start_rss = get_rss(os.getpid()) if self.max_rss_growth is not None else None
+        self.__exceeded = None
+        self.__enforced = self.is_limited() and _can_enforce()
+        if self.__enforced:
+            _push(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.__enforced:
+            _pop(self)
+        self.__enforced = False
+        return False
+
+    def _set_exceeded(self, resource):
+        self.__exceeded = resource
+
+############################################################
+#---Timer
+############################################################
+
+def _can_enforce():
+    if not hasattr(signal, "setitimer"):
+        return False
+    if not isinstance(threading.current_thread(), threading._MainThread):
+        log.debug("Resource budgets can only be enforced in the main thread")
+        return False
+    return True
+
+def _on_alarm(signum, frame):
+    ''' Check the active budgets and raise a `BudgetExceededError` for the outermost exceeded one '''
+    for budget in list(_active):
+        resource = budget.check()
+        if resource is not None:
+            budget._set_exceeded(resource)
+            raise BudgetExceededError(budget)
+
+def _push(budget):
+    global _prev_handler
+
+    if signal.getsignal(signal.SIGALRM) is not _on_alarm:
+        _prev_handler = signal.signal(signal.SIGALRM, _on_alarm)
+    _active.append(budget)
+    # (re)arm, timers are not inherited by forked processes (but the active budgets are)
+    signal.setitimer(signal.ITIMER_REAL, CHECK_INTERVAL, CHECK_INTERVAL)
+
+def _pop(budget):
+    if budget in _active:
+        _active.remove(budget)
+    if not _active:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, _prev_handler if _prev_handler is not None else signal.SIG_DFL)
+
+############################################################
+#---Settings
+############################################################
+
+# per process limits: apk time, apk max rss growth, script time, script max rss growth
+_limits = None
+
+def get_limits():
+    ''' Get the configured limits.
+
+    Returns
+    -------
+    tuple<int>
+        Time limit (seconds) and max rss growth (KB) for each apk, time limit and max rss growth for each script.
+        None means unlimited.
+    '''
+    global _limits
+
+    if _limits is None:
+        from androlyze import settings
+        from androlyze.settings import SECTION_RESOURCE_BUDGET, KEY_RESOURCE_BUDGET_APK_TIME_LIMIT, \
+            KEY_RESOURCE_BUDGET_APK_MEMORY_LIMIT, KEY_RESOURCE_BUDGET_SCRIPT_TIME_LIMIT, \
+            KEY_RESOURCE_BUDGET_SCRIPT_MEMORY_LIMIT
+
+        s = settings.singleton
+        if s is None:
+            return (None, ) * 4
+
+        def get(key):
+            return s.get_int((SECTION_RESOURCE_BUDGET, key), default = None)
+
+        def mb2kb(val):
+            return val * 1024 if val is not None else None
+
+        _limits = (get(KEY_RESOURCE_BUDGET_APK_TIME_LIMIT), mb2kb(get(KEY_RESOURCE_BUDGET_APK_MEMORY_LIMIT)),
+                   get(KEY_RESOURCE_BUDGET_SCRIPT_TIME_LIMIT), mb2kb(get(KEY_RESOURCE_BUDGET_SCRIPT_MEMORY_LIMIT)))
+
+    return _limits
+
+def apk_budget():
+    ''' Create the (configured) `ResourceBudget` for analyzing one apk '''
+    time_limit, max_rss_growth, _, _ = get_limits()
+    return ResourceBudget(BUDGET_APK, time_limit, max_rss_growth)
+
+def script_budget():
+    ''' Create the (configured) `ResourceBudget` for running one script '''
+    _, _, time_limit, max_rss_growth = get_limits()
+    return ResourceBudget(BUDGET_SCRIPT, time_limit, max_rss_growth)
@@ -6,11 +6,10 @@ __email__ = "schmidt89 at informatik.uni-marburg.de"
 
 import sys
 from threading import Lock
-from time import time
+from time import time, sleep
 
 from celery import states, task
-from celery.canvas import group
-from celery.result import GroupResult
+from celery.result import ResultSet
 from celery.signals import before_task_publish, after_task_publish
 
 # init celery
@@ -24,15 +23,31 @@ from androlyze.analyze.distributed.exception import NetworkError
 from androlyze.celery import CeleryUtil, CeleryConstants, celerysettings
 from androlyze.log.Log import log, clilog
 from androlyze.celery.TaskCollection import TaskCollection
+from androlyze.storage.apk import ApkStorageFactory
 from androlyze.storage.exception import DatabaseOpenError, \
-    DatabaseLoadException
+    DatabaseLoadException, StorageException
+from androlyze.storage.quarantine.QuarantineStorage import record_failures
 from androlyze.util import Util
 from celery.registry import tasks
 
 
+# seconds to wait until the tasks in flight are polled again
+RESULT_POLL_INTERVAL = 0.5
+
 class DistributedAnalyzer(BaseAnalyzer):
     ''' Distributed analyzer which uses celery.
     The analysis of each apk is seen as a single task and gets done by a worker which reads from an asynchronous message queue.
+
+    If `apks_per_task` is greater than 1, each task carries a chunk of apks (see :py:class:`.AnalyzeChunkTask`).
+    The progress and the results are still tracked per apk.
+
+    The tasks are published while the analysis is running.
+    At most `max_tasks_in_flight` tasks are published but not yet finished,
+    so only this number of (serialized) apks is held in memory.
+
+    With `blob_transport` the apks are put into the apk storage (see :py:mod:`.ApkStorageFactory`) once
+    and only their hash and meta infos are sent (like `serialize_apks` = False),
+    so that the broker throughput does not depend on the apk size.
     '''
 
     def __init__(self, *args, **kwargs):
@@ -45,24 +60,49 @@ class DistributedAnalyzer(BaseAnalyzer):
             If true, serialize .apk .
             Otherwise id (hash) of the apk will be send and fetched by the worker from the result db.
             Be sure to import the apks to the result db first!
+        apks_per_task : int, optional (default is the value from the config)
+            Number of apks sent in one task.
+        max_tasks_in_flight : int, optional (default is the value from the config)
+            Maximum number of published but not yet finished tasks.
+        blob_transport : bool, optional (default is the value from the config)
+            If true (and `serialize_apks`), put the apks into the apk storage
+            and only send their hash rather than the raw data.
         '''
         serialize_apks = kwargs.get("serialize_apks", True)
+        apks_per_task = kwargs.get("apks_per_task", None)
+        max_tasks_in_flight = kwargs.get("max_tasks_in_flight", None)
+        blob_transport = kwargs.get("blob_transport", None)
 
         super(DistributedAnalyzer, self).__init__(*args, **kwargs)
 
-        # list(apk_path, _apk, is_apk)
-        self.__apks = list(AnalyzeUtil.apk_gen(self.apks_or_paths))
-
         # result group
         self.group_result = None
 
         # serialize .apk data
         self.__serialize_apks = serialize_apks
-        if serialize_apks:
+        if blob_transport is None:
+            blob_transport = celerysettings.CELERY_ANALYSIS_BLOB_TRANSPORT
+        self.__blob_transport = serialize_apks and blob_transport
+        if self.blob_transport:
+            clilog.info("Will put .apk data into the apk storage and send id of apks!")
+        elif serialize_apks:
             clilog.info("Will serialize .apk data!")
         else:
             clilog.info("Will send id of apks!")
 
+        if apks_per_task is None:
+            apks_per_task = celerysettings.CELERY_ANALYSIS_APKS_PER_TASK
+        self.__apks_per_task = max(1, apks_per_task)
+        if self.apks_per_task > 1:
+            clilog.info("Will send %d apks per task!", self.apks_per_task)
+
+        if max_tasks_in_flight is None:
+            max_tasks_in_flight = celerysettings.CELERY_ANALYSIS_MAX_TASKS_IN_FLIGHT
+        self.__max_tasks_in_flight = max(1, max_tasks_in_flight)
+
+        # task id -> number of apks in the task
+        self.__task_sizes = {}
+
         self.analyze_stats_view = None
 
         # stats view for cli
@@ -70,7 +110,8 @@ class DistributedAnalyzer(BaseAnalyzer):
         self.analyze_stats_view.daemon = True
 
         # the `TaskCollection` for the analysis tasks
-        self.task_collection = TaskCollection(self._cnt_apks)
+        cnt_tasks = (self._cnt_apks + self.apks_per_task - 1) // self.apks_per_task
+        self.task_collection = TaskCollection(cnt_tasks)
 
         # register celery signals
         self.register_signals()
@@ -98,18 +139,24 @@ class DistributedAnalyzer(BaseAnalyzer):
     def get_serialize_apks(self):
         return self.__serialize_apks
 
+    def get_blob_transport(self):
+        return self.__blob_transport
+
     def get_apks(self):
-        return self.__apks
+        return AnalyzeUtil.apk_gen(self.apks_or_paths)
+
+    def get_apks_per_task(self):
+        return self.__apks_per_task
 
-    def set_apks(self, value):
-        self.__apks = value
+    def get_max_tasks_in_flight(self):
+        return self.__max_tasks_in_flight
+
+    def is_chunked(self):
+        return self.__apks_per_task > 1
 
     def set_cnt_apks(self, value):
         self.__cnt_apks = value
 
-    def del_apks(self):
-        del self.__apks
-
     def del_cnt_apks(self):
         del self.__cnt_apks
 
@@ -122,9 +169,13 @@ class DistributedAnalyzer(BaseAnalyzer):
     def del_group_result(self):
         del self.__group_result
 
-    group_result = property(get_group_result, set_group_result, del_group_result, "GroupResult : The result collection object.")
-    apks = property(get_apks, set_apks, del_apks, "list<tuple<str, Apk, bool>> : Path to .apk, instance of `Apk`, bool what determines if current element of apks_or_paths is an `Apk`")
+    group_result = property(get_group_result, set_group_result, del_group_result, "ResultSet : The results of the tasks in flight.")
+    apks = property(get_apks, None, None, "generator<tuple<str, Apk, bool>> : Path to .apk, instance of `Apk`, bool what determines if current element of apks_or_paths is an `Apk`. Created lazily on each access.")
     serialize_apks = property(get_serialize_apks, None, None, "bool : If true, serialize .apk. Otherwise id (hash) of the apk will be send and fetched by the worker from the result db.")
+    blob_transport = property(get_blob_transport, None, None, "bool : If true, the apks are put into the apk storage and only their id (hash) will be send.")
+    apks_per_task = property(get_apks_per_task, None, None, "int : Number of apks sent in one task.")
+    chunked = property(is_chunked, None, None, "bool : If each task carries a chunk of apks.")
+    max_tasks_in_flight = property(get_max_tasks_in_flight, None, None, "int : Maximum number of published but not yet finished tasks.")
     analyze_stats_view = property(get_analyze_stats_view, set_analyze_stats_view, del_analyze_stats_view, "AnalysisStatsView : Thread showing current analysis progress.")
     lock = property(get_lock, set_lock, del_lock, "Lock")
 
@@ -135,8 +186,9 @@ class DistributedAnalyzer(BaseAnalyzer):
     def register_signals(self):
         ''' Register celery signals for task publishing '''
         # register signals
-        before_task_publish.connect(self.before_task_publish_action, sender = CeleryConstants.get_analyze_task_name())
-        after_task_publish.connect(self.after_task_publish_action, sender = CeleryConstants.get_analyze_task_name())
+        for task_name in (CeleryConstants.get_analyze_task_name(), CeleryConstants.get_analyze_chunk_task_name()):
+            before_task_publish.connect(self.before_task_publish_action, sender = task_name)
+            after_task_publish.connect(self.after_task_publish_action, sender = task_name)
 
     ############################################################
     #---Analysis progress display
@@ -173,6 +225,50 @@ class DistributedAnalyzer(BaseAnalyzer):
     #---Task arguments generators
     ############################################################
 
+    @staticmethod
+    def get_apk_hash(apk_zipfile_or_hash, is_id, fast_apk):
+        ''' Get the hash of the apk from the task arguments '''
+        if is_id:
+            return apk_zipfile_or_hash
+        if fast_apk is not None:
+            return fast_apk.hash
+        return Util.sha256(apk_zipfile_or_hash)
+
+    def get_dex_duplicates_args(self, apk_zipfile_or_hash, is_id, fast_apk):
+        ''' Get the apks sharing the .dex files with the apk (see `dex_duplicates`).
+
+        Returns
+        -------
+        list<FastApk>
+        None
+            If no duplicates.
+        '''
+        if self.dex_duplicates:
+            return self.dex_duplicates.get(self.get_apk_hash(apk_zipfile_or_hash, is_id, fast_apk))
+        return None
+
+    def get_script_args(self, apk_zipfile_or_hash, is_id, fast_apk):
+        ''' Get the script package names and script hashes for the apk.
+        Only the scripts given by the `script_filter` will be used.
+
+        Returns
+        -------
+        tuple<list<str>, list<str>>
+        '''
+        script_list = self.script_list
+        script_hashes = self.script_hashes
+
+        if self.script_filter:
+            apk_hash = self.get_apk_hash(apk_zipfile_or_hash, is_id, fast_apk)
+            script_list = AnalyzeUtil.filter_scripts(self.script_list, apk_hash, self.script_filter)
+
+            if script_hashes is not None:
+                # hashes are sorted by script name
+                name_to_hash = dict(zip(sorted(AnalyzeUtil.script_name(s) for s in self.script_list), self.script_hashes))
+                script_hashes = [name_to_hash[AnalyzeUtil.script_name(s)] for s in script_list]
+
+        return Util.module_names_from_class(script_list), script_hashes
+
     def send_id_args_generator(self, apk_gen):
         ''' Generator over arguments for sending of apk id.
 
@@ -184,11 +280,11 @@ class DistributedAnalyzer(BaseAnalyzer):
             rather than over the zip files.
             See :py:method:`.AnalyzeUtil.apk_id_or_raw_data_gen` to get such a generator.
         '''
-        # get package names from initialized scripts
-        script_packages = Util.module_names_from_class(self.script_list)
-
         for apk_zipfile_or_hash, is_id, fastapk in apk_gen:
-            yield script_packages, self.min_script_needs, self.script_hashes, apk_zipfile_or_hash, is_id, fastapk
+            # get package names from initialized scripts
+            script_packages, script_hashes = self.get_script_args(apk_zipfile_or_hash, is_id, fastapk)
+            dex_duplicates = self.get_dex_duplicates_args(apk_zipfile_or_hash, is_id, fastapk)
+            yield script_packages, self.min_script_needs, script_hashes, apk_zipfile_or_hash, is_id, fastapk, dex_duplicates
 
     def send_apk_args_generator(self, apk_gen):
         ''' Generator over arguments for sending APKs.
@@ -201,11 +297,22 @@ class DistributedAnalyzer(BaseAnalyzer):
             rather than over the zip files.
             See :py:method:`.AnalyzeUtil.apk_id_or_raw_data_gen` to get such a generator.
         '''
-        # get package names from initialized scripts
-        script_packages = Util.module_names_from_class(self.script_list)
-
         for apk_zipfile_or_hash, is_id, fast_apk in apk_gen:
-            yield script_packages, self.min_script_needs, self.script_hashes, apk_zipfile_or_hash, is_id, fast_apk
+            # get package names from initialized scripts
+            script_packages, script_hashes = self.get_script_args(apk_zipfile_or_hash, is_id, fast_apk)
+            dex_duplicates = self.get_dex_duplicates_args(apk_zipfile_or_hash, is_id, fast_apk)
+            yield script_packages, self.min_script_needs, script_hashes, apk_zipfile_or_hash, is_id, fast_apk, dex_duplicates
+
+    def chunk_args_generator(self, args_gen):
+        ''' Generator over the arguments for the `AnalyzeChunkTask` (chunks of `apks_per_task` apks).
+
+        Parameters
+        ----------
+        args_gen : generator<tuple>
+            Generator over the arguments of the `AnalyzeTask` for each apk.
+        '''
+        for jobs in Util.chunks(args_gen, self.apks_per_task):
+            yield (jobs, )
 
     ############################################################
     #---Analysis
@@ -230,6 +337,7 @@ class DistributedAnalyzer(BaseAnalyzer):
         try:
             # get analyze task
             analyze_task = tasks[CeleryConstants.get_analyze_task_name()]
+            analyze_chunk_task = tasks[CeleryConstants.get_analyze_chunk_task_name()]
 
             # create storage
             storage.create_or_open_sub_storages()
@@ -237,48 +345,50 @@ class DistributedAnalyzer(BaseAnalyzer):
             # send tasks
             start = time()
 
-            # apk generator over .apk or apk hashes
-            apk_gen = AnalyzeUtil.apk_id_or_raw_data_gen(self.apks, force_raw_data = self.serialize_apks)
-
-            clilog.info("Task publishing progress:")
+            # put .apks into the apk storage and send only their ids
+            if self.blob_transport:
+                log.info("putting .apks into the apk storage and sending ids of apks")
+                apk_storage = ApkStorageFactory.get_apk_storage(celerysettings.settings)
+                apk_gen = AnalyzeUtil.apk_id_via_apk_storage_gen(self.apks, apk_storage)
+                args_gen = self.send_id_args_generator(apk_gen)
 
             # send and serialize .apks
             # if analysis via path serialize them!
-            if self.serialize_apks:
+            elif self.serialize_apks:
                 log.info("sending .apks to message broker")
-                self.group_result = group_result = GroupResult(results = [])
-
-                for args in self.send_apk_args_generator(apk_gen):
-                    task = analyze_task.delay(*args)
-                    group_result.add(task)
+                # apk generator over .apk (lazy, the apks are read while publishing)
+                apk_gen = AnalyzeUtil.apk_id_or_raw_data_gen(self.apks, force_raw_data = True)
+                args_gen = self.send_apk_args_generator(apk_gen)
 
             # send only apk id and let fetch via mongodb
             else:
                 log.info("sending ids of apks")
+                apk_gen = AnalyzeUtil.apk_id_or_raw_data_gen(self.apks)
+                args_gen = self.send_id_args_generator(apk_gen)
 
-                task_group = group((analyze_task.s(*args) for args in self.send_id_args_generator(apk_gen)))
-
-                # publish tasks
-                self.group_result = task_group()
+            if self.chunked:
+                args_gen = self.chunk_args_generator(args_gen)
+                publish = lambda args: analyze_chunk_task.apply_async(args, **CeleryUtil.get_chunk_time_limits(len(args[0])))
+            else:
+                publish = analyze_task.apply_async
 
-            log.info("sending took %ss", (time() - start))
             sys.stderr.write("\nAnalysis progress:\n")
 
             # start showing analysis progress
             self.analyze_stats_view.start()
 
-            # wait for results
-            log.debug("joining on ResultGroup ... ")
-
             # setup callback
-            callback_func = self.get_callback_func(self.success_handler, self.error_handler)
-            CeleryUtil.join_native(self.group_result, propagate = False, callback = callback_func)
+            success_handler = self.chunk_success_handler if self.chunked else self.success_handler
+            callback_func = self.get_callback_func(success_handler, self.error_handler)
+
+            # publish tasks and wait for results
+            self.publish_n_join(publish, args_gen, callback_func)
 
             clilog.info("\nanalysis done ... ")
             log.info("distributed analysis took %ss", (time() - start))
 
             return self.stop_analysis_view()
-        except DatabaseOpenError as e:
+        except (DatabaseOpenError, StorageException) as e:
             log.critical(e)
             return 0
 
@@ -290,21 +400,71 @@ class DistributedAnalyzer(BaseAnalyzer):
 
             if celerysettings.CELERY_TASK_REVOCATION_ENABLED:
                 # revoke tasks
-                if self.group_result is None:
-                    # revoke via task ids
-                    log.debug("revoking while publishing tasks ...")
-
-                    self.task_collection.revoke_all(terminate = True, signal = 'SIGKILL')
-                else:
-                    # revoke via GroupResult if yet available/created
-                    # first available after all tasks have been send
-                    self.group_result.revoke(terminate = True, signal = 'SIGKILL')
+                # revoke via task ids (the tasks in flight)
+                # the remaining apks have not been published yet
+                self.task_collection.revoke_all(terminate = True, signal = 'SIGKILL')
                 log.warn("revoked tasks and killed workers ...")
 
             #return number of analyzed apks
             return self.stop_analysis_view()
 
 
+    def publish_n_join(self, publish, args_gen, callback):
+        ''' Publish the tasks and wait for their results.
+
+        At most `max_tasks_in_flight` tasks are published but not yet finished.
+        Each task in flight is polled on its own and the window is refilled as soon as tasks finished.
+        The iteration over a `ResultSet` is not used, because leaving it early (to refill)
+        loses the results it already fetched from the backend but not yet yielded.
+
+        Parameters
+        ----------
+        publish : tuple -> AsyncResult
+            Publishes the task for the arguments.
+        args_gen : generator<tuple>
+            Generator over the task arguments.
+        callback : str -> dict -> object
+            Gets the task id and the task meta (see :py:meth:`.CeleryUtil.join_native`).
+        '''
+        max_in_flight = self.max_tasks_in_flight
+        # task id -> AsyncResult
+        in_flight = {}
+        args_gen = iter(args_gen)
+        exhausted = False
+
+        while True:
+            # refill window
+            refilled = False
+            while not exhausted and len(in_flight) < max_in_flight:
+                try:
+                    args = next(args_gen)
+                except StopIteration:
+                    exhausted = True
+                    log.info("all tasks published")
+                    break
+                async_result = publish(args)
+                in_flight[async_result.id] = async_result
+                refilled = True
+
+            if not in_flight:
+                break
+
+            if refilled:
+                log.debug("joining on %d tasks in flight ... ", len(in_flight))
+                self.group_result = ResultSet(in_flight.values())
+
+            finished = [async_result for async_result in in_flight.values() if async_result.ready()]
+            if not finished:
+                sleep(RESULT_POLL_INTERVAL)
+                continue
+
+            for async_result in finished:
+                task_id = async_result.id
+                callback(task_id, CeleryUtil.get_task_meta(async_result))
+                del in_flight[task_id]
+                self.task_collection.task_ids.discard(task_id)
+                self.__task_sizes.pop(task_id, None)
+
     ############################################################
     #---Callbacks
     ############################################################
@@ -335,16 +495,51 @@ class DistributedAnalyzer(BaseAnalyzer):
 
     def success_handler(self, task_id, result):
         ''' Handler for a successful task.
-        Fetches the result from the result database and stores it in the file system. '''
+        Records the failures in the quarantine and handles the storage results (see :py:meth:`.store_results`). '''
         if result is not None:
-            # keep ids of mongodb entries
-            # result may hold multiple results
-            for res in result:
-                self.add_storage_result(res)
+            storage_results, failures = result
+            # the quarantine database of the workers is not shared
+            record_failures(failures)
+            self.store_results(storage_results)
+
+    def chunk_success_handler(self, task_id, result):
+        ''' Handler for a successful `AnalyzeChunkTask`.
+        Handles the result of each apk like :py:meth:`.success_handler`. '''
+        if result is not None:
+            for apk_hash, apk_result, failures in result:
+                record_failures(failures)
+                if apk_result is None:
+                    log.error("Analysis of apk %s failed (task %s)", apk_hash, task_id)
+                else:
+                    self.store_results(apk_result)
 
-            # store analysis results
-            # doesn't raise a DatabaseLoadException due to wait_for_db
-            self.storage.fetch_results_from_mongodb(result, wait_for_db = True)
+    def store_results(self, storage_results):
+        ''' Fetches the results of an apk from the result database and stores them in the file system. '''
+        # keep ids of mongodb entries
+        # result may hold multiple results
+        for res in storage_results:
+            self.add_storage_result(res)
+
+        # store analysis results
+        # doesn't raise a DatabaseLoadException due to wait_for_db
+        self.storage.fetch_results_from_mongodb(storage_results, wait_for_db = True)
+
+    def get_task_apk_cnts(self, task_id, result, task_failed):
+        ''' Get the number of successfully and unsuccessfully analyzed apks of the task.
+
+        Returns
+        -------
+        tuple<int, int>
+        '''
+        if not self.chunked:
+            # apk recorded in the quarantine
+            return (0, 1) if task_failed or result is None or result[1] else (1, 0)
+
+        if task_failed or result is None:
+            return 0, self.__task_sizes.get(task_id, 1)
+
+        cnt_failed = sum(1 for _, apk_result, _ in result if apk_result is None)
+        return len(result) - cnt_failed, cnt_failed
 
     def get_callback_func(self, handle_success, handle_error = None):
         '''
@@ -392,17 +587,17 @@ class DistributedAnalyzer(BaseAnalyzer):
                 if handle_error is not None:
                     handle_error(task_id, result, state, traceback)
 
-                # we need locking here because operation is not atomic
-                with self.lock:
-                    self.analyze_stats_view.failed_tasks += 1
-
             else:
                 if handle_success is not None:
                     handle_success(task_id, result)
 
-                # we need locking here because operation is not atomic
-                with self.lock:
-                    self.analyze_stats_view.successful_tasks += 1
+            # progress is counted per apk
+            cnt_successful, cnt_failed = self.get_task_apk_cnts(task_id, result, task_failed)
+
+            # we need locking here because operation is not atomic
+            with self.lock:
+                self.analyze_stats_view.successful_tasks += cnt_successful
+                self.analyze_stats_view.failed_tasks += cnt_failed
 
         return callback
 
@@ -412,15 +607,19 @@ class DistributedAnalyzer(BaseAnalyzer):
 
     def before_task_publish_action(self, *args, **kwargs):
         ''' Collect task ids before they get published '''
-        task_id = kwargs["body"]["id"]
+        body = kwargs["body"]
+        task_id = body["id"]
         log.debug("will publish task %s", task_id)
-        self.task_collection.task_ids.append(task_id)
+        self.task_collection.task_ids.add(task_id)
+        if self.chunked:
+            # first argument are the jobs
+            self.__task_sizes[task_id] = len(body["args"][0])
 
     def after_task_publish_action(self, exchange=None, body=None, routing_key = None, signal = None, sender = None,
                                   # take unknown keywords for newer APIs
                                    **kwargs):
         '''
-        Inform user about published tasks.
+        Count published tasks.
 
         Function will be executed on the task sender after the task has been published.
 
@@ -439,8 +638,9 @@ class DistributedAnalyzer(BaseAnalyzer):
         '''
         self.task_collection.inc_send_tasks()
 
+        # analysis progress is shown while publishing, so only log
         task_id = body["id"]
-        Util.print_dyn_progress("Send tasks: %d, current task id: %s, queue: %s" % (self.task_collection.send_tasks.value, task_id, routing_key))
+        log.debug("Send tasks: %d, current task id: %s, queue: %s", self.task_collection.send_tasks.value, task_id, routing_key)
 
     ############################################################
     #---Other
@@ -8,7 +8,9 @@ __email__ = "schmidt89 at informatik.uni-marburg.de"
 
 from androlyze.analyze import AnalyzeUtil
 from androlyze.analyze.distributed.exception import ScriptHashValidationError
+from androlyze.analyze.distributed.tasks.ApkPrefetcher import get_apk_prefetcher
 from androlyze.analyze.exception import AnalyzeError
+from androlyze.celery import CeleryUtil
 from androlyze.celery.CeleryConstants import *
 from androlyze.celery.celerysettings import *
 from androlyze.celery.faulttolerance.RetryDecorator import RetryDecorator
@@ -16,20 +18,18 @@ from androlyze.celery.faulttolerance.RetryableTask import RetryableTask
 from androlyze.log.Log import log
 from androlyze.model.script import ScriptUtil
 from androlyze.settings import *
-from androlyze.storage.exception import StorageException, DatabaseLoadException, \
-    DatabaseOpenError
+from androlyze.storage.exception import StorageException, DatabaseLoadException
+from androlyze.storage.quarantine.QuarantineStorage import record_failure, FAILURE_TIME, \
+    collect_failures, pop_collected_failures
 from androlyze.storage.resultdb import ResultDatabaseStorage
 from androlyze.storage.resultdb.ResultDatabaseStorage import CONNECTION_FAIL_ERRORS
 from androlyze.util import Util
 from billiard.exceptions import SoftTimeLimitExceeded
 from celery.app.task import Task
-from celery.signals import task_prerun
+from celery.exceptions import Retry
 from gridfs.errors import NoFile
 from androlyze.celery import celerysettings
 
-# prefetch pool for apks (only for mongodb as distributed fs)
-apk_prefetch_pool = {}
-
 class AnalyzeTask(Task):
     ''' The actual analysis task performed by the celery workers.
     '''
@@ -50,9 +50,6 @@ class AnalyzeTask(Task):
         self.__script_hashes = None
         self.__androscripts = None
 
-        # register signal to prefetch apks
-        task_prerun.connect(self.prefetch_apk)
-
         log.debug("%s init", self)
 
     def get_apk_storage(self):
@@ -97,30 +94,28 @@ class AnalyzeTask(Task):
     apk_storage = property(get_apk_storage, set_apk_storage, del_apk_storage, "ApkCopyInterface : APK Storage")
     
     ############################################################
-    #---Signals
+    #---Prefetching
     ############################################################
 
-    def prefetch_apk(self, task_id, task, *args, **kwargs):
-        ''' Prefetch the `APK`s if mongodb is used as distributed apk storage.
-        If the prefetch fails, the task will be retried.
+    def get_prefetcher(self):
+        ''' Get the `ApkPrefetcher` of the process (None if the task does not prefetch).
+
+        A single apk is fetched by the task itself: a worker process only reserves one task at a time
+        (see CELERYD_PREFETCH_MULTIPLIER), so there is no next apk it could fetch in the background.
         '''
-        try:
-            # open db if not already opened
-            self.__setup_db()
-
-            args = kwargs["args"]
-            _, _, _, apk_zipfile_or_hash, is_hash, fast_apk = args
-            # prefetch apk via hash if given
-            if is_hash:
-                # get apk from the apk storage
-                eandro_apk = self.__get_apk_from_storage(apk_zipfile_or_hash, apk = fast_apk)
-                if eandro_apk is not None:
-                    # store in prefetch pool
-                    apk_prefetch_pool[apk_zipfile_or_hash] = eandro_apk
-                    log.info("prefetched: %s, size apk cache: %d", eandro_apk.short_description(), len(apk_prefetch_pool))
-                    # abort if file not in db!
-        except (NoFile, DatabaseOpenError, DatabaseLoadException) as e:
-            log.exception(e)
+        return None
+
+    def prefetch_apks(self, apks):
+        ''' Request the apks sent by id to be prefetched in the background.
+
+        Parameters
+        ----------
+        apks : iterable<tuple<str, bool, FastApk>>
+            The raw data or hash of the apk, if it is a hash and the meta infos.
+        '''
+        prefetcher = self.get_prefetcher()
+        if prefetcher is not None:
+            prefetcher.prefetch((apk_hash, fast_apk) for apk_hash, is_hash, fast_apk in apks if is_hash)
 
     ############################################################
     #---Setup functions
@@ -261,7 +256,7 @@ class AnalyzeTask(Task):
                     max_retries = CELERY_ANALYSIS_STORE_RES_RETRY_CNT,
                     max_retry_time = CELERY_DATABASE_STORE_RETRY_MAX_TIME
                     )
-    def __store_results(self, fastapk, script_results):
+    def __store_results(self, fastapk, script_results, dex_duplicates = None):
         '''
         Store the results in the database.
 
@@ -269,6 +264,9 @@ class AnalyzeTask(Task):
         ----------
         fastapk : FastApk
         script_results : list<FastApk, AndroScript>
+        dex_duplicates : list<FastApk>, optional (default is None)
+            Apks sharing the .dex files with `fastapk`.
+            The results of the dex only scripts will also be stored for them.
 
         Returns
         -------
@@ -282,6 +280,10 @@ class AnalyzeTask(Task):
             if pres is not None:
                 res.append(pres)
 
+        if dex_duplicates:
+            pres = AnalyzeUtil.store_dex_only_results(rds.store_result_for_apk, fastapk, script_results, {fastapk.hash : dex_duplicates})
+            res.extend(r for r in pres if r is not None)
+
         return res
 
     @RetryDecorator(exception_tuple = (DatabaseLoadException, ),
@@ -319,27 +321,32 @@ class AnalyzeTask(Task):
         return self.apk_storage.get_apk(apk_id, apk = apk)
 
     ############################################################
-    #---other
+    #---Actual Analysis
     ############################################################
 
-    def __get_apk_from_storage(self, apk_id, apk):
-        ''' Get the `EAndroApk` from the storage engine (MongoDB or S3)
-
-        Parameters
-        ----------
-        apk_id : str
-            The id of the apk
-        apk : FastApk
+    def run(self, androscripts, min_script_needs, script_hashes, apk_zipfile_or_hash, is_hash = True, fast_apk = None, dex_duplicates = None):
         '''
-        if self.apk_storage is not None:
-            return self.apk_storage.get_apk(apk_id, apk = apk)
-        
+        Do the analysis on the apk with the given scripts (see :py:meth:`.analyze_apk`).
 
-    ############################################################
-    #---Actual Analysis
-    ############################################################
+        The failures to record in the quarantine are sent back to the master,
+        because the quarantine database is local to each host.
+        An exceeded soft time limit is such a failure and does not fail the task.
+
+        Returns
+        -------
+        tuple<tuple<tuple<str, bool>>, list<tuple>>
+            The storage results (see :py:meth:`.analyze_apk`)
+            and the failures (see :py:func:`.pop_collected_failures`).
+        '''
+        collect_failures()
+        try:
+            return self.analyze_apk(androscripts, min_script_needs, script_hashes, apk_zipfile_or_hash, is_hash, fast_apk, dex_duplicates), pop_collected_failures()
+        except SoftTimeLimitExceeded:
+            return (), pop_collected_failures()
+        finally:
+            pop_collected_failures()
 
-    def run(self, androscripts, min_script_needs, script_hashes, apk_zipfile_or_hash, is_hash = True, fast_apk = None):
+    def analyze_apk(self, androscripts, min_script_needs, script_hashes, apk_zipfile_or_hash, is_hash = True, fast_apk = None, dex_duplicates = None):
         '''
         Do the analysis on the apk with the given scripts.
 
@@ -358,6 +365,9 @@ class AnalyzeTask(Task):
             Determines if `apk_zipfile_or_hash` is a hash (id).
         fast_apk : FastApk, optional (default is None)
             Holds the meta infos for the apk.
+        dex_duplicates : list<FastApk>, optional (default is None)
+            Apks sharing the .dex files with the apk.
+            The results of the dex only scripts will also be stored for them.
 
         Returns
         -------
@@ -366,10 +376,15 @@ class AnalyzeTask(Task):
             and the second a boolean indication if the result has been stored in gridfs.
         ()
             If an error occurred.
+
+        Raises
+        ------
+        SoftTimeLimitExceeded
+            If the task exceeded its soft time limit (recorded as failure).
         '''
         try:
             # method retry_arguments
-            self.__retry_arguments = androscripts, min_script_needs, script_hashes, apk_zipfile_or_hash, is_hash, fast_apk
+            self.__retry_arguments = androscripts, min_script_needs, script_hashes, apk_zipfile_or_hash, is_hash, fast_apk, dex_duplicates
             eandro_apk = None
             do_script_hash_validation = settings.script_hash_validation_enabled()
 
@@ -392,7 +407,9 @@ class AnalyzeTask(Task):
                 eandro_apk = AnalyzeUtil.open_apk(apk_or_path = apk_zipfile_or_hash, apk = fast_apk, raw = True)
             else:
                 # get apk from prefetched apk pool
-                eandro_apk = apk_prefetch_pool.get(apk_zipfile_or_hash, None)
+                prefetcher = self.get_prefetcher()
+                if prefetcher is not None:
+                    eandro_apk = prefetcher.pop(apk_zipfile_or_hash)
                 # could not prefetch
                 if eandro_apk is None:
                     eandro_apk = self.__get_apk_from_storage_retry(apk_zipfile_or_hash, apk = fast_apk)
@@ -405,7 +422,7 @@ class AnalyzeTask(Task):
                     fastapk, script_results = result
 
                     log.info("analyzed %s", fastapk.short_description())
-                    storage_results = self.__store_results(fastapk, script_results)
+                    storage_results = self.__store_results(fastapk, script_results, dex_duplicates)
                     # can be None if errorr occurred
                     if storage_results:
                         return tuple(storage_results)
@@ -413,10 +430,90 @@ class AnalyzeTask(Task):
             return ()
         except SoftTimeLimitExceeded:
             log.warn("Task %s exceeded it's soft time limit!", self)
+            # don't waste the time limit again in the next run
+            apk_hash = get_apk_hash(apk_zipfile_or_hash, is_hash, fast_apk)
+            record_failure(apk_hash, [AnalyzeUtil.script_name(s) for s in self.androscripts or ()], FAILURE_TIME, "soft time limit exceeded")
             raise
         except ScriptHashValidationError:
             raise
-        finally:
-            # delete from pool -> we don't need it anymore in the pool
-            if is_hash and apk_zipfile_or_hash in apk_prefetch_pool:
-                del apk_prefetch_pool[apk_zipfile_or_hash]
+
+class AnalyzeChunkTask(AnalyzeTask):
+    ''' Analyzes a chunk of apks in one task to save the broker, ack and result backend overhead per apk.
+
+    The apks are analyzed one after another with the same scripts (which only get reset between the apks if possible)
+    and the results of each apk are stored as soon as it has been analyzed.
+    A failing apk does not fail the whole chunk.
+    If the soft time limit is exceeded, only the current apk fails
+    and the task is retried with the remaining apks (and a time limit for them).
+    The next apks of the chunk are prefetched while the current one is analyzed.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        AnalyzeTask.__init__(self, *args, **kwargs)
+        self.__retry_arguments = None
+
+    def get_prefetcher(self):
+        ''' The next apks of the chunk are prefetched while the current one is analyzed '''
+        return get_apk_prefetcher(settings)
+
+    def get_retry_arguments(self):
+        # retry with the remaining apks and the results so far
+        return self.__retry_arguments
+
+    def run(self, jobs, results = None):
+        '''
+        Analyze the apks one after another.
+
+        Parameters
+        ----------
+        jobs : list<tuple>
+            The arguments of :py:meth:`.AnalyzeTask.run` for each apk.
+        results : list<tuple<str, tuple<tuple<str, bool>>, list<tuple>>>, optional (default is None)
+            The results of the apks which have already been analyzed (before the task has been retried).
+
+        Returns
+        -------
+        list<tuple<str, tuple<tuple<str, bool>>, list<tuple>>>
+            The hash of each apk, the storage results (see :py:meth:`.AnalyzeTask.analyze_apk`)
+            and the failures to record in the quarantine (see :py:meth:`.AnalyzeTask.run`).
+            The storage results are None if the analysis of the apk failed.
+        '''
+        results = list(results or [])
+        for idx, job in enumerate(jobs):
+            self.__retry_arguments = jobs[idx:], results
+            # the current apk first (if not prefetched yet), then the next ones
+            self.prefetch_apks(job[3:6] for job in jobs[idx:])
+            apk_zipfile_or_hash, is_hash, fast_apk = job[3:6]
+            apk_hash = get_apk_hash(apk_zipfile_or_hash, is_hash, fast_apk)
+            collect_failures()
+            try:
+                storage_results = self.analyze_apk(*job)
+            except (Retry, ScriptHashValidationError):
+                raise
+            except SoftTimeLimitExceeded:
+                results.append((apk_hash, None, pop_collected_failures()))
+                # the time limit is for the whole chunk, so no time left for the remaining apks
+                remaining_jobs = jobs[idx + 1:]
+                if remaining_jobs:
+                    log.warn("Retrying the remaining %d apks of %s", len(remaining_jobs), self)
+                    raise self.retry(args = (remaining_jobs, results), countdown = 0,
+                                     **CeleryUtil.get_chunk_time_limits(len(remaining_jobs)))
+                break
+            except Exception as e:
+                log.exception(e)
+                storage_results = None
+            results.append((apk_hash, storage_results, pop_collected_failures()))
+
+        prefetcher = self.get_prefetcher()
+        if prefetcher is not None:
+            log.info("%s", prefetcher)
+
+        return results
+
+def get_apk_hash(apk_zipfile_or_hash, is_hash, fast_apk):
+    ''' Get the hash of the apk from the task arguments '''
+    if is_hash:
+        return apk_zipfile_or_hash
+    if fast_apk is not None:
+        return fast_apk.hash
+    return Util.sha256(apk_zipfile_or_hash)
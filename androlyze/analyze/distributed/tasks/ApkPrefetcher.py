@@ -0,0 +1,221 @@
+
+# encoding: utf-8
+
+__author__ = "Nils Tobias Schmidt"
+__email__ = "schmidt89 at informatik.uni-marburg.de"
+
+from collections import OrderedDict, deque
+import os
+from threading import Condition
+
+from androlyze.log.Log import log
+from androlyze.util.StopThread import StopThread
+
+# seconds to wait for new prefetch requests before checking for termination
+WAIT_INTERVAL = 1.0
+
+class ApkPrefetcher(StopThread):
+    '''
+    Background thread which fetches the next apks from the apk storage (MongoDB, S3, ...)
+    while the current apk is analyzed.
+
+    Only the last requested `lookahead` apks are fetched (see :py:meth:`.prefetch`).
+    The fetched apks are kept in a pool bounded by `max_size` bytes (raw .apk data),
+    the least recently fetched apks are evicted first.
+    An apk is removed from the pool when it is taken (see :py:meth:`.pop`).
+
+    Hits, misses and evictions are counted.
+    '''
+
+    def __init__(self, storage_factory, lookahead, max_size):
+        '''
+        Parameters
+        ----------
+        storage_factory : () -> ApkCopyInterface
+            Creates the apk storage for the thread (connections are not shared with the task).
+        lookahead : int
+            Maximum number of apks to prefetch.
+        max_size : int
+            Maximum size of the pool in bytes.
+        '''
+        super(ApkPrefetcher, self).__init__(name = "ApkPrefetcher")
+        self.daemon = True
+
+        self.__storage_factory = storage_factory
+        self.__storage = None
+        self.__lookahead = lookahead
+        self.__max_size = max_size
+
+        self.__cond = Condition()
+        # hash -> (EAndroApk, size)
+        self.__pool = OrderedDict()
+        self.__pool_size = 0
+        # (hash, FastApk) to fetch
+        self.__queue = deque()
+        # hash of the apk being fetched
+        self.__fetching = None
+
+        self.__hits = self.__misses = self.__evictions = 0
+
+    def __str__(self):
+        return '%s(apks: %d, size: %d/%d bytes, hits: %d, misses: %d, evictions: %d)' \
+            % (self.__class__.__name__, len(self.__pool), self.__pool_size, self.max_size, self.hits, self.misses, self.evictions)
+
+    def get_lookahead(self):
+        return self.__lookahead
+
+    def get_max_size(self):
+        return self.__max_size
+
+    def get_hits(self):
+        return self.__hits
+
+    def get_misses(self):
+        return self.__misses
+
+    def get_evictions(self):
+        return self.__evictions
+
+    lookahead = property(get_lookahead, None, None, "int : Maximum number of apks to prefetch.")
+    max_size = property(get_max_size, None, None, "int : Maximum size of the pool in bytes.")
+    hits = property(get_hits, None, None, "int : Number of apks taken from the pool.")
+    misses = property(get_misses, None, None, "int : Number of apks not available in the pool.")
+    evictions = property(get_evictions, None, None, "int : Number of apks evicted from the pool before they have been taken.")
+
+    def prefetch(self, apks):
+        ''' Request the `apks` to be fetched (in the given order).
+        Replaces the requests which have not been fetched yet.
+
+        Parameters
+        ----------
+        apks : iterable<tuple<str, FastApk>>
+            Hash and meta infos of the apks.
+        '''
+        with self.__cond:
+            self.__queue.clear()
+            for _hash, apk in apks:
+                if len(self.__queue) >= self.lookahead:
+                    break
+                if _hash not in self.__pool and _hash != self.__fetching:
+                    self.__queue.append((_hash, apk))
+            self.__cond.notify_all()
+
+    def pop(self, _hash):
+        ''' Take the apk with `_hash` from the pool.
+        Waits if it has been requested but not fetched yet.
+
+        Returns
+        -------
+        EAndroApk
+        None
+            If not prefetched.
+        '''
+        with self.__cond:
+            while self.__is_requested(_hash) and self.is_alive():
+                self.__cond.wait(WAIT_INTERVAL)
+
+            entry = self.__pool.pop(_hash, None)
+            if entry is None:
+                self.__misses += 1
+                log.debug("prefetch miss: %s, %s", _hash, self)
+                return None
+
+            eandro_apk, size = entry
+            self.__pool_size -= size
+            self.__hits += 1
+            log.debug("prefetch hit: %s, %s", _hash, self)
+            return eandro_apk
+
+    def __is_requested(self, _hash):
+        ''' Check if the apk with `_hash` is being fetched or waiting to be fetched '''
+        return self.__fetching == _hash or any(request[0] == _hash for request in self.__queue)
+
+    def __fetch(self, _hash, apk):
+        ''' Fetch the apk from the storage. Errors will be logged!
+
+        Returns
+        -------
+        EAndroApk
+        None
+        '''
+        try:
+            if self.__storage is None:
+                self.__storage = self.__storage_factory()
+            return self.__storage.get_apk(_hash, apk = apk)
+        except Exception as e:
+            # the task will fetch (and retry) it again
+            log.warn("Could not prefetch %s: %s", _hash, e)
+            return None
+
+    def __add(self, _hash, eandro_apk):
+        ''' Add the apk to the pool and evict the least recently fetched apks if the pool is too big '''
+        size = len(eandro_apk.get_raw())
+        if size > self.max_size:
+            log.debug("Not keeping %s, bigger than the prefetch pool", _hash)
+            return
+
+        self.__pool[_hash] = (eandro_apk, size)
+        self.__pool_size += size
+        while self.__pool_size > self.max_size:
+            evicted_hash, (_, evicted_size) = self.__pool.popitem(last = False)
+            self.__pool_size -= evicted_size
+            self.__evictions += 1
+            log.debug("evicted %s from prefetch pool", evicted_hash)
+
+    def run(self):
+        while not self.shall_terminate():
+            with self.__cond:
+                if not self.__queue:
+                    self.__cond.wait(WAIT_INTERVAL)
+                    continue
+                _hash, apk = self.__queue.popleft()
+                self.__fetching = _hash
+
+            eandro_apk = None
+            try:
+                eandro_apk = self.__fetch(_hash, apk)
+            finally:
+                with self.__cond:
+                    self.__fetching = None
+                    if eandro_apk is not None:
+                        self.__add(_hash, eandro_apk)
+                        log.info("prefetched: %s, %s", eandro_apk.short_description(), self)
+                    self.__cond.notify_all()
+
+############################################################
+#---Per process prefetcher
+############################################################
+
+# prefetcher of the current process (None if disabled)
+_prefetcher = None
+# pid of the process which created the `_prefetcher` (threads are not inherited by forked processes)
+_prefetcher_pid = None
+
+def get_apk_prefetcher(settings):
+    ''' Get the (started) `ApkPrefetcher` of the current process.
+
+    Parameters
+    ----------
+    settings : Settings
+        The distributed settings.
+
+    Returns
+    -------
+    ApkPrefetcher
+    None
+        If prefetching is disabled.
+    '''
+    global _prefetcher, _prefetcher_pid
+
+    if _prefetcher_pid != os.getpid():
+        from androlyze.celery.celerysettings import CELERY_ANALYSIS_PREFETCH_APKS, CELERY_ANALYSIS_PREFETCH_MAX_SIZE
+        from androlyze.storage.apk import ApkStorageFactory
+
+        _prefetcher_pid = os.getpid()
+        _prefetcher = None
+        if CELERY_ANALYSIS_PREFETCH_APKS > 0 and CELERY_ANALYSIS_PREFETCH_MAX_SIZE > 0:
+            _prefetcher = ApkPrefetcher(lambda: ApkStorageFactory.get_apk_storage(settings),
+                                        CELERY_ANALYSIS_PREFETCH_APKS, CELERY_ANALYSIS_PREFETCH_MAX_SIZE * 1024 * 1024)
+            _prefetcher.start()
+
+    return _prefetcher
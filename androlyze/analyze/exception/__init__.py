@@ -30,6 +30,26 @@ class AndroScriptError(AnalyzeError):
     def _msg(self):
         return 'The script %s caused an error.%s' % (self.androscript, self.additional_text)
 
+class BudgetExceededError(BaseException):
+    ''' Raised (asynchronously) inside the block of a `ResourceBudget` which has been exceeded.
+
+    Derives from `BaseException` (like `KeyboardInterrupt`),
+    so that it isn't swallowed by the `except Exception` clauses of the scripts.
+    '''
+
+    def __init__(self, budget):
+        '''
+        Parameters
+        ----------
+        budget : ResourceBudget
+            The exceeded budget.
+        '''
+        BaseException.__init__(self)
+        self.budget = budget
+
+    def __str__(self):
+        return '%s: The %s has been exceeded (%s)' % (self.__class__.__name__, self.budget, self.budget.exceeded)
+
 class DexError(AnalyzeError):
     ''' Exception for dex related stuff '''
     pass
\ No newline at end of file
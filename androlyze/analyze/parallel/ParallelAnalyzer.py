@@ -5,25 +5,59 @@ __author__ = "Nils Tobias Schmidt"
 __email__ = "schmidt89 at informatik.uni-marburg.de"
 
 from multiprocessing import JoinableQueue as Queue
-from multiprocessing import cpu_count
+from multiprocessing import cpu_count, Value, Array, Lock, Pipe
 import os
 import signal
+from time import sleep, time
 
 from androlyze.analyze import AnalyzeUtil
 from androlyze.analyze.BaseAnalyzer import BaseAnalyzer
-from androlyze.analyze.parallel import STOP_SENTINEL
+from androlyze.analyze.parallel import STOP_SENTINEL, RECYCLE_EXIT_CODE, \
+    HAND_OFF_ANALYZED_APK, HAND_OFF_STORAGE_RESULT
 from androlyze.analyze.parallel.AnalysisStatsView import AnalysisStatsView
 from androlyze.analyze.parallel.Worker import Worker
 from androlyze.log.Log import log
+from androlyze.storage.quarantine.QuarantineStorage import record_failure, \
+    FAILURE_TIME, FAILURE_MEMORY, FAILURE_CRASH
 from androlyze.util import Util
 
+# interval in which the workers get checked for recycling (in seconds)
+WORKER_CHECK_INTERVAL = 0.5
+
+# size of the shared memory for the path of the apk a worker is working on
+JOB_APK_PATH_SIZE = 1024
+
+# reasons for killing a worker in isolation mode
+KILL_REASON_TIME = "time limit exceeded"
+KILL_REASON_MEMORY = "memory limit exceeded"
+KILL_REASON_CRASHED = "crashed"
+
+# kind of failure recorded in the quarantine for each reason
+KILL_REASON_2_FAILURE = {
+    KILL_REASON_TIME : FAILURE_TIME,
+    KILL_REASON_MEMORY : FAILURE_MEMORY,
+    KILL_REASON_CRASHED : FAILURE_CRASH
+}
 
 class ParallelAnalyzer(BaseAnalyzer):
-    ''' Parallel analyzer which uses the `multiprocessing` module. '''
+    ''' Parallel analyzer which uses the `multiprocessing` module.
+
+    In isolation mode (a time or memory limit is set) the workers are supervised while they analyze an apk.
+    A worker exceeding a limit (e.g. caught in an infinite loop inside androguard) will be killed
+    and replaced immediately, the apk is recorded in `killed_apks` (and in the quarantine if enabled).
+    Workers are also replaced after `isolation_batch_size` apks, so that each apk (or small batch) runs in a fresh process.
+
+    A worker is only killed while the supervisor holds its job lock (see :py:class:`.Worker`),
+    so it cannot be killed while it finishes a job or holds the lock of memory shared with the other processes.
+    In isolation mode each worker sends its results through an own pipe to the supervisor
+    (instead of the shared queues whose feeder threads could be killed while holding the queue's write lock).
+    The storage itself is not protected, a killed worker may leave a partially written result behind.
+    '''
 
     def __init__(self,
                  storage, script_list, script_hashes, min_script_needs, apks_or_paths,
-                 concurrency = None):
+                 concurrency = None, max_apks_per_worker = None, max_worker_memory = None,
+                 isolation_time_limit = None, isolation_memory_limit = None, isolation_batch_size = None, **kwargs):
         '''
         See :py:method`.BaseAnalyzer.__init__` for details on the first attributes.
 
@@ -31,8 +65,18 @@ class ParallelAnalyzer(BaseAnalyzer):
         ----------------
         concurrency : int, optional (default is number of cpu cores)
             Number of workers to spawn.
+        max_apks_per_worker : int, optional (default is the value from the config)
+            Replace a worker after it analyzed this number of apks.
+        max_worker_memory : int, optional (default is the value from the config)
+            Replace a worker after its peak RSS exceeded this value (in MB).
+        isolation_time_limit : int, optional (default is the value from the config)
+            Kill a worker which is analyzing an apk for longer than this time (in seconds).
+        isolation_memory_limit : int, optional (default is the value from the config)
+            Kill a worker whose RSS exceeds this value (in MB) while analyzing an apk.
+        isolation_batch_size : int, optional (default is the value from the config)
+            Replace a worker after this number of apks if in isolation mode.
         '''
-        super(ParallelAnalyzer, self).__init__(storage, script_list, script_hashes, min_script_needs, apks_or_paths)
+        super(ParallelAnalyzer, self).__init__(storage, script_list, script_hashes, min_script_needs, apks_or_paths, **kwargs)
 
         # parallelization parameters
         if concurrency is None:
@@ -40,6 +84,43 @@ class ParallelAnalyzer(BaseAnalyzer):
 
         self.__concurrency = concurrency
 
+        # worker recycling
+        config_max_apks, config_max_memory = get_worker_recycling_settings()
+        if max_apks_per_worker is None:
+            max_apks_per_worker = config_max_apks
+        if max_worker_memory is None:
+            max_worker_memory = config_max_memory
+        self.__max_apks_per_worker = max_apks_per_worker
+        self.__max_worker_memory = max_worker_memory
+
+        # isolation mode
+        config_time_limit, config_memory_limit, config_batch_size = get_isolation_settings()
+        if isolation_time_limit is None:
+            isolation_time_limit = config_time_limit
+        if isolation_memory_limit is None:
+            isolation_memory_limit = config_memory_limit
+        if isolation_batch_size is None:
+            isolation_batch_size = config_batch_size
+        self.__isolation_time_limit = isolation_time_limit
+        self.__isolation_max_rss = isolation_memory_limit * 1024 if isolation_memory_limit is not None else None
+        if self.isolation:
+            log.info("isolation mode: killing workers after %s s or %s MB per apk", isolation_time_limit, isolation_memory_limit)
+            if isolation_batch_size is not None:
+                max_apks_per_worker = min(max_apks_per_worker or isolation_batch_size, isolation_batch_size)
+                self.__max_apks_per_worker = max_apks_per_worker
+
+        if max_apks_per_worker is not None or max_worker_memory is not None:
+            log.info("recycling workers after %s apks or %s MB", max_apks_per_worker, max_worker_memory)
+
+        # apk path and reason of each killed worker
+        self.__killed_apks = []
+        # shared memory for the current job (start time, apk path) of each worker
+        self.__sm_jobs = []
+        # job lock of each worker
+        self.__job_locks = []
+        # reading end of the result pipe of each worker (isolation mode)
+        self.__result_conns = []
+
         log.info("concurrency: %s", self.concurrency)
         log.info("Using processes")
 
@@ -68,6 +149,12 @@ class ParallelAnalyzer(BaseAnalyzer):
     def get_workers(self):
         return self.__workers
 
+    def get_killed_apks(self):
+        return self.__killed_apks
+
+    def is_isolation(self):
+        return self.__isolation_time_limit is not None or self.__isolation_max_rss is not None
+
     def set_workers(self, value):
         self.__workers = value
 
@@ -77,25 +164,190 @@ class ParallelAnalyzer(BaseAnalyzer):
     analyzed_apks = property(get_analyzed_apks, set_analyzed_apks, del_analyzed_apks, "Queue<FastAPK> : Yet analyzed APKs")
     concurrency = property(get_concurrency, None, None, "int : Number of workers to spawn.")
     workers = property(get_workers, set_workers, del_workers, "list<Worker> : List of workers.")
+    killed_apks = property(get_killed_apks, None, None, "list<tuple<str, str>> : Path of the apk and the reason for each worker killed (or crashed) in isolation mode.")
+    isolation = property(is_isolation, None, None, "bool : If the workers are supervised (a time or memory limit is set).")
     work_queue = property(get_work_queue, None, None, "Queue<str> : Queue with paths to apks which shall be analyzed.")
 
+    def __start_worker(self, idx):
+        ''' Create and start a new `Worker` for the slot `idx` '''
+        max_rss = None
+        if self.__max_worker_memory is not None:
+            # MB -> KB
+            max_rss = self.__max_worker_memory * 1024
+
+        # a dead worker may have left its lock acquired, so each worker gets a new one
+        self.__job_locks[idx] = Lock()
+        result_conn = None
+        if self.isolation:
+            self.__result_conns[idx], result_conn = Pipe(duplex = False)
+
+        p = Worker(self.script_list, self.script_hashes, self.min_script_needs,
+                                         self.work_queue, self.storage,
+                                         self.cnt_analyzed_apks, self.analyzed_apks, self.storage_results,
+                                         script_filter = self.script_filter, dex_duplicates = self.dex_duplicates,
+                                         max_apks = self.__max_apks_per_worker, max_rss = max_rss,
+                                         sm_job = self.__sm_jobs[idx], job_lock = self.__job_locks[idx],
+                                         result_conn = result_conn)
+        p.daemon = True
+        p.start()
+
+        # only the worker writes, so we get an EOF if it dies
+        if result_conn is not None:
+            result_conn.close()
+        return p
+
+    def __drain_results(self, idx):
+        ''' Move the results the worker in slot `idx` sent through its pipe into the queues '''
+        conn = self.__result_conns[idx]
+        if conn is None:
+            return
+        try:
+            while conn.poll():
+                kind, obj = conn.recv()
+                if kind == HAND_OFF_ANALYZED_APK:
+                    self.analyzed_apks.put(obj)
+                elif kind == HAND_OFF_STORAGE_RESULT:
+                    self.storage_results.put(obj)
+        except (EOFError, IOError):
+            # worker died
+            pass
+
+    def __replace_recycled_workers(self):
+        ''' Replace the workers which exited to be recycled by new ones.
+        The remaining work stays in the work queue.
+
+        In isolation mode, kill and replace the workers exceeding the limits
+        as well as replace the ones which died while analyzing an apk.
+
+        Returns
+        -------
+        bool
+            If some workers are still running.
+        '''
+        workers = self.workers
+        for idx, worker in enumerate(workers):
+            self.__drain_results(idx)
+
+            replace = False
+            if not worker.is_alive():
+                # the results sent right before the exit
+                self.__drain_results(idx)
+                job = self.__get_job(idx)
+                if worker.exitcode == RECYCLE_EXIT_CODE:
+                    log.debug("replacing recycled %s", worker.name)
+                    replace = True
+                elif self.isolation and job is not None:
+                    self.__job_killed(idx, worker, job, KILL_REASON_CRASHED, "%s (exit code %s)" % (KILL_REASON_CRASHED, worker.exitcode))
+                    replace = True
+            elif self.isolation:
+                job = self.__get_job(idx)
+                reason = self.__check_job_limits(worker, job)
+                if reason is not None:
+                    replace = self.__kill_worker(idx, worker, job, reason)
+
+            if replace:
+                worker.join()
+                workers[idx] = self.__start_worker(idx)
+
+        return any(worker.is_alive() for worker in workers)
+
+    def __get_job(self, idx):
+        ''' Get the start time and path of the apk the worker in slot `idx` is working on.
+        None if it is idle. '''
+        sm_job_start, sm_job_apk = self.__sm_jobs[idx]
+        if sm_job_start.value:
+            return sm_job_start.value, sm_job_apk.value
+        return None
+
+    def __check_job_limits(self, worker, job):
+        ''' Check if the `worker` exceeded a limit while working on the `job` (see :py:meth:`.__get_job`).
+
+        Returns
+        -------
+        str
+            The reason.
+        None
+            If not exceeded.
+        '''
+        if job is None:
+            return None
+
+        job_start, _ = job
+        if self.__isolation_time_limit is not None and time() - job_start > self.__isolation_time_limit:
+            return KILL_REASON_TIME
+
+        if self.__isolation_max_rss is not None:
+            rss = Util.get_rss(worker.pid)
+            if rss is not None and rss > self.__isolation_max_rss:
+                return KILL_REASON_MEMORY
+
+        return None
+
+    def __kill_worker(self, idx, worker, job, kill_reason):
+        ''' Kill the worker in slot `idx` which exceeded a limit while working on the `job`.
+        The worker is only killed if it is still working on the `job`.
+
+        Returns
+        -------
+        bool
+            If the worker has been killed.
+        '''
+        job_lock = self.__job_locks[idx]
+        # the worker is handing off results or finishing the job, check again next time
+        if not job_lock.acquire(False):
+            return False
+        try:
+            # finished in the meantime
+            if self.__get_job(idx) != job:
+                return False
+
+            # we cannot interrupt the worker, so kill it
+            try:
+                os.kill(worker.pid, signal.SIGKILL)
+            except OSError:
+                pass
+            worker.join()
+        finally:
+            job_lock.release()
+
+        self.__drain_results(idx)
+        self.__job_killed(idx, worker, job, kill_reason, kill_reason)
+        return True
+
+    def __job_killed(self, idx, worker, job, kill_reason, description):
+        ''' Record the apk of the `job` of the dead worker in slot `idx` and finish the job in its place '''
+        _, apk_path = job
+        log.warn("%s killed while analyzing %s: %s", worker.name, apk_path, description)
+        self.__killed_apks.append((apk_path, description))
+
+        apk_hash = AnalyzeUtil.get_apk_hash(apk_path)
+        if apk_hash is not None:
+            scripts = AnalyzeUtil.filter_scripts(self.script_list, apk_hash, self.script_filter)
+            record_failure(apk_hash, [AnalyzeUtil.script_name(s) for s in scripts], KILL_REASON_2_FAILURE[kill_reason], description)
+
+        # reset for the new worker
+        sm_job_start, sm_job_apk = self.__sm_jobs[idx]
+        sm_job_start.value = 0
+        sm_job_apk.value = ""
+
+        # otherwise the work queue can't be joined
+        self.work_queue.task_done()
+        with self.cnt_analyzed_apks.get_lock():
+            self.cnt_analyzed_apks.value += 1
+
     def _analyze(self):
         ''' See doc of :py:method:BaseAnalyzer.analyze`. '''
         try:
             work_queue = self.work_queue
 
-            # create worker pool
+            # create and start worker pool
             log.debug("starting %s workers ...", self.concurrency)
-            for _ in range(self.concurrency):
-                p = Worker(self.script_list, self.script_hashes, self.min_script_needs,
-                                                 work_queue, self.storage,
-                                                 self.cnt_analyzed_apks, self.analyzed_apks, self.storage_results)
-                self.workers.append(p)
-                p.daemon = True
-
-            # start workers
-            for p in self.workers:
-                p.start()
+            for idx in range(self.concurrency):
+                # guarded by the job lock of the worker
+                self.__sm_jobs.append((Value('d', 0, lock = False), Array('c', JOB_APK_PATH_SIZE, lock = False)))
+                self.__job_locks.append(None)
+                self.__result_conns.append(None)
+                self.workers.append(self.__start_worker(idx))
 
             # queue has size limit -> start workers first then enqueue items
             log.info("Loading apk paths into work queue ...")
@@ -112,11 +364,17 @@ class ParallelAnalyzer(BaseAnalyzer):
             av.daemon = True
             av.start()
             
-            # block until workers finished
+            # block until workers finished, replace recycled ones meanwhile
+            while self.__replace_recycled_workers():
+                sleep(WORKER_CHECK_INTERVAL)
             work_queue.join()
             av.terminate()
             log.debug("joined on work queue ...")
 
+            if self.killed_apks:
+                log.warn("killed workers on %d apks:\n%s", len(self.killed_apks),
+                         '\n'.join('\t%s: %s' % killed for killed in self.killed_apks))
+
             return self.cnt_analyzed_apks.value
 
         # try hot shutdown first
@@ -150,3 +408,42 @@ class ParallelAnalyzer(BaseAnalyzer):
                         pass
 
                 return self.cnt_analyzed_apks.value
+
+def get_isolation_settings():
+    ''' Get the isolation mode settings from the config.
+
+    Returns
+    -------
+    tuple<int, int, int>
+        Time limit per apk (in seconds), memory limit (in MB), batch size.
+        None means no limit.
+    '''
+    from androlyze import settings
+    from androlyze.settings import SECTION_PARALLELIZATION, KEY_PARALLELIZATION_ISOLATION_TIME_LIMIT, \
+        KEY_PARALLELIZATION_ISOLATION_MEMORY_LIMIT, KEY_PARALLELIZATION_ISOLATION_BATCH_SIZE
+
+    s = settings.singleton
+    if s is None:
+        return None, None, None
+    return (s.get_int((SECTION_PARALLELIZATION, KEY_PARALLELIZATION_ISOLATION_TIME_LIMIT), default = None),
+            s.get_int((SECTION_PARALLELIZATION, KEY_PARALLELIZATION_ISOLATION_MEMORY_LIMIT), default = None),
+            s.get_int((SECTION_PARALLELIZATION, KEY_PARALLELIZATION_ISOLATION_BATCH_SIZE), default = None))
+
+def get_worker_recycling_settings():
+    ''' Get the worker recycling settings from the config.
+
+    Returns
+    -------
+    tuple<int, int>
+        Max apks per worker, max peak RSS per worker (in MB).
+        None means no limit.
+    '''
+    from androlyze import settings
+    from androlyze.settings import SECTION_PARALLELIZATION, KEY_PARALLELIZATION_MAX_APKS_PER_WORKER, \
+        KEY_PARALLELIZATION_MAX_WORKER_MEMORY
+
+    s = settings.singleton
+    if s is None:
+        return None, None
+    return (s.get_int((SECTION_PARALLELIZATION, KEY_PARALLELIZATION_MAX_APKS_PER_WORKER), default = None),
+            s.get_int((SECTION_PARALLELIZATION, KEY_PARALLELIZATION_MAX_WORKER_MEMORY), default = None))
@@ -4,21 +4,26 @@
 __author__ = "Nils Tobias Schmidt"
 __email__ = "schmidt89 at informatik.uni-marburg.de"
 
-from copy import deepcopy
+from multiprocessing import Lock
 from multiprocessing.process import Process
+import sys
+from time import time
 
 from androlyze.analyze import AnalyzeUtil
-from androlyze.analyze.parallel import STOP_SENTINEL
+from androlyze.analyze.parallel import STOP_SENTINEL, RECYCLE_EXIT_CODE, \
+    HAND_OFF_ANALYZED_APK, HAND_OFF_STORAGE_RESULT
 from androlyze.log.Log import clilog, log
 from androlyze.model.script import ScriptUtil
 from androlyze.storage.exception import StorageException
 from androlyze.model.android.apk.FastApk import FastApk
+from androlyze.util import Util
 
 class Worker(Process):
     ''' Worker process that does the actual analysis '''
 
     def __init__(self, script_list, script_hashes, min_script_needs, work_queue, storage,
-                 sm_analyzed_apks, analyzed_apks, storage_results = None):
+                 sm_analyzed_apks, analyzed_apks, storage_results = None, script_filter = None, dex_duplicates = None,
+                 max_apks = None, max_rss = None, sm_job = None, job_lock = None, result_conn = None):
         '''
         Parameters
         ----------
@@ -38,6 +43,24 @@ class Worker(Process):
             Holds the analyzed APKs.
         storage_results : Queue<tuple<str, bool>>, optional (default is None)
             Storage results. First component is the id of the entry and the second a boolean indication if the result has been stored in gridfs.
+        script_filter : dict<str, iterable<str>>, optional (default is None)
+            See :py:method:`.BaseAnalyzer.script_filter`.
+        dex_duplicates : dict<str, list<Apk>>, optional (default is None)
+            See :py:method:`.BaseAnalyzer.dex_duplicates`.
+        max_apks : int, optional (default is None)
+            Exit with `RECYCLE_EXIT_CODE` after this number of apks has been analyzed.
+        max_rss : int, optional (default is None)
+            Exit with `RECYCLE_EXIT_CODE` if the peak RSS (in KB) exceeds this value.
+        sm_job : tuple<Value, Array>, optional (default is None)
+            Shared memory for the start time and path of the apk the worker is currently working on (0 and "" if idle).
+            Used to supervise the worker (see isolation mode of the `ParallelAnalyzer`).
+        job_lock : Lock, optional (default is None)
+            Held while the `sm_job` changes and while the worker touches memory shared with other processes.
+            The supervisor only kills the worker while holding it,
+            so that a killed worker never leaves a shared lock (queue, counter) acquired.
+        result_conn : Connection, optional (default is None)
+            If given, the analyzed apks and storage results are sent through this (own) pipe to the supervisor
+            rather than put into the shared queues.
 
         Raises
         ------
@@ -50,6 +73,17 @@ class Worker(Process):
         self.androscripts = sorted(ScriptUtil.instantiate_scripts(script_list, script_hashes = script_hashes))
 
         self.min_script_needs = min_script_needs
+        self.__script_filter = script_filter
+        self.__dex_duplicates = dex_duplicates
+
+        # worker recycling
+        self.__max_apks = max_apks
+        self.__max_rss = max_rss
+        self.__cnt_apks = 0
+
+        self.__sm_job = sm_job
+        self.__job_lock = job_lock if job_lock is not None else Lock()
+        self.__result_conn = result_conn
 
         # queues
         self.work_queue = work_queue
@@ -79,6 +113,12 @@ class Worker(Process):
     def get_min_script_needs(self):
         return self.__min_script_needs
 
+    def get_script_filter(self):
+        return self.__script_filter
+
+    def get_dex_duplicates(self):
+        return self.__dex_duplicates
+
     def get_work_queue(self):
         return self.__work_queue
 
@@ -111,6 +151,8 @@ class Worker(Process):
 
     androscripts = property(get_androscripts, set_androscripts, del_androscripts, "list<AndroScript> : List of `AndroScript`s")
     min_script_needs = property(get_min_script_needs, set_min_script_needs, del_min_script_needs, " tuple<bool> : See :py:method:`ScriptUtil.get_maximal_script_options`.")
+    script_filter = property(get_script_filter, None, None, "dict<str, iterable<str>> : See :py:method:`.BaseAnalyzer.script_filter`.")
+    dex_duplicates = property(get_dex_duplicates, None, None, "dict<str, list<Apk>> : See :py:method:`.BaseAnalyzer.dex_duplicates`.")
     work_queue = property(get_work_queue, set_work_queue, del_work_queue, "Queue<str> : Queue with paths to apks which shall be analyzed.")
     storage = property(get_storage, set_storage, del_storage, "RedundantStorage : The storage to store the results.")
     storage_results = property(get_storage_results, set_storage_results, del_storage_results, "Queue<tuple<str, bool>> : Storage results. First component is the id of the entry and the second a boolean indication if the result has been stored in gridfs.")
@@ -123,9 +165,61 @@ class Worker(Process):
         res : tuple<str, bool>
             Storage results. First component is the id of the entry and the second a boolean indication if the result has been stored in gridfs.
         '''
-        if self.storage_results is not None:
+        if self.__result_conn is not None:
+            self.__hand_off(HAND_OFF_STORAGE_RESULT, storage_result)
+        elif self.storage_results is not None:
             self.storage_results.put(storage_result)
 
+    def add_analyzed_apk(self, fastapk):
+        ''' Add the `fastapk` to the `analyzed_apks` '''
+        if self.__result_conn is not None:
+            self.__hand_off(HAND_OFF_ANALYZED_APK, fastapk)
+        else:
+            self.analyzed_apks.put(fastapk)
+
+    def __hand_off(self, kind, obj):
+        ''' Send the result `obj` to the supervisor (not interrupted by a kill) '''
+        with self.__job_lock:
+            self.__result_conn.send((kind, obj))
+
+    def needs_recycling(self):
+        ''' Check if the worker shall be replaced by a new process
+        (analyzed `max_apks` or peak RSS exceeded `max_rss`).
+        '''
+        if self.__max_apks is not None and self.__cnt_apks >= self.__max_apks:
+            log.info("%s analyzed %d apks, recycling", self.name, self.__cnt_apks)
+            return True
+
+        if self.__max_rss is not None:
+            peak_rss = Util.get_peak_rss()
+            if peak_rss is not None and peak_rss > self.__max_rss:
+                log.info("%s peak rss %d KB > %d KB, recycling", self.name, peak_rss, self.__max_rss)
+                return True
+
+        return False
+
+    def flush_results(self):
+        ''' Close the result queues and wait until their buffered results have been written.
+        Needed before the worker exits itself (recycling), otherwise the results put right before could be lost.
+        '''
+        if self.__result_conn is not None:
+            # sending through the pipe is synchronous
+            self.__result_conn.close()
+            return
+
+        for queue in (self.analyzed_apks, self.storage_results):
+            if queue is not None:
+                queue.close()
+                queue.join_thread()
+
+    def set_current_job(self, apk_path):
+        ''' Publish the apk the worker is working on (None if idle) to the supervisor '''
+        if self.__sm_job is not None:
+            sm_job_start, sm_job_apk = self.__sm_job
+            # path is only informative, truncate to fit into the shared array
+            sm_job_apk.value = (apk_path or "")[:len(sm_job_apk) - 1]
+            sm_job_start.value = time() if apk_path is not None else 0
+
     def add_analyzed_apks_sm(self, cnt_analyzed_apks):
         ''' Add `cnt_analyzed_apks` to the shared counter.
         Operation uses an lock! '''
@@ -148,22 +242,25 @@ class Worker(Process):
         '''
         if eandro_apk is not None:
 
+            # only run the scripts needed for the apk
+            scripts = AnalyzeUtil.filter_scripts(self.androscripts, eandro_apk.hash, self.script_filter)
+
             # analysis
-            res = AnalyzeUtil.analyze_apk(eandro_apk, self.androscripts, self.min_script_needs, reset_scripts = True)
+            res = AnalyzeUtil.analyze_apk(eandro_apk, scripts, self.min_script_needs, reset_scripts = True)
 
             if res is not None:
 
                 fastapk, scripts = res
 
-                # we need to backup the scripts cause they will be reused for a new analysis
-                res[1] = deepcopy(scripts)
+                # the scripts will be reused for a new analysis, so take their results with us (no copy)
+                res[1] = [s.detach_result() for s in scripts]
 
                 clilog.debug("analyzed %s", fastapk.short_description())
 
                 return res
 
     def __store_results(self, results):
-        ''' Store the results and increase the analyzed apks counter.
+        ''' Store the results.
 
         Parameters
         ----------
@@ -181,7 +278,13 @@ class Worker(Process):
                 except StorageException as e:
                     log.warn(e)
 
-            self.add_analyzed_apks_sm(1)
+            # fan out results to the apks sharing the .dex files
+            try:
+                store_func = lambda apk, script: AnalyzeUtil.store_script_res(self.storage, script, apk)
+                for storage_result in AnalyzeUtil.store_dex_only_results(store_func, fastapk, script_results, self.dex_duplicates):
+                    self.add_storage_result(storage_result)
+            except StorageException as e:
+                log.warn(e)
 
     def run(self):
         work_queue = self.work_queue
@@ -190,6 +293,8 @@ class Worker(Process):
             for work in iter(work_queue.get, STOP_SENTINEL):
                 try:
                     apk_path, _apk, _ = work
+                    with self.__job_lock:
+                        self.set_current_job(apk_path)
     
                     eandro_apk = AnalyzeUtil.open_apk(apk_path, apk=_apk)
     
@@ -198,22 +303,31 @@ class Worker(Process):
     
                     # remember yet analyzed APKs
                     if eandro_apk:
-                        self.analyzed_apks.put(FastApk.load_from_eandroapk(eandro_apk))
+                        self.add_analyzed_apk(FastApk.load_from_eandroapk(eandro_apk))
                     
                     # collect results
                     if res is not None:
                         self.__store_results([res])
-                    else:
-                        # increment analyzed apks counter
-                        self.add_analyzed_apks_sm(1)
                         
                 except KeyboardInterrupt as e:
                     raise e
                 except Exception as e:
                     log.exception(e)
                 finally:
-                    # signal one task done
-                    work_queue.task_done()
+                    # the job is either still published (the supervisor finishes it if it kills the worker) or done
+                    with self.__job_lock:
+                        # increment analyzed apks counter
+                        self.add_analyzed_apks_sm(1)
+                        self.set_current_job(None)
+                        # signal one task done
+                        work_queue.task_done()
+                    self.__cnt_apks += 1
+
+                # exit between two apks, so that no work gets lost
+                # the analyzer will start a new worker
+                if self.needs_recycling():
+                    self.flush_results()
+                    sys.exit(RECYCLE_EXIT_CODE)
     
             # signal sentinel read
             work_queue.task_done()
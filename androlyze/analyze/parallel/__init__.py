@@ -6,3 +6,10 @@ __email__ = "schmidt89 at informatik.uni-marburg.de"
 
 # item to enqueue to signal other workers to stop
 STOP_SENTINEL = 'STOP'
+
+# exit code of a worker that wants to be replaced (see worker recycling)
+RECYCLE_EXIT_CODE = 3
+
+# kinds of results a worker hands off to the supervisor in isolation mode
+HAND_OFF_ANALYZED_APK = "analyzed apk"
+HAND_OFF_STORAGE_RESULT = "storage result"
@@ -42,3 +42,7 @@ CELERY_RETRY_INFINITE = None
 def get_analyze_task_name():
     from androlyze.analyze.distributed.tasks.AnalyzeTask import AnalyzeTask
     return AnalyzeTask.name
+
+def get_analyze_chunk_task_name():
+    from androlyze.analyze.distributed.tasks.AnalyzeTask import AnalyzeChunkTask
+    return AnalyzeChunkTask.name
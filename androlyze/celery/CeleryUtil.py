@@ -120,6 +120,26 @@ def exp_backoff(task, _max = 64):
     '''
     return min(2 ** task.request.retries, _max)
 
+def get_chunk_time_limits(cnt_apks):
+    ''' Get the time limits (task options) for a chunk of `cnt_apks` apks.
+    The configured time limits are meant for one apk.
+
+    Returns
+    -------
+    dict<str, int>
+    '''
+    from androlyze.celery import celerysettings
+
+    soft_limit, hard_limit = celerysettings.CELERY_ANALYSIS_SOFT_TIME_LIMIT, celerysettings.CELERY_ANALYSIS_HARD_TIME_LIMIT
+    options = {}
+    if soft_limit is not None:
+        options["soft_time_limit"] = soft_limit * 60 * cnt_apks
+    if hard_limit is not None:
+        # keep the grace period between the soft and the hard limit
+        grace_period = hard_limit - soft_limit if soft_limit is not None else 0
+        options["time_limit"] = ((soft_limit or hard_limit) * cnt_apks + max(grace_period, 0)) * 60
+    return options
+
 def get_registered_workers():
     ''' Get the registered celery workers '''
     ping_results = app.control.inspect().ping() or {}
@@ -152,6 +172,23 @@ def get_workers_and_check_network():
 #---Result fetching/callback
 ############################################################
 
+def get_task_meta(async_result):
+    ''' Get the task meta of the finished task like :py:meth:`.join_native` delivers it.
+
+    Parameters
+    ----------
+    async_result : AsyncResult
+
+    Returns
+    -------
+    dict
+    '''
+    from androlyze.celery import CeleryConstants
+
+    return {CeleryConstants.CELERY_RESULT_BACKEND_KEY_STATUS : async_result.state,
+            CeleryConstants.CELERY_RESULT_BACKEND_KEY_RESULT : async_result.result,
+            CeleryConstants.CELERY_RESULT_BACKEND_KEY_TRACEBACK : async_result.traceback}
+
 def join_native(result_group, timeout=None, propagate=True,
                 interval=0.5, callback=None):
     ''' Same as :py:method:`GroupResult.join_native` but delivers task meta too.
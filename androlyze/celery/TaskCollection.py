@@ -12,11 +12,14 @@ from androlyze.log.Log import log
 from celery import current_app as app
 
 class TaskCollection(object):
-    ''' Collection of tasks (by id) '''
+    ''' Collection of tasks (by id).
+
+    Only the ids of the published but not yet finished tasks are kept.
+    '''
 
     def __init__(self, total_cnt_apks):
         super(TaskCollection, self).__init__()
-        self.__task_ids = []
+        self.__task_ids = set()
         self.__send_tasks = Value('i', 0, lock = RLock())
         self.__total_cnt_apks = total_cnt_apks
 
@@ -57,14 +60,14 @@ class TaskCollection(object):
     def __repr__(self):
         return repr(self.task_ids)
 
-    task_ids = property(get_task_ids, set_task_ids, del_task_ids, "list<str> - List of task ids")
+    task_ids = property(get_task_ids, set_task_ids, del_task_ids, "set<str> - Ids of the published but not yet finished tasks")
     send_tasks = property(get_send_tasks, set_send_tasks, del_send_tasks, "Value(int) : Number of send tasks (shared memory)")
     total_cnt_apks = property(get_total_cnt_apks, set_total_cnt_apks, del_total_cnt_apks, "int : total number of apks to analyze")
 
     def revoke_all(self, *args, **kwargs):
         ''' Revoke tasks '''
         log.warn("will revoke %d tasks", len(self.task_ids))
-        app.control.revoke(self.task_ids, *args, **kwargs)
+        app.control.revoke(list(self.task_ids), *args, **kwargs)
 
     def all_tasks_published(self):
         ''' Check if all tasks have been published '''
@@ -19,3 +19,15 @@ CELERY_ANALYSIS_STORE_RES_RETRY_CNT = settings.get_int((SECTION_ANALYSIS, KEY_AN
 CELERY_ANALYSIS_SCRIPT_LOAD_RETRY_CNT = settings.get_int((SECTION_ANALYSIS, KEY_ANALYSIS_SCRIPT_LOAD_RETRY_CNT), default = None)
 
 CELERY_TASK_REVOCATION_ENABLED = settings.__getitem__((SECTION_ANALYSIS, KEY_ANALYSIS_TASK_RECOVATION_ENABLED), default = True)
+
+CELERY_ANALYSIS_APKS_PER_TASK = settings.get_int((SECTION_ANALYSIS, KEY_ANALYSIS_APKS_PER_TASK), default = 1)
+CELERY_ANALYSIS_MAX_TASKS_IN_FLIGHT = settings.get_int((SECTION_ANALYSIS, KEY_ANALYSIS_MAX_TASKS_IN_FLIGHT), default = 1000)
+CELERY_ANALYSIS_BLOB_TRANSPORT = settings.get_bool((SECTION_ANALYSIS, KEY_ANALYSIS_BLOB_TRANSPORT), default = False)
+
+# apk prefetching (max size in MB)
+CELERY_ANALYSIS_PREFETCH_APKS = settings.get_int((SECTION_ANALYSIS, KEY_ANALYSIS_PREFETCH_APKS), default = 2)
+CELERY_ANALYSIS_PREFETCH_MAX_SIZE = settings.get_int((SECTION_ANALYSIS, KEY_ANALYSIS_PREFETCH_MAX_SIZE), default = 256)
+
+# time limits for the analysis of one apk (in minutes)
+CELERY_ANALYSIS_SOFT_TIME_LIMIT = settings.get_int((SECTION_ANALYSIS, KEY_ANALYSIS_SOFT_TIME_LIMIT), default = None)
+CELERY_ANALYSIS_HARD_TIME_LIMIT = settings.get_int((SECTION_ANALYSIS, KEY_ANALYSIS_HARD_TIME_LIMIT), default = None)
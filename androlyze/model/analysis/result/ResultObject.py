@@ -19,6 +19,9 @@ class ResultObject(object):
     The order in which you register the keys will be kept and used for JSON export.
 
     You don't have to register all keys iterative, just give a list of categories to create the structure at once.
+
+    The static structure of a script can be registered once into a template (see :py:meth:`.add_template`)
+    and keys which are logged often can be resolved once into a :py:class:`.LogHandle` (see :py:meth:`.get_handle`).
     '''
 
     def __init__(self, apk = None):
@@ -188,6 +191,86 @@ class ResultObject(object):
         '''
         self.__log(key, value, self.__dict_list_append, *categories)
 
+    def get_handle(self, key, *categories):
+        ''' Resolve the registered `key` under the given `categories` once
+        and get a handle for logging the value of it without walking the categories again.
+
+        The handle stays valid as long as the categories are not replaced
+        (e.g. by logging a new value for one of them).
+
+        Parameters
+        ----------
+        key: object
+        categories: object
+            The string representation will be used for the category name.
+
+        Returns
+        -------
+        LogHandle
+
+        Raises
+        ------
+        KeyNotRegisteredError
+            If the key or one of the categories has not been registered first.
+
+        Examples
+        --------
+        >>> res.register_enum_keys(["activities"], "components")
+        >>> activities = res.get_handle("activities", "components")
+        >>> for activity in apk.get_activities():
+        ...     activities.log_append_to_enum(activity)
+        '''
+        _dict = self.results
+        for category in categories:
+            category_name = str(category)
+            sub_dict = _dict.get(category_name)
+            if not isinstance(sub_dict, dict):
+                raise KeyNotRegisteredError(key, *categories)
+            _dict = sub_dict
+
+        if key not in _dict:
+            raise KeyNotRegisteredError(key, *categories)
+
+        return LogHandle(_dict, key)
+
+    ############################################################
+    #---Templates
+    ############################################################
+
+    def copy(self):
+        ''' Copy the structure of the `ResultObject` (the categories and the lists of enumeration keys).
+        The other values are shared, so only use this for templates which only contain registered keys.
+
+        Returns
+        -------
+        ResultObject
+            Linked to the same apk.
+        '''
+        res = ResultObject(self.apk)
+        res.results = self.__copy_structure(self.results)
+        return res
+
+    def add_template(self, template):
+        ''' Register the keys of the `template` (a `ResultObject` only holding the registered keys)
+        by copying its structure.
+
+        This is much cheaper than registering each key again,
+        so register the static structure of a script once into a template and add it for every apk.
+
+        Existing keys (not categories) with the same name will be overwritten.
+
+        Parameters
+        ----------
+        template : ResultObject
+        '''
+        for key, val in template.results.iteritems():
+            cur_val = self.results.get(key)
+            # merge categories
+            if isinstance(val, dict) and isinstance(cur_val, dict):
+                self.__add_structure(cur_val, val)
+            else:
+                self.results[key] = self.__copy_structure(val)
+
     ############################################################
     #--Import/export stuff
     ############################################################
@@ -233,6 +316,24 @@ class ResultObject(object):
     #---Private implementation
     ############################################################
 
+    @staticmethod
+    def __copy_structure(val):
+        ''' Copy the dictionaries and lists of the `val` '''
+        if isinstance(val, dict):
+            return OrderedDict((k, ResultObject.__copy_structure(v)) for k, v in val.iteritems())
+        elif isinstance(val, list):
+            return list(val)
+        return val
+
+    @staticmethod
+    def __add_structure(_dict, template_dict):
+        ''' Copy the structure of the `template_dict` into `_dict` '''
+        for key, val in template_dict.iteritems():
+            cur_val = _dict.get(key)
+            if isinstance(val, dict) and isinstance(cur_val, dict):
+                ResultObject.__add_structure(cur_val, val)
+            else:
+                _dict[key] = ResultObject.__copy_structure(val)
 
     def __log(self, key, value, func, *categories, **kwargs):
         ''' Store the `value` for the given `key`.
@@ -267,33 +368,17 @@ class ResultObject(object):
         if None in categories:
             raise ValueError("You supplied an empty category: %s" % ', '.join([str(x) for x in categories]))
 
-        def log2(_dict, key, value, *sub_categories):
-            cnt_categories = len(sub_categories)
-            # category logging
-            if cnt_categories >= 1:
-                category = sub_categories[0]
-                category_name = str(category)
-                # create sub dictionary for category if not already present and shall be registered
-                category_in_dict = category_name in _dict
-                category_val_none = category_in_dict and _dict[category_name] is None
-                # either already registered None to category or category not yet registered
-                if category_val_none or not category_in_dict:
-                    self.__check_n_set_value_for_key(_dict, category_name, OrderedDict(), self.__dict_assignment, register_key, *categories)
-
-                sub_dict = _dict[category_name]
-
-                if cnt_categories > 1:
-                    # category not present, create it and run into recursion
-                    # to check sub categories
-                    log2(sub_dict, key, value, *sub_categories[1:])
-                # reached last category, create entry
-                elif cnt_categories == 1:
-                    self.__check_n_set_value_for_key(sub_dict, key, value, func, register_key, *categories)
-            # == 0, no category given, set value for key directly
-            else:
-                self.__check_n_set_value_for_key(_dict, key, value, func, register_key, *categories)
+        _dict = self.results
+        for category in categories:
+            category_name = str(category)
+            sub_dict = _dict.get(category_name)
+            # either already registered None to category or category not yet registered
+            if sub_dict is None:
+                sub_dict = OrderedDict()
+                self.__check_n_set_value_for_key(_dict, category_name, sub_dict, self.__dict_assignment, register_key, *categories)
+            _dict = sub_dict
 
-        log2(self, key, value, *categories)
+        self.__check_n_set_value_for_key(_dict, key, value, func, register_key, *categories)
 
     @staticmethod
     def __dict_assignment(_dict, key, val):
@@ -323,6 +408,46 @@ class ResultObject(object):
         else:
             raise KeyNotRegisteredError(key, *categories)
 
+class LogHandle(object):
+    ''' Handle for logging the value of a registered key of a `ResultObject` in O(1).
+    See :py:meth:`.ResultObject.get_handle`.
+    '''
+
+    def __init__(self, _dict, key):
+        '''
+        Parameters
+        ----------
+        _dict : dict
+            The (category) dictionary holding the `key`.
+        key : object
+        '''
+        self.__dict = _dict
+        self.__key = key
+
+    def __repr__(self):
+        return "%s(%s)" % (self.__class__.__name__, self.__key)
+
+    def get_key(self):
+        return self.__key
+
+    key = property(get_key, None, None, "object : The key the handle logs to.")
+
+    def get(self):
+        ''' Get the current value '''
+        return self.__dict[self.__key]
+
+    def log(self, value):
+        ''' Store the `value` for the key. See :py:meth:`.ResultObject.log` '''
+        self.__dict[self.__key] = value
+
+    def log_true(self):
+        ''' Log True for the key. See :py:meth:`.ResultObject.log_true` '''
+        self.__dict[self.__key] = True
+
+    def log_append_to_enum(self, value):
+        ''' Append the `value` to the list of the key. See :py:meth:`.ResultObject.log_append_to_enum` '''
+        self.__dict[self.__key].append(value)
+
 if __name__ == '__main__':
     from androlyze.model.android.apk.FastApk import FastApk
     from datetime import datetime
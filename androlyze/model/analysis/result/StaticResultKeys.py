@@ -24,6 +24,16 @@ RESOBJ_SCRIPT_META_HASH = "sha256"
 RESOBJ_SCRIPT_META_TIME_TOTAL = "time total"
 RESOBJ_SCRIPT_META_TIME_SCRIPT = "time script"
 RESOBJ_SCRIPT_META_ANALYZE_TIME = "time androguard open"
+# time of each androguard phase
+RESOBJ_SCRIPT_META_ANALYZE_TIME_PHASES = "time androguard phases"
+# resident set size of the analyzing process after the script ran (in KB)
+RESOBJ_SCRIPT_META_RSS = "rss after script"
+# resident set size of the analyzing process after each androguard phase (in KB)
+RESOBJ_SCRIPT_META_ANALYZE_RSS_PHASES = "rss after androguard phases"
+# number of classes skipped because they belong to a library
+RESOBJ_SCRIPT_META_LIBRARY_CLASSES = "library classes skipped"
+# partial result, a resource budget has been exceeded
+RESOBJ_SCRIPT_META_BUDGET_EXCEEDED = "budget exceeded"
 
 RESOBJ_APK_META = "apk meta"
 RESOBJ_APK_META_PACKAGE_NAME = "package name"
@@ -32,4 +32,7 @@ MANIFEST_RECEIVER = "receiver"
 MANIFEST_PROVIDER = "provider"
 
 # .dex file
-COMPILED_APP_CODE = "classes.dex"
\ No newline at end of file
+COMPILED_APP_CODE = "classes.dex"
+
+# all .dex files of a multidex app: classes.dex, classes2.dex, classes3.dex, ...
+COMPILED_APP_CODE_MULTIDEX_REGEX = r"^classes([2-9]|[1-9]\d+)?\.dex$"
\ No newline at end of file
@@ -5,6 +5,8 @@ __author__ = "Nils Tobias Schmidt"
 __email__ = "schmidt89 at informatik.uni-marburg.de"
 
 from collections import OrderedDict
+import hashlib
+import re
 from xml.dom import minidom
 
 from androguard.core.bytecodes.apk import AXMLPrinter
@@ -13,11 +15,58 @@ from androlyze.log.Log import log
 from androlyze.model.analysis.result.StaticResultKeys import *
 from androlyze.model.android.Constants import ANDROID_FILE_EXTENSION, \
     MANIFEST_ACTIVITY, MANIFEST_SERVICE, MANIFEST_RECEIVER, MANIFEST_PROVIDER, \
-    MANIFEST_NS
+    MANIFEST_NS, COMPILED_APP_CODE_MULTIDEX_REGEX
 from androlyze.model.script.impl.manifest.components import get_components_cache, \
     component_key_2_intent_key
 from androlyze.util.Util import utc2local
 
+def get_dex_file_names(zip_file_names):
+    ''' Get the names of all .dex files (multidex) in the order they are loaded by android
+    (classes.dex, classes2.dex, ...).
+
+    Parameters
+    ----------
+    zip_file_names : iterable<str>
+        Names of the files in the apk (zip file).
+
+    Returns
+    -------
+    list<str>
+    '''
+    dex_files = []
+    for fn in zip_file_names:
+        match = re.match(COMPILED_APP_CODE_MULTIDEX_REGEX, fn)
+        if match:
+            # classes.dex has no number
+            dex_files.append((int(match.group(1) or 1), fn))
+    return [fn for _, fn in sorted(dex_files)]
+
+def get_dex_hash(zip_file):
+    ''' Get the sha256 of the content of all .dex files (multidex) of the apk.
+
+    Apks with the same dex hash ship the same code
+    (e.g. re-signed builds or resource only updates).
+    The name and sha256 of each .dex file are hashed, so that the boundaries of the files count.
+
+    Parameters
+    ----------
+    zip_file : zipfile.ZipFile
+        The apk.
+
+    Returns
+    -------
+    str
+        sha256 as hexstring
+    None
+        If the apk has no .dex file.
+    '''
+    dex_names = get_dex_file_names(zip_file.namelist())
+    if not dex_names:
+        return None
+    hasher = hashlib.sha256()
+    for dex_name in dex_names:
+        hasher.update("%s:%s\n" % (dex_name, hashlib.sha256(zip_file.read(dex_name)).hexdigest()))
+    return hasher.hexdigest()
 
 class Apk(Hashable):
     ''' Defines an object for the basic attributes of an Apk file.
@@ -35,6 +84,7 @@ class Apk(Hashable):
         self._tag = None
         self._size_app_code = 0
         self._build_date = None
+        self._dex_hash = None
 
     def __eq__(self, other):
         if isinstance(other, Apk):
@@ -124,12 +174,22 @@ class Apk(Hashable):
     def del_build_date(self):
         del self._build_date        
 
+    def get_dex_hash(self):
+        return self._dex_hash
+
+    def set_dex_hash(self, value):
+        self._dex_hash = value
+
+    def del_dex_hash(self):
+        del self._dex_hash
+
     package_name = property(get_package_name, set_package_name, del_package_name, "str - Package name of the apk. Unique apk identifier (at least in the store)")
     version_name = property(get_version_name, set_version_name, del_version_name, "str - version")
     import_date = property(get_import_date, set_import_date, del_import_date, " datetime.datetime : the import date (default is None)")
     tag = property(get_tag, set_tag, del_tag, "str : some tag")
-    size_app_code = property(get_size_app_code, set_size_app_code, del_size_app_code, "int : size of the uncompressed .dex file")
+    size_app_code = property(get_size_app_code, set_size_app_code, del_size_app_code, "int : size of the uncompressed .dex files")
     build_date = property(get_build_date, set_build_date, del_build_date, "datetime.datetime : the build date (last timestamp of classes.dex) in zipfile")
+    dex_hash = property(get_dex_hash, set_dex_hash, del_dex_hash, "str : sha256 of the .dex files (default is None)")
 
     def __str__(self):
         SEP = '\n\t'
@@ -145,6 +205,8 @@ class Apk(Hashable):
             res += "%scode size: %d" % (SEP, self.size_app_code)
         if self.build_date is not None:
             res += "%sbuild date: %s" % (SEP, utc2local(self.build_date))
+        if self.dex_hash is not None:
+            res += "%sdex sha256: %s" % (SEP, self.dex_hash)
         return res
 
     def __repr__(self):
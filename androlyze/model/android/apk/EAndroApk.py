@@ -6,7 +6,7 @@ __email__ = "schmidt89 at informatik.uni-marburg.de"
 
 from androguard.core.bytecodes.apk import APK
 from androlyze.model.android.Constants import COMPILED_APP_CODE
-from androlyze.model.android.apk.Apk import Apk
+from androlyze.model.android.apk.Apk import Apk, get_dex_file_names, get_dex_hash
 from androlyze.util import Util
 from datetime import datetime
 
@@ -96,10 +96,29 @@ class EAndroApk(Apk, APK):
     def del_tag(self):
         del self._tag
 
+    def get_dex_names(self):
+        ''' Get the names of all .dex files (multidex) '''
+        return get_dex_file_names(self.zip.namelist())
+
+    def get_all_dex(self):
+        ''' Get the raw data of all .dex files (classes.dex first).
+
+        Returns
+        -------
+        list<str>
+        '''
+        return [self.zip.read(dex_name) for dex_name in self.get_dex_names()]
+
+    def get_dex_hash(self):
+        ''' Get the sha256 of the .dex files (computed on demand) '''
+        if self._dex_hash is None:
+            self._dex_hash = get_dex_hash(self.zip)
+        return self._dex_hash
+
     def get_size_app_code(self):
-        ''' Get size of app code on demand (uncompressed .dex) file '''
+        ''' Get size of app code on demand (all uncompressed .dex files) '''
         if self._size_app_code == 0:
-            file_size = self.zip.getinfo(COMPILED_APP_CODE).file_size
+            file_size = sum(self.zip.getinfo(dex_name).file_size for dex_name in self.get_dex_names())
             self.size_app_code = file_size
         return self._size_app_code
 
@@ -119,8 +138,9 @@ class EAndroApk(Apk, APK):
     hash = property(get_hash, lambda s, v: s.set_hash(v), lambda s: s.del_hash(), "str - sha256 of raw apk file (hexstring)")
     import_date = property(get_import_date, set_import_date, del_import_date, " datetime.datetime : the import date (default is None)")
     tag = property(get_tag, set_tag, del_tag, "str : some tag")
-    size_app_code = property(get_size_app_code, lambda s, v: s.set_size_app_code(v), lambda s: s.del_size_app_code(), "int : size of the uncompressed .dex file")
+    size_app_code = property(get_size_app_code, lambda s, v: s.set_size_app_code(v), lambda s: s.del_size_app_code(), "int : size of the uncompressed .dex files")
     build_date = property(get_build_date, lambda s, v: s.set_build_date(v), lambda s: s.del_build_date(), "datetime.dateime : build date (inferred from classes.dex timestamp)")
+    dex_hash = property(get_dex_hash, lambda s, v: s.set_dex_hash(v), lambda s: s.del_dex_hash(), "str : sha256 of the .dex files (computed on demand)")
 
 if __name__ == '__main__':
     # APK_NAME = "/home/nils/projects/thesis/a2dp.Vol.apk"
@@ -10,7 +10,7 @@ from xml.dom import minidom
 from androlyze.loader.exception import CouldNotOpenApk, CouldNotOpenManifest
 from androlyze.model.android.Constants import MANIFEST_FILENAME, MANIFEST_NS, \
     MANIFEST_VERSION_NAME, MANIFEST_PACKAGE, MANIFEST_TAG_NAME, COMPILED_APP_CODE
-from androlyze.model.android.apk.Apk import Apk
+from androlyze.model.android.apk.Apk import Apk, get_dex_file_names, get_dex_hash
 from androlyze.util import Util
 from androlyze.model.analysis.result.StaticResultKeys import RESOBJ_APK_META,\
     RESOBJ_APK_META_PACKAGE_NAME, RESOBJ_APK_META_VERSION_NAME,\
@@ -27,7 +27,7 @@ class FastApk(Apk, object):
     http://developer.android.com/guide/topics/manifest/manifest-intro.html
     '''
 
-    def __init__(self, package_name, version_name, path = None, _hash = None, import_date = None, tag = None, size_app_code = 0, build_date = None):
+    def __init__(self, package_name, version_name, path = None, _hash = None, import_date = None, tag = None, size_app_code = 0, build_date = None, dex_hash = None):
         ''' Create an apk instance. If the sha digest is not given,
         it will be calculated by loading the file at the time of the first retrieval. '''
         Apk.__init__(self)
@@ -40,6 +40,7 @@ class FastApk(Apk, object):
         self.path = path
         self.size_app_code = size_app_code
         self.build_date = build_date
+        self.dex_hash = dex_hash
 
     def __eq__(self, other):
         if isinstance(other, FastApk):
@@ -84,7 +85,7 @@ class FastApk(Apk, object):
         apk_file_path: str, optional (default is "not set")
             Path of apk
         calculate_hash : bool
-            If true calculate the hash.
+            If true calculate the hash and the hash of the .dex files.
             This means the file has be to loaded completely into memory.
             If False, the hash will be calculated the first time it gets retrieved.
 
@@ -140,8 +141,8 @@ class FastApk(Apk, object):
                 # check that manifest tag is available
                 if len(manifest_tag) > 0:
                     
-                    # get size of uncompresses .dex file
-                    size_app_code = z.getinfo(COMPILED_APP_CODE).file_size
+                    # get size of uncompresses .dex files (multidex)
+                    size_app_code = sum(z.getinfo(dex_name).file_size for dex_name in get_dex_file_names(z.namelist()))
                     # get build date (last timestamp of classes.dex in zipfile)
                     build_date = datetime(
                                           # use tuple from zipfile and pass the unpacked content to the constructor
@@ -149,11 +150,14 @@ class FastApk(Apk, object):
                                           )
                     
                     
+                    # needed to find apks sharing the same code
+                    dex_hash = get_dex_hash(z) if calculate_hash else None
+
                     manifest_items = manifest_tag[0].attributes
                     # use the namespace to ignore wrong prefixes like "ns0"
                     version_name = manifest_items.getNamedItemNS(MANIFEST_NS, MANIFEST_VERSION_NAME).nodeValue
                     package = manifest_items.getNamedItem(MANIFEST_PACKAGE).nodeValue
-                    return FastApk(package, version_name, path = apk_file_path, _hash = _hash, size_app_code = size_app_code, build_date = build_date)
+                    return FastApk(package, version_name, path = apk_file_path, _hash = _hash, size_app_code = size_app_code, build_date = build_date, dex_hash = dex_hash)
             raise CouldNotOpenManifest(apk_file_path), None, sys.exc_info()[2]
         except Exception as e:
             raise CouldNotOpenApk(apk_file_path, caused_by = e), None, sys.exc_info()[2]
@@ -259,7 +263,7 @@ class FastApk(Apk, object):
         -------
         FastApk
         '''
-        return FastApk(eandro_apk.package_name, eandro_apk.version_name, path = eandro_apk.path, _hash = eandro_apk.hash, import_date = eandro_apk.import_date, tag = eandro_apk.tag, size_app_code = eandro_apk.size_app_code, build_date = eandro_apk.build_date)
+        return FastApk(eandro_apk.package_name, eandro_apk.version_name, path = eandro_apk.path, _hash = eandro_apk.hash, import_date = eandro_apk.import_date, tag = eandro_apk.tag, size_app_code = eandro_apk.size_app_code, build_date = eandro_apk.build_date, dex_hash = eandro_apk.dex_hash)
 
     @staticmethod
     def load_from_result_dict(res_dict):
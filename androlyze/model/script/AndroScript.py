@@ -4,16 +4,25 @@
 __author__ = "Nils Tobias Schmidt"
 __email__ = "schmidt89 at informatik.uni-marburg.de"
 
+from copy import copy
 from datetime import datetime
+import os
+from time import time
 
+from androlyze.analyze.ApkFacts import ApkFacts
+from androlyze.analyze.LibraryFilter import get_library_filter
 from androlyze.analyze.exception import AndroScriptError
 from androlyze.log.Log import log
 from androlyze.model.Resetable import Resetable
 from androlyze.model.analysis.result.ResultObject import ResultObject
 from androlyze.model.analysis.result.StaticResultKeys import *
 from androlyze.model.script import ScriptUtil
+from androlyze.model.script.ResultSink import is_result_sink
 from androlyze.storage.Constants import JSON_FILE_EXT
-from androlyze.util.Util import timeit, sha256
+from androlyze.util.Util import sha256, get_rss
+
+# script class -> `ResultObject` holding the static structure of the results (see `AndroScript.register_result_keys`)
+_result_templates = {}
 
 class AndroScript(object, Resetable, Hashable):
     '''
@@ -41,6 +50,7 @@ class AndroScript(object, Resetable, Hashable):
         Hashable.__init__(self)
 
         self.__name = self.__class__.__name__
+        self.__cres = None
 
         self.reset()
 
@@ -87,6 +97,21 @@ class AndroScript(object, Resetable, Hashable):
     def get_file_name_ext(self):
         return self.__file_name_ext
 
+    def get_time_script(self):
+        return self.__time_script
+
+    def get_rss_script(self):
+        return self.__rss_script
+
+    def get_cnt_library_classes(self):
+        return self.__cnt_library_classes
+
+    def get_output(self):
+        return self.__output
+
+    def set_output(self, value):
+        self.__output = value
+
     def set_file_name_ext(self, value):
         self.__file_name_ext = value
 
@@ -97,6 +122,10 @@ class AndroScript(object, Resetable, Hashable):
     res = property(get_res, set_res, del_res, "ResultObject : keeps the analysis results")
     cres = property(get_cres, set_cres, del_cres, "object, optional (default is None) : Custom result object for logging")
     name = property(get_name, set_name, del_name, "str : the name of the script (class name)")
+    time_script = property(get_time_script, None, None, "float : Time in seconds the last `_analyze` run took (without androguard time). None if not run since the last reset.")
+    rss_script = property(get_rss_script, None, None, "int : RSS (KB) of the process after the last `_analyze` run. None if not run since the last reset or not available.")
+    output = property(get_output, set_output, None, "object : Intermediate result for the scripts depending on this one (not stored). See :py:meth:`.depends_on`.")
+    cnt_library_classes = property(get_cnt_library_classes, None, None, "int : Number of classes skipped since the last reset because they belong to a library. See :py:meth:`.is_library_class`.")
 
     def analyze(self, apk, dalvik_vm_format, vm_analysis, gvm_analysis, *args, **kwargs):
         '''
@@ -118,6 +147,14 @@ class AndroScript(object, Resetable, Hashable):
         log_script_meta : bool, optional (default is True)
             Can be used to disable logging of script meta infos at all.
             Otherwise they will be logged only once.
+        analysis_context : AnalysisContext, optional (default is None)
+            Creates the analysis objects on demand.
+            The androguard time caused by the script is not counted as script run time.
+        facts : ApkFacts, optional (default is None)
+            Facts about the apk shared by the scripts.
+            If not given, a new store will be passed to `_analyze`.
+        dependencies : dict<str, AndroScript>, optional (default is None)
+            The finished scripts this one depends on (by name). See :py:meth:`.depends_on`.
 
         Returns
         -------
@@ -134,13 +171,31 @@ class AndroScript(object, Resetable, Hashable):
         if log_script_meta:
             self._log_script_meta_before_act_run(res)
 
+        # register the static structure
+        res.add_template(self.get_result_template())
+
+        if kwargs.get("facts") is None:
+            kwargs["facts"] = ApkFacts(apk)
+
+        analysis_context = kwargs.get("analysis_context")
+        androguard_time_before = analysis_context.get_total_time() if analysis_context is not None else 0
+
         # analyze and measure time
-        time_s = timeit(self._analyze,
-                        *((apk, dalvik_vm_format, vm_analysis, gvm_analysis) +  args),
-                         **kwargs)
+        start = time()
+        try:
+            self._analyze(*((apk, dalvik_vm_format, vm_analysis, gvm_analysis) +  args), **kwargs)
+        finally:
+            # also if interrupted (e.g. by an exceeded budget), the partial results are kept
+            time_s = time() - start
+
+            # analysis objects may have been created while the script was running
+            if analysis_context is not None:
+                time_s -= analysis_context.get_total_time() - androguard_time_before
+            self.__time_script = time_s
+            self.__rss_script = get_rss(os.getpid())
 
-        if log_script_meta and self.create_script_stats():
-            self._log_script_meta_after_act_run(res, time_s)
+            if log_script_meta and self.create_script_stats():
+                self._log_script_meta_after_act_run(res, time_s)
 
         return self.res
 
@@ -163,6 +218,15 @@ class AndroScript(object, Resetable, Hashable):
             Dex analyzer.
             Only available if `needs_vmanalysis` returns True.
         gvm_analysis : GVMAnalysis
+
+        Other Parameters
+        ----------------
+        facts : ApkFacts
+            Facts about the apk (e.g. the components) shared by the scripts.
+            Declare the facts you use with :py:meth:`.needed_facts`.
+        dependencies : dict<str, AndroScript>
+            The finished scripts declared in :py:meth:`.depends_on` (by name).
+            Use their `output` or `res`.
         '''
         raise NotImplementedError
 
@@ -172,6 +236,8 @@ class AndroScript(object, Resetable, Hashable):
         You can supply it here and access it via `self.cres`.
 
         E.g. you could return ("", "txt") for simply logging with a string to a .txt file.
+        For big outputs return a :py:class:`.ResultSink` and `write` to it,
+        its data is spooled to a temporary file and streamed into the storage.
 
         The str representation of it will be stored!
         Automatically stores your data (str() of `self.cres`) in mongodb's gridfs.
@@ -186,6 +252,23 @@ class AndroScript(object, Resetable, Hashable):
         '''
         raise NotImplementedError
 
+    def register_result_keys(self, res):
+        '''
+        Overwrite this method to register the static structure of your results (the keys which are the same for every apk).
+
+        It is only called once per script class, the structure is kept as template
+        which will be copied into `self.res` before `_analyze` runs.
+        So don't let it depend on the apk or on the state of the script!
+
+        Keys depending on the apk still need to be registered in `_analyze`.
+
+        Parameters
+        ----------
+        res : ResultObject
+            Register the keys here.
+        '''
+        pass
+
     def reset(self):
         '''
         Reset the `AndroScript` so that it can be used for a new analysis.
@@ -194,6 +277,20 @@ class AndroScript(object, Resetable, Hashable):
 
         Don't forget to call the super `reset` !
         '''
+        # remove the temporary file of the last result
+        if is_result_sink(self.__cres):
+            self.__cres.close()
+
+        self.__init_results()
+        self.__time_script = None
+        self.__rss_script = None
+        self.__cnt_library_classes = 0
+        # class name -> is library class (scripts check each method, so only check each class once)
+        self.__library_classes = {}
+        self.__output = None
+
+    def __init_results(self):
+        ''' Create new result objects '''
         # we need to (re)init the result object
         self.__res, self.__file_name_ext = ResultObject(None), JSON_FILE_EXT
 
@@ -229,6 +326,15 @@ class AndroScript(object, Resetable, Hashable):
         ''' Create data references. Automatically implies `needs_dalvik_vm_format`, `needs_vmanalysis` and `needs_gvmanalysis` '''
         return False
 
+    def needs_decompiler(self):
+        ''' Set up the decompiler (DAD) for the `DalvikVMFormat` object,
+        e.g. needed for `ClassDefItem.get_source()`.
+        Automatically implies `needs_dalvik_vm_format` and `needs_vmanalysis`.
+
+        Not needed if you use `decompile.DvMethod` directly.
+        '''
+        return False
+
     ############################################################
     #---Options
     ############################################################
@@ -247,6 +353,33 @@ class AndroScript(object, Resetable, Hashable):
         '''
         return False
 
+    def depends_on(self):
+        ''' Return the scripts (classes or names) whose results this script consumes.
+
+        The analysis runs them first (on the same apk) and passes them to `_analyze`
+        as keyword argument "dependencies" (name -> script).
+        Intermediate results can be passed via the `output` attribute of a script.
+        If one of them fails, this script will be skipped.
+        The scripts have to be part of the analysis.
+        '''
+        return ()
+
+    def needed_facts(self):
+        ''' Return the names of the facts (see :py:class:`.ApkFacts`) the script uses.
+        The facts are shared by the scripts and will be dropped after the last script declaring them.
+        '''
+        return ()
+
+    def is_dex_only(self):
+        ''' Return true, if the result only depends on the .dex files
+        (not on the manifest, resources or other files of the apk).
+
+        Apks sharing the same .dex files (e.g. re-signed builds or resource only updates)
+        will then only be analyzed once by this script if the deduplication is enabled.
+        The result is stored for each of them.
+        '''
+        return False
+
     ############################################################
     #---Testing stuff
     ############################################################
@@ -317,31 +450,122 @@ class AndroScript(object, Resetable, Hashable):
     def _log_script_meta_after_act_run(self, res, time_s, *args, **kwargs):
         ''' Log script meta infos after actual script run '''
         # log time
-        res.register_keys([RESOBJ_SCRIPT_META_TIME_SCRIPT], RESOBJ_SCRIPT_META)
+        res.register_keys([RESOBJ_SCRIPT_META_TIME_SCRIPT, RESOBJ_SCRIPT_META_LIBRARY_CLASSES], RESOBJ_SCRIPT_META)
         res.log(RESOBJ_SCRIPT_META_TIME_SCRIPT, time_s, RESOBJ_SCRIPT_META)
+        res.log(RESOBJ_SCRIPT_META_LIBRARY_CLASSES, self.cnt_library_classes, RESOBJ_SCRIPT_META)
 
     ############################################################
     #---Other
     ############################################################
 
+    def detach_result(self):
+        ''' Hand the results over to a snapshot of the script which can be stored later on
+        and let the script continue with new result objects.
+
+        The result objects are moved to the snapshot, not copied,
+        so this is cheap even for big results (unlike a `deepcopy` of the script).
+
+        Returns
+        -------
+        AndroScript
+            Shallow copy of the script owning the results.
+        '''
+        snapshot = copy(self)
+        # intermediate results are not stored
+        snapshot.output = None
+        self.__init_results()
+        return snapshot
+
+    def get_result_template(self):
+        ''' Get the `ResultObject` holding the static structure of the results.
+        Will be created once per script class. See :py:meth:`.register_result_keys`.
+
+        Returns
+        -------
+        ResultObject
+        '''
+        script_class = self.__class__
+        template = _result_templates.get(script_class)
+        if template is None:
+            template = ResultObject(None)
+            self.register_result_keys(template)
+            _result_templates[script_class] = template
+        return template
+
     def uses_custom_result_object(self):
         ''' Check if the script uses a custom result object for logging '''
         return self.cres is not None
 
-    def add_apk_androguard_analyze_time(self, seconds):
+    def is_library_class(self, class_name):
+        ''' Check if the class belongs to a well-known library (e.g. the android framework, support libraries or ad sdks)
+        and should be skipped.
+
+        The library packages can be configured in the settings. See :py:class:`.LibraryFilter`.
+        The result is remembered for each class until the next reset.
+
+        Parameters
+        ----------
+        class_name : str
+            Name of the class, e.g. "Landroid/app/Activity;" or "android.app.Activity".
+
+        Returns
+        -------
+        bool
+        '''
+        is_library_class = self.__library_classes.get(class_name)
+        if is_library_class is None:
+            is_library_class = self.__library_classes[class_name] = get_library_filter().is_library_class(class_name)
+            if is_library_class:
+                self.__cnt_library_classes += 1
+        return is_library_class
+
+    def add_apk_androguard_analyze_time(self, seconds, phases = None, phase_rss = None):
         ''' Add the androguard analyze time to the `ResultObject`.
-        This is also a good moment to calculate the complete time. '''
+        This is also a good moment to calculate the complete time
+        and to log the memory usage after the script (see `rss_script`).
+
+        Parameters
+        ----------
+        seconds : float
+            Androguard time.
+        phases : dict<str, float>, optional (default is None)
+            Time of each androguard phase. See :py:meth:`.AnalysisContext.timings`.
+        phase_rss : dict<str, int>, optional (default is None)
+            RSS after each androguard phase. See :py:meth:`.AnalysisContext.phase_rss`.
+        '''
         if self.create_script_stats():
             res = self.res
 
             # log androguard open time
-            res.register_keys([RESOBJ_SCRIPT_META_ANALYZE_TIME, RESOBJ_SCRIPT_META_TIME_TOTAL], RESOBJ_SCRIPT_META)
+            res.register_keys([RESOBJ_SCRIPT_META_ANALYZE_TIME, RESOBJ_SCRIPT_META_TIME_TOTAL, RESOBJ_SCRIPT_META_RSS], RESOBJ_SCRIPT_META)
             res.log(RESOBJ_SCRIPT_META_ANALYZE_TIME, seconds, RESOBJ_SCRIPT_META)
 
+            if phases is not None:
+                res.register_keys([RESOBJ_SCRIPT_META_ANALYZE_TIME_PHASES], RESOBJ_SCRIPT_META)
+                # copy, the timings may change while the next scripts run
+                res.log(RESOBJ_SCRIPT_META_ANALYZE_TIME_PHASES, phases.copy(), RESOBJ_SCRIPT_META)
+
+            if phase_rss is not None:
+                res.register_keys([RESOBJ_SCRIPT_META_ANALYZE_RSS_PHASES], RESOBJ_SCRIPT_META)
+                res.log(RESOBJ_SCRIPT_META_ANALYZE_RSS_PHASES, phase_rss.copy(), RESOBJ_SCRIPT_META)
+
+            res.log(RESOBJ_SCRIPT_META_RSS, self.rss_script, RESOBJ_SCRIPT_META)
+
             # log total time
-            total_time = seconds + res[RESOBJ_SCRIPT_META][RESOBJ_SCRIPT_META_TIME_SCRIPT]
+            total_time = seconds + (self.time_script or 0)
             res.log(RESOBJ_SCRIPT_META_TIME_TOTAL, total_time, RESOBJ_SCRIPT_META)
 
+    def add_budget_exceeded(self, budget):
+        ''' Mark the results as partial because the `budget` has been exceeded while the script was running.
+
+        Parameters
+        ----------
+        budget : ResourceBudget
+        '''
+        res = self.res
+        res.register_keys([RESOBJ_SCRIPT_META_BUDGET_EXCEEDED], RESOBJ_SCRIPT_META)
+        res.log(RESOBJ_SCRIPT_META_BUDGET_EXCEEDED, budget.description_dict(), RESOBJ_SCRIPT_META)
+
     def result_dict(self, gen_id = False):
         ''' Returns an `OrderedDict` holding information about the analyzed `Apk` as well as the script,
         as well as eventually user logged infos.
@@ -364,11 +588,17 @@ class AndroScript(object, Resetable, Hashable):
     def gen_unique_id(self):
         ''' Generate an unique id = sha256(apk hash + script name) '''
         try:
-            return sha256(self.res.apk.hash + self.name)
+            return AndroScript.unique_id(self.res.apk.hash, self.name)
         except AttributeError:
             log.warn('Could not calculate unique id for %s', self)
             raise
 
+    @staticmethod
+    def unique_id(apk_hash, script_name):
+        ''' Generate the unique id for the result of the script `script_name` on the apk with `apk_hash`.
+        See :py:meth:`.gen_unique_id` '''
+        return sha256(apk_hash + script_name)
+
     def get_file_name(self):
         ''' Get the file name used for storage '''
         apk = self.res.apk
@@ -7,6 +7,7 @@ __email__ = "schmidt89 at informatik.uni-marburg.de"
 import sys
 
 from androlyze.log.Log import log
+from androlyze.model.script import ScriptUtil
 from androlyze.model.script.AndroScript import AndroScript
 from androlyze.util import Util
 from androlyze.analyze.exception import AndroScriptError
@@ -123,52 +124,75 @@ class ChainedScript(AndroScript):
         # collect results from scripts
         collected_results = self.res
 
-        # run over scripts
-        for ascript in self.chain_scripts():
-            script_result = None
-            chained_script_name = self.try_get_chained_script_name(ascript)
-            try:
-                # analyze with script
-                script_result = ascript.analyze(apk, dalvik_vm_format, vm_analysis, gvm_analysis,
-                                                *args, **kwargs)
-
-                # store results under given categories
-                categories = self.root_categories()
-                if len(categories) > 0:
-                    # run over dict and log items
-                    for key, val in script_result.results.items():
-                        collected_results.register_keys([key], *categories)
-                        collected_results.log(key, val, *categories)
-
-                else:
-                    # simply update dict
-                    collected_results.results.update(script_result.results)
-
-                if log_script_meta:
-                    # log successful run
-                    collected_results.log_append_to_enum(CAT_SUCCESSFUL, chained_script_name, CAT_ROOT)
-
-            except Exception as e:
-                if log_script_meta:
-                    # the value that will be logged for the script failure
-                    failure_log_val = chained_script_name
-
-                    # if exception shall be logged, create dict with name as key and exception as value
-                    if self.log_script_failure_exception():
-                        # exception message
-                        exc_msg = Util.format_exception(sys.exc_info(), as_string = False)
-                        failure_log_val = {failure_log_val : exc_msg}
-
-                    # log that script encountered an error
-                    collected_results.log_append_to_enum(CAT_FAILURES, failure_log_val, CAT_ROOT)
-
-                if not self.continue_on_script_failure():
-                    # reraise exception if the analysis shall be stopped
-                    # after a script encountered an error
-                    raise
-                else:
-                    log.warn('''%s: The script "%s" on apk: %s caused an error! But the other scripts will still run! Have a look at the options of `ChainedScript` for exception traceback writing!
+        # the scripts this one depends on and the finished chained scripts by name
+        available = dict(kwargs.get("dependencies") or {})
+
+        # run the scripts after the ones they depend on
+        chain_scripts = self.chain_scripts()
+        try:
+            chain_scripts = ScriptUtil.sort_by_dependencies(chain_scripts)
+        except AndroScriptError as e:
+            log.warn(e)
+
+        try:
+            # run over scripts
+            for ascript in chain_scripts:
+                script_result = None
+                chained_script_name = self.try_get_chained_script_name(ascript)
+                try:
+                    dependency_names = ScriptUtil.get_dependency_names(ascript)
+                    unavailable = [dep for dep in dependency_names if dep not in available]
+                    if unavailable:
+                        raise AndroScriptError(ascript, additional_text = " Skipped, because the scripts it depends on failed or did not run: %s" % ', '.join(unavailable))
+                    kwargs["dependencies"] = dict((dep, available[dep]) for dep in dependency_names)
+
+                    # analyze with script
+                    script_result = ascript.analyze(apk, dalvik_vm_format, vm_analysis, gvm_analysis,
+                                                    *args, **kwargs)
+
+                    # store results under given categories
+                    categories = self.root_categories()
+                    if len(categories) > 0:
+                        # run over dict and log items
+                        for key, val in script_result.results.items():
+                            collected_results.register_keys([key], *categories)
+                            collected_results.log(key, val, *categories)
+
+                    else:
+                        # simply update dict
+                        collected_results.results.update(script_result.results)
+
+                    if log_script_meta:
+                        # log successful run
+                        collected_results.log_append_to_enum(CAT_SUCCESSFUL, chained_script_name, CAT_ROOT)
+
+                    available[ascript.name] = ascript
+
+                except Exception as e:
+                    if log_script_meta:
+                        # the value that will be logged for the script failure
+                        failure_log_val = chained_script_name
+
+                        # if exception shall be logged, create dict with name as key and exception as value
+                        if self.log_script_failure_exception():
+                            # exception message
+                            exc_msg = Util.format_exception(sys.exc_info(), as_string = False)
+                            failure_log_val = {failure_log_val : exc_msg}
+
+                        # log that script encountered an error
+                        collected_results.log_append_to_enum(CAT_FAILURES, failure_log_val, CAT_ROOT)
+
+                    if not self.continue_on_script_failure():
+                        # reraise exception if the analysis shall be stopped
+                        # after a script encountered an error
+                        raise
+                    else:
+                        log.warn('''%s: The script "%s" on apk: %s caused an error! But the other scripts will still run! Have a look at the options of `ChainedScript` for exception traceback writing!
 \tError: %s''' % (self.__class__.__name__, ascript, apk.short_description(), e))
+        finally:
+            # intermediate results are not needed any more
+            for ascript in chain_scripts:
+                ascript.output = None
 
     def _log_chained_script_meta(self):
         ''' Log all scripts that are chained through this class
@@ -273,3 +297,16 @@ class ChainedScript(AndroScript):
     def needs_dref(self):
         return any([s.needs_dref() for s in self.chain_scripts()])
 
+    def needs_decompiler(self):
+        return any([s.needs_decompiler() for s in self.chain_scripts()])
+
+    def is_dex_only(self):
+        return all([s.is_dex_only() for s in self.chain_scripts()])
+
+    def needed_facts(self):
+        return tuple(set(fact for s in self.chain_scripts() for fact in s.needed_facts()))
+
+    def depends_on(self):
+        chained_names = set(s.name for s in self.chain_scripts())
+        return tuple(set(dep for s in self.chain_scripts() for dep in ScriptUtil.get_dependency_names(s) if dep not in chained_names))
+
@@ -0,0 +1,143 @@
+
+# encoding: utf-8
+
+__author__ = "Nils Tobias Schmidt"
+__email__ = "schmidt89 at informatik.uni-marburg.de"
+
+import os
+import shutil
+from tempfile import SpooledTemporaryFile, NamedTemporaryFile
+
+from androlyze.model.script.CustomResultObjInterface import CustomResultObjInterface
+
+# data is kept in memory until it exceeds this size (bytes), afterwards it will be spooled to a temp file
+DEFAULT_MAX_MEMORY_SIZE = 8 * 1024 * 1024
+
+# size of the chunks the data will be read in
+CHUNK_SIZE = 256 * 1024
+
+class ResultSink(object, CustomResultObjInterface):
+    '''
+    File-like custom result object for scripts producing big text output (e.g. decompiled code).
+
+    Writing is linear in the size of the data (unlike concatenating a str with `+=`)
+    and the memory usage is bounded, because the data is spooled to a temporary file
+    once it exceeds `max_memory_size`.
+    The storages stream the data from the sink (see :py:meth:`.get_stream`)
+    instead of building one big string.
+
+    A pickled sink which has been spooled to disk refers to a copy of its temporary file,
+    so it can only be unpickled once and on the same host (e.g. by the parent of the process).
+
+    Examples
+    --------
+    >>> def custom_result_object(self):
+    ...     return (ResultSink(), "java")
+    ...
+    >>> self.cres.write(source_code)
+    '''
+
+    def __init__(self, max_memory_size = DEFAULT_MAX_MEMORY_SIZE):
+        '''
+        Parameters
+        ----------
+        max_memory_size : int, optional (default is `DEFAULT_MAX_MEMORY_SIZE`)
+            Number of bytes kept in memory before the data is spooled to a temporary file.
+        '''
+        self.__max_memory_size = max_memory_size
+        self.__file = SpooledTemporaryFile(max_size = max_memory_size)
+
+    def __str__(self):
+        return self.get_custom_result_obj_repr()
+
+    def __repr__(self):
+        return '%s(%d bytes)' % (self.__class__.__name__, self.size)
+
+    def __iadd__(self, data):
+        ''' Compatibility with scripts which concatenate their `cres` str '''
+        self.write(data)
+        return self
+
+    def __getstate__(self):
+        # the temporary file cannot be pickled (fork after parse),
+        # so pass the data if still in memory and the path of a copy of the file otherwise
+        state = {"max_memory_size" : self.__max_memory_size}
+        if self.size <= self.__max_memory_size:
+            state["data"] = self.get_custom_result_obj_repr()
+        else:
+            with NamedTemporaryFile(prefix = "androlyze_sink_", delete = False) as f:
+                shutil.copyfileobj(self.get_stream(), f, CHUNK_SIZE)
+            state["path"] = f.name
+        return state
+
+    def __setstate__(self, state):
+        self.__init__(state["max_memory_size"])
+        path = state.get("path")
+        if path is not None:
+            # take over the copy, it will be removed when closed
+            self.__file.close()
+            self.__file = open(path, "r+b")
+            os.remove(path)
+        else:
+            self.write(state["data"])
+
+    def get_size(self):
+        self.__file.seek(0, 2)
+        return self.__file.tell()
+
+    def get_max_memory_size(self):
+        return self.__max_memory_size
+
+    size = property(get_size, None, None, "int : Number of bytes written.")
+    max_memory_size = property(get_max_memory_size, None, None, "int : Number of bytes kept in memory before the data is spooled to a temporary file.")
+
+    def write(self, data):
+        ''' Append the `data` (unicode will be utf-8 encoded) '''
+        if isinstance(data, unicode):
+            data = data.encode("utf-8")
+        # we may have been read in between
+        self.__file.seek(0, 2)
+        self.__file.write(data)
+
+    def writelines(self, lines):
+        ''' Append the `lines` '''
+        for line in lines:
+            self.write(line)
+
+    def get_stream(self):
+        ''' Get a file-like object to read the data from the beginning.
+
+        Only valid until the next `write`.
+
+        Returns
+        -------
+        file-like object
+        '''
+        self.__file.flush()
+        self.__file.seek(0)
+        return self.__file
+
+    def iter_chunks(self, chunk_size = CHUNK_SIZE):
+        ''' Iterate over the data in chunks of `chunk_size` bytes '''
+        stream = self.get_stream()
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    def close(self):
+        ''' Close the sink and remove the temporary file '''
+        self.__file.close()
+
+    ############################################################
+    #---CustomResultObjInterface
+    ############################################################
+
+    def get_custom_result_obj_repr(self):
+        ''' Read the whole data into memory. Prefer :py:meth:`.get_stream` for storing it! '''
+        return self.get_stream().read()
+
+def is_result_sink(obj):
+    ''' Check if `obj` is a `ResultSink` '''
+    return isinstance(obj, ResultSink)
@@ -10,6 +10,9 @@ from androlyze.model.script.AndroScript import AndroScript
 from androlyze.model.script.dblyze.DBLyze import DBLyze
 from pprint import pprint
 
+#categories
+CAT_FILES = "files"
+
 class ScriptTemplate(AndroScript):
     ''' Template for writing a custom `AndroScript` '''
 
@@ -33,16 +36,23 @@ class ScriptTemplate(AndroScript):
         '''
         # TODO: CUSTOMIZE
 
-        #categories
-        CAT_FILES = "files"
-
         res = self.res
 
-        res.register_keys([CAT_FILES])
-
         # files
         res.log(CAT_FILES, apk.get_files())
 
+    def register_result_keys(self, res):
+        '''
+        Overwrite this method to register the static structure of your results.
+        It is only called once per script class and copied into `self.res` for every apk.
+
+        Parameters
+        ----------
+        res : ResultObject
+        '''
+        # TODO: CUSTOMIZE
+        res.register_keys([CAT_FILES])
+
     def custom_result_object(self):
         '''
         Overwrite this method, if you want to use your own result logging framework/object,
@@ -99,6 +109,10 @@ class ScriptTemplate(AndroScript):
         ''' Create data references '''
         return False
 
+    def needs_decompiler(self):
+        ''' Set up the decompiler, e.g. for `ClassDefItem.get_source()` '''
+        return False
+
     ############################################################
     #---Options
     ############################################################
@@ -117,6 +131,14 @@ class ScriptTemplate(AndroScript):
         '''
         return False
 
+    def is_dex_only(self):
+        ''' Return true, if the result only depends on the .dex files (not on the manifest etc.) '''
+        return False
+
+    def needed_facts(self):
+        ''' Return the names of the facts (see `ApkFacts`) you use via kwargs["facts"] '''
+        return ()
+
 class Eval(DBLyze):
 
     # Evaluate ScripTemplate
@@ -5,6 +5,7 @@ __author__ = "Nils Tobias Schmidt"
 __email__ = "schmidt89 at informatik.uni-marburg.de"
 
 import sys
+from collections import OrderedDict
 from datetime import datetime
 import importlib
 import json
@@ -142,21 +143,23 @@ def get_minimum_script_options(androscripts):
     -------
     tuple<bool>
     '''
-    needs_xref, needs_dref, dalvik_vm_format, vm_analysis, gvm_analysis = 5 * [False]
+    needs_xref, needs_dref, dalvik_vm_format, vm_analysis, gvm_analysis, needs_decompiler = 6 * [False]
     for ascript in androscripts:
         if ascript.needs_xref(): needs_xref = True
         if ascript.needs_dref(): needs_dref = True
         if ascript.needs_dalvik_vm_format(): dalvik_vm_format = True
         if ascript.needs_vmanalysis(): vm_analysis = True
         if ascript.needs_gvmanalysis(): gvm_analysis = True
+        if ascript.needs_decompiler(): needs_decompiler = True
 
-    if gvm_analysis:
+    # the decompiler uses the `VMAnalysis`
+    if gvm_analysis or needs_decompiler:
         vm_analysis = True
 
     if vm_analysis:
         dalvik_vm_format = True
 
-    return dalvik_vm_format, vm_analysis, gvm_analysis, needs_xref, needs_dref
+    return dalvik_vm_format, vm_analysis, gvm_analysis, needs_xref, needs_dref, needs_decompiler
 
 def androscript_options_descr(androscripts):
     '''
@@ -170,14 +173,135 @@ def androscript_options_descr(androscripts):
     -------
     tuple<bool>
     '''
-    dalvik_vm_format, vm_analysis, gvm_analysis, needs_xref, needs_dref = get_minimum_script_options(androscripts)
+    dalvik_vm_format, vm_analysis, gvm_analysis, needs_xref, needs_dref, needs_decompiler = get_minimum_script_options(androscripts)
     return '''Minimum script needs:
 DalvikVMFormat: %s
 VMAnalysis: %s
 GVMAnalysis: %s
 Create xref: %s
 Create dref: %s
-    ''' % (dalvik_vm_format, vm_analysis, gvm_analysis, needs_xref, needs_dref)
+Decompiler: %s
+    ''' % (dalvik_vm_format, vm_analysis, gvm_analysis, needs_xref, needs_dref, needs_decompiler)
+
+############################################################
+#---Script dependencies
+############################################################
+
+def get_dependency_names(androscript):
+    ''' Get the names of the scripts the `androscript` depends on.
+    See :py:meth:`.AndroScript.depends_on`
+
+    Returns
+    -------
+    list<str>
+    '''
+    return [dep if isinstance(dep, basestring) else dep.__name__ for dep in androscript.depends_on()]
+
+def sort_by_dependencies(androscripts):
+    ''' Sort the `androscripts` topologically, so that each script comes after the scripts it depends on.
+    Otherwise the order is kept. Dependencies not in `androscripts` are ignored.
+
+    Parameters
+    ----------
+    androscripts : list<AndroScript>
+
+    Returns
+    -------
+    list<AndroScript>
+
+    Raises
+    ------
+    AndroScriptError
+        If the dependencies are cyclic.
+    '''
+    from androlyze.analyze.exception import AndroScriptError
+
+    names = set(s.name for s in androscripts)
+    # script -> names of the scripts it still waits for
+    waiting = [(s, set(dep for dep in get_dependency_names(s) if dep in names)) for s in androscripts]
+
+    res = []
+    while waiting:
+        ready = [s for s, deps in waiting if not deps]
+        if not ready:
+            cycle = [s.name for s, _ in waiting]
+            raise AndroScriptError(waiting[0][0], additional_text = " Cyclic dependencies between: %s" % ', '.join(cycle))
+
+        # run the first ready script (keeps the order)
+        script = ready[0]
+        res.append(script)
+        waiting = [(s, deps - set([script.name])) for s, deps in waiting if s is not script]
+
+    return res
+
+def check_dependencies(androscripts):
+    ''' Check that all dependencies of the `androscripts` are part of them and not cyclic.
+
+    Raises
+    ------
+    AndroScriptError
+    '''
+    from androlyze.analyze.exception import AndroScriptError
+
+    names = set(s.name for s in androscripts)
+    for s in androscripts:
+        missing = [dep for dep in get_dependency_names(s) if dep not in names]
+        if missing:
+            raise AndroScriptError(s, additional_text = " Depends on the scripts %s which are not loaded!" % ', '.join(missing))
+
+    sort_by_dependencies(androscripts)
+
+def add_dependencies(script_names, androscripts):
+    ''' Add the names of the scripts the scripts with `script_names` depend on (transitively).
+
+    Parameters
+    ----------
+    script_names : iterable<str>
+    androscripts : list<AndroScript>
+        All scripts.
+
+    Returns
+    -------
+    list<str>
+        `script_names` followed by the added dependencies.
+    '''
+    deps_by_name = dict((s.name, get_dependency_names(s)) for s in androscripts)
+
+    res = list(script_names)
+    todo = list(res)
+    while todo:
+        for dep in deps_by_name.get(todo.pop(), ()):
+            if dep not in res:
+                res.append(dep)
+                todo.append(dep)
+    return res
+
+def group_by_dependencies(androscripts):
+    ''' Group the `androscripts` so that scripts depending on each other (directly or transitively) are in the same group.
+
+    Returns
+    -------
+    list<list<AndroScript>>
+        The groups (order of `androscripts` kept inside a group).
+    '''
+    names = [s.name for s in androscripts]
+    # union find over the script positions
+    parent = range(len(androscripts))
+
+    def find(idx):
+        while parent[idx] != idx:
+            idx = parent[idx]
+        return idx
+
+    for idx, s in enumerate(androscripts):
+        for dep in get_dependency_names(s):
+            if dep in names:
+                parent[find(idx)] = find(names.index(dep))
+
+    groups = OrderedDict()
+    for idx, s in enumerate(androscripts):
+        groups.setdefault(find(idx), []).append(s)
+    return groups.values()
 
 def chained_script(androscripts, root_categories = (), name = None,
                    log_chained_script_meta_infos = False, continue_on_script_failure = True,
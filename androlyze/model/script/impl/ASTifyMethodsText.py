@@ -8,41 +8,42 @@ from pprint import pformat
 
 from androlyze.log.Log import log
 from androlyze.model.script.AndroScript import AndroScript
+from androlyze.model.script.ResultSink import ResultSink
 from androlyze.model.script.util import AnaUtil
 
 
 class ASTifyMethodsText(AndroScript):
     ''' Get the AST (abstract syntax tree) for each method. '''
     
-    VERSION = "0.3"
+    VERSION = "0.4"
     
     def _analyze(self, apk, dalvik_vm_format, vm_analysis, gvm_analysis, *args, **kwargs):    
         
         # CFG
         for encoded_method in dalvik_vm_format.get_methods():
             try:
-                method_analysis = vm_analysis.get_method(encoded_method)
-            
-                if encoded_method.get_code() == None:
-                    continue
-                
                 classname = encoded_method.get_class_name()
                 
-                # skip android classes due to mongo db document limit
-                if classname.find("Landroid") != -1:
+                # skip library classes (e.g. android framework) due to mongo db document limit
+                if self.is_library_class(classname):
                     continue
                 
+                if encoded_method.get_code() == None:
+                    continue
+                
+                method_analysis = vm_analysis.get_method(encoded_method)
+                
                 ast = None
                 if method_analysis is not None:
                     ast = AnaUtil.ast_for_method_analysis(method_analysis)
                 
                 if ast is not None:    
-                    self.cres += '%s\n\n' % pformat(ast)
+                    self.cres.write('%s\n\n' % pformat(ast))
             except Exception as e:
                 log.exception(e)
 
     def custom_result_object(self):
-        return ("", "json")
+        return (ResultSink(), "json")
 
     ############################################################
     #---Options
@@ -53,3 +54,6 @@ class ASTifyMethodsText(AndroScript):
     
     def needs_vmanalysis(self):
         return True
+
+    def is_dex_only(self):
+        return True
@@ -4,9 +4,9 @@
 __author__ = "Nils Tobias Schmidt"
 __email__ = "schmidt89 at informatik.uni-marburg.de"
 
+from androlyze.analyze.ApkFacts import FACT_COMPONENTS, FACT_INTENT_FILTERS, \
+    FACT_MAIN_ACTIVITY, FACT_PERMISSIONS, FACT_LIBRARIES, FACT_FILES
 from androlyze.model.script.AndroScript import AndroScript
-from androlyze.model.script.impl.manifest.components import get_components_cache,\
-    component_key_2_intent_key
 
 #categories
 CAT_APK_INFO = "apkinfo"
@@ -31,10 +31,8 @@ class ApkInfo(AndroScript):
     
     VERSION = "0.1"
     
-    def _register_static_structure(self):
+    def register_result_keys(self, res):
         ''' Register the static structure '''
-        res = self.res
-
         # register basic structure
         res.register_keys([CAT_ACTIVITIES_LISTING, CAT_ACTIVITIES_MAIN], CAT_APK_INFO, CAT_COMPONENTS, CAT_ACTIVITIES)
         
@@ -48,24 +46,22 @@ class ApkInfo(AndroScript):
         
     def _analyze(self, apk, dalvik_vm_format, vm_analysis, gvm_analysis, *args, **kwargs):    
         res = self.res
-        
-        # register static structure
-        self._register_static_structure()
+        facts = kwargs["facts"]
         
         # libs
-        res.log(CAT_LIBS, apk.get_libraries(), CAT_APK_INFO)
+        res.log(CAT_LIBS, facts[FACT_LIBRARIES], CAT_APK_INFO)
         
         # files
-        res.log(CAT_FILES, apk.get_files(), CAT_APK_INFO)
+        res.log(CAT_FILES, facts[FACT_FILES], CAT_APK_INFO)
 
         # permissions
-        res.log(CAT_PERMISSIONS, sorted(apk.get_permissions()), CAT_APK_INFO)
+        res.log(CAT_PERMISSIONS, sorted(facts[FACT_PERMISSIONS]), CAT_APK_INFO)
             
-        components_cache = get_components_cache(apk)
+        components_cache = facts[FACT_COMPONENTS]
         
         # activities        
         res.log(CAT_ACTIVITIES_LISTING, sorted(components_cache[CAT_ACTIVITIES]), CAT_APK_INFO, CAT_COMPONENTS, CAT_ACTIVITIES)
-        res.log(CAT_ACTIVITIES_MAIN, apk.get_main_activity(), CAT_APK_INFO, CAT_COMPONENTS, CAT_ACTIVITIES)
+        res.log(CAT_ACTIVITIES_MAIN, facts[FACT_MAIN_ACTIVITY], CAT_APK_INFO, CAT_COMPONENTS, CAT_ACTIVITIES)
         
         # services
         res.log(CAT_SERVICES, components_cache[CAT_SERVICES], CAT_APK_INFO, CAT_COMPONENTS)
@@ -77,19 +73,14 @@ class ApkInfo(AndroScript):
         res.log(CAT_PROVIDERS, components_cache[CAT_PROVIDERS], CAT_APK_INFO, CAT_COMPONENTS)
         
         # intents
-        for k, package_names in components_cache.items():
-            intents = {}
-            for package_name in package_names:
-                # get intent filter for activity, service or receiver
-                intent_key = component_key_2_intent_key(k)
-                package_intents = apk.get_intent_filters(intent_key, package_name) 
-                if package_intents:
-                    intents[package_name] = package_intents
-                
+        for k, intents in facts[FACT_INTENT_FILTERS].items():
             # we can also register the keys later for dynamic structures
             CAT = (CAT_APK_INFO, CAT_COMPONENTS, CAT_INTENTS)
             res.register_keys([k], *CAT)
             
             res.log(k, intents, *CAT)
 
+    def needed_facts(self):
+        return (FACT_COMPONENTS, FACT_INTENT_FILTERS, FACT_MAIN_ACTIVITY, FACT_PERMISSIONS, FACT_LIBRARIES, FACT_FILES)
+
 
@@ -4,7 +4,10 @@
 __author__ = "Nils Tobias Schmidt"
 __email__ = "schmidt89 at informatik.uni-marburg.de"
 
+from collections import OrderedDict
+
 from androlyze.model.script.AndroScript import AndroScript
+from androlyze.model.script.impl.ClassListing import ClassListing
 
 # categories
 CAT_CLASS_DETAILS = "class details"
@@ -16,25 +19,26 @@ class ClassDetails(AndroScript):
 
     VERSION = "0.1"
 
+    def register_result_keys(self, res):
+        res.register_keys([CAT_CLASS_DETAILS])
+
     def _analyze(self, apk, dalvik_vm_format, vm_analysis, gvm_analysis, *args, **kwargs):
         res = self.res
 
-        # dvm stuff
         # list<ClassDefItem>
-        classes = dalvik_vm_format.get_classes()
+        classes = kwargs["dependencies"][ClassListing.__name__].output
 
-        # run over classes
+        # build the (dynamic) structure for all classes and log it at once
+        # instead of registering and logging the keys of every class
+        class_details = OrderedDict()
         for c in classes:
-            ROOT_CAT = (CAT_CLASS_DETAILS, c.name)
-            res.register_keys([CAT_METHODS, CAT_FIELDS], *ROOT_CAT)
-
-            # list<EncodedMethod>
-            methods = c.get_methods()
-            res.log(CAT_METHODS, [mn.name for mn in methods], *ROOT_CAT)
+            # list<EncodedMethod>, list<EncodedField>
+            class_details[c.name] = OrderedDict([
+                (CAT_METHODS, [mn.name for mn in c.get_methods()]),
+                (CAT_FIELDS, [fn.name for fn in c.get_fields()])
+            ])
 
-            # list<EncodedField>
-            fields = c.get_fields()
-            res.log(CAT_FIELDS, [fn.name for fn in fields], *ROOT_CAT)
+        res.log(CAT_CLASS_DETAILS, class_details)
 
     ############################################################
     #---Options
@@ -43,6 +47,12 @@ class ClassDetails(AndroScript):
     def needs_dalvik_vm_format(self):
         return True
 
+    def is_dex_only(self):
+        return True
+
+    def depends_on(self):
+        return (ClassListing, )
+
 if __name__ == '__main__':
     for res in AndroScript.test(ClassDetails, ["../../../../testenv/apks/a2dp.Vol.apk"]):
         print res
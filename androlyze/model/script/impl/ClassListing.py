@@ -9,23 +9,26 @@ from androlyze.model.script.AndroScript import AndroScript
 CAT_CLASSES = "classes"        
 
 class ClassListing(AndroScript):
-    ''' List all classes from the dex file '''
+    ''' List all classes from the dex file.
+    The classes (list<ClassDefItem>) are passed to the scripts depending on this one via `output`. '''
     
     VERSION = "0.1"
     
+    def register_result_keys(self, res):
+        res.register_keys([CAT_CLASSES])
+
     def _analyze(self, apk, dalvik_vm_format, vm_analysis, gvm_analysis, *args, **kwargs):
         
         res = self.res
         
-        # dvm stuff
-        res.register_keys([CAT_CLASSES])
-        
         # dvm stuff
         # list<ClassDefItem>
         classes = dalvik_vm_format.get_classes()
         
         # class listing
         res.log(CAT_CLASSES, [c.name for c in classes])
+
+        self.output = classes
         
     ############################################################
     #---Options
@@ -33,3 +36,6 @@ class ClassListing(AndroScript):
     
     def needs_dalvik_vm_format(self):
         return True
+
+    def is_dex_only(self):
+        return True
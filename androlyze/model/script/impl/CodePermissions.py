@@ -6,6 +6,7 @@ __email__ = "schmidt89 at informatik.uni-marburg.de"
 
 from androguard.decompiler.dad import decompile
 from androlyze.model.script.AndroScript import AndroScript
+from androlyze.model.script.util import AnaUtil
 from androguard.core.analysis.analysis import PathP
 
 # categories
@@ -24,12 +25,12 @@ class CodePermissions(AndroScript):
 
     VERSION = "0.1"
 
+    def register_result_keys(self, res):
+        res.register_keys([CAT_PERMISSIONS])
+
     def _analyze(self, apk, dalvik_vm_format, vm_analysis, gvm_analysis, *args, **kwargs):
         res = self.res
 
-        res.register_keys([CAT_PERMISSIONS])
-
-        class_manager = dalvik_vm_format.get_class_manager()
         perm_dict = vm_analysis.get_permissions([])
 
         # register list for each used permissions keys
@@ -39,6 +40,10 @@ class CodePermissions(AndroScript):
         # register each permission only once!
         res.register_enum_keys(permissions, CAT_PERMISSIONS, PERMISSIONS_CODE)
 
+        # resolve the log entries of the permissions only once
+        listing_handles = dict((p, res.get_handle(p, CAT_PERMISSIONS, PERMISSIONS_LISTING)) for p in permissions)
+        code_handles = dict((p, res.get_handle(p, CAT_PERMISSIONS, PERMISSIONS_CODE)) for p in permissions)
+
         # use set to remove duplicates!
         method_names = set()
         method_analysis_objs = set()
@@ -47,9 +52,12 @@ class CodePermissions(AndroScript):
             # list<PathP>
             for pathp in pathp_obj_list:
                 if isinstance(pathp, PathP):
+                    # the .dex file the pathp belongs to (multidex)
+                    dex_part = AnaUtil.get_dex_part(dalvik_vm_format, pathp)
+
                     # type: androguard.core.bytecodes.dvm.MethodIdItem
                     # the method that uses the permission
-                    src_method = class_manager.get_method_ref(pathp.src_idx)
+                    src_method = dex_part.get_class_manager().get_method_ref(pathp.src_idx)
                     method_name = full_method_name(src_method)
                     method_names.add((permission_name, method_name))
 
@@ -57,7 +65,7 @@ class CodePermissions(AndroScript):
                     #dst_method = class_manager.get_method_ref(pathp.dst_idx)
 
                     # get androguard.core.bytecodes.dvm.EncodedMethod
-                    encoded_method = dalvik_vm_format.get_method(src_method.get_name())[0]
+                    encoded_method = dex_part.get_method(src_method.get_name())[0]
 
                     # get androguard.core.analysis.analysis.MethodAnalysis
                     method_analysis = vm_analysis.get_method(encoded_method)
@@ -66,7 +74,7 @@ class CodePermissions(AndroScript):
 
         for permission_name, method_name in method_names:
             # log which classes use which permissions
-            res.log_append_to_enum(permission_name, method_name, CAT_PERMISSIONS, PERMISSIONS_LISTING)
+            listing_handles[permission_name].log_append_to_enum(method_name)
 
         for permission_name, method_name, method_analysis in method_analysis_objs:
 
@@ -77,7 +85,7 @@ class CodePermissions(AndroScript):
 
             # decompile these methods too!
             log_val = {method_name : source_code.split("\n")[1:-1]}
-            res.log_append_to_enum(permission_name, log_val, CAT_PERMISSIONS, PERMISSIONS_CODE)
+            code_handles[permission_name].log_append_to_enum(log_val)
 
     def needs_dalvik_vm_format(self):
         return True
@@ -85,6 +93,9 @@ class CodePermissions(AndroScript):
     def needs_vmanalysis(self):
         return True
 
+    def is_dex_only(self):
+        return True
+
 if __name__ == '__main__':
     for res in AndroScript.test(CodePermissions, ["../../../../testenv/apks/a2dp.Vol.apk"]):
         print res
@@ -14,7 +14,7 @@ CAT_DECOMPILE = "decompiled_classes"
 class DecompileClasses(AndroScript):
     ''' Get the source code from the apk for each class. '''
     
-    VERSION = "0.2"
+    VERSION = "0.3"
     
     def _analyze(self, apk, dalvik_vm_format, vm_analysis, gvm_analysis, *args, **kwargs):
         ''' This sample code is taken from `androguard` and has been modified!
@@ -30,8 +30,8 @@ class DecompileClasses(AndroScript):
         for clazz in dalvik_vm_format.get_classes():
             try:
                 key = clazz.get_name() 
-                # skip android classes due to mongo db document limit
-                if key.find("Landroid") != -1:
+                # skip library classes (e.g. android framework) due to mongo db document limit
+                if self.is_library_class(key):
                     continue
                 # allows querying for package name
                 res.register_keys([key], CAT_DECOMPILE)
@@ -48,3 +48,9 @@ class DecompileClasses(AndroScript):
     
     def needs_vmanalysis(self):
         return True
+
+    def needs_decompiler(self):
+        return True
+
+    def is_dex_only(self):
+        return True
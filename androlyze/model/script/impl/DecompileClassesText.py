@@ -5,6 +5,7 @@ __author__ = "Nils Tobias Schmidt"
 __email__ = "schmidt89 at informatik.uni-marburg.de"
 
 from androlyze.model.script.AndroScript import AndroScript
+from androlyze.model.script.ResultSink import ResultSink
 from androlyze.log.Log import log
 
 CAT_DECOMPILE = "decompiled_classes"
@@ -12,7 +13,7 @@ CAT_DECOMPILE = "decompiled_classes"
 class DecompileClassesText(AndroScript):
     ''' Get the source code from the apk for each class. '''
     
-    VERSION = "0.1"
+    VERSION = "0.2"
     
     def _analyze(self, apk, dalvik_vm_format, vm_analysis, gvm_analysis, *args, **kwargs):
         ''' This sample code is taken from `androguard` and has been modified!
@@ -30,15 +31,15 @@ class DecompileClassesText(AndroScript):
         for clazz in dalvik_vm_format.get_classes():
             try:
                 key = clazz.get_name() 
-                # skip android classes
-                if key.find("Landroid") != -1:
+                # skip library classes (e.g. android framework)
+                if self.is_library_class(key):
                     continue
-                self.cres += clazz.get_source()
+                self.cres.write(clazz.get_source())
             except Exception as e:
                 log.exception(e)
 
     def custom_result_object(self):
-        return ("", "java")
+        return (ResultSink(), "java")
 
     ############################################################
     #---Options
@@ -49,3 +50,9 @@ class DecompileClassesText(AndroScript):
     
     def needs_vmanalysis(self):
         return True
+
+    def needs_decompiler(self):
+        return True
+
+    def is_dex_only(self):
+        return True
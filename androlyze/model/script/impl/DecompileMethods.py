@@ -12,7 +12,7 @@ CAT_DECOMPILE = "decompiled_methods"
 class DecompileMethods(AndroScript):
     ''' Get the source code from the apk for each method. '''
 
-    VERSION = "0.1"
+    VERSION = "0.2"
 
     def _analyze(self, apk, dalvik_vm_format, vm_analysis, gvm_analysis, *args, **kwargs):
         ''' This sample code is taken from `androguard` and has been modified!
@@ -28,16 +28,16 @@ class DecompileMethods(AndroScript):
 
         # CFG
         for method in dalvik_vm_format.get_methods():
-            mx = vm_analysis.get_method(method)
+            classname = method.get_class_name()
 
-            if method.get_code() == None:
+            # skip library classes (e.g. android framework) before analyzing their methods
+            if self.is_library_class(classname) or method.get_code() == None:
                 continue
+
+            mx = vm_analysis.get_method(method)
             try:
-                classname, methodname, method_descriptor = method.get_class_name(), method.get_name(), method.get_descriptor()
-                
-                # skip android classes
-                if classname.find("Landroid") != -1:
-                    continue
+                methodname, method_descriptor = method.get_name(), method.get_descriptor()
+
                 CAT = (CAT_DECOMPILE, classname, methodname)
                 res.register_keys([method_descriptor], *CAT)
     
@@ -47,7 +47,7 @@ class DecompileMethods(AndroScript):
     
                 # get the source !
                 res.log(method_descriptor, ms.get_source().split("\n"), *CAT)
-            except:
+            except Exception:
                 pass
             
     ############################################################
@@ -59,3 +59,6 @@ class DecompileMethods(AndroScript):
 
     def needs_vmanalysis(self):
         return True
+
+    def is_dex_only(self):
+        return True
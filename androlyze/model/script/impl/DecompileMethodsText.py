@@ -6,42 +6,44 @@ __email__ = "schmidt89 at informatik.uni-marburg.de"
 
 from androguard.decompiler.dad import decompile
 from androlyze.model.script.AndroScript import AndroScript
+from androlyze.model.script.ResultSink import ResultSink
 
 class DecompileMethodsText(AndroScript):
     ''' Get the source code from the apk for each method. '''
     
-    VERSION = "0.1"
+    VERSION = "0.2"
     
     def _analyze(self, apk, dalvik_vm_format, vm_analysis, gvm_analysis, *args, **kwargs):    
         
         # CFG
         for method in dalvik_vm_format.get_methods():
             try:
-                mx = vm_analysis.get_method(method)
-            
-                if method.get_code() == None:
-                    continue
+                classname = method.get_class_name()
                 
-                classname, methodname, method_descriptor = method.get_class_name(), method.get_name(), method.get_descriptor()
+                # skip library classes (e.g. android framework) due to mongo db document limit
+                if self.is_library_class(classname):
+                    continue
                 
-                    # skip android classes due to mongo db document limit
-                if classname.find("Landroid") != -1:
+                if method.get_code() == None:
                     continue
                 
+                mx = vm_analysis.get_method(method)
+                methodname, method_descriptor = method.get_name(), method.get_descriptor()
+                
                 ms = decompile.DvMethod(mx)
                 # process to the decompilation
                 ms.process()
                 
-                self.cres += '''%s.%s%s {
+                self.cres.write('''%s.%s%s {
     %s
     }
-''' % (classname, methodname, method_descriptor, ms.get_source())
-            except:
+''' % (classname, methodname, method_descriptor, ms.get_source()))
+            except Exception:
                 pass
 
         
     def custom_result_object(self):
-        return ("", "java")
+        return (ResultSink(), "java")
 
     ############################################################
     #---Options
@@ -52,3 +54,6 @@ class DecompileMethodsText(AndroScript):
     
     def needs_vmanalysis(self):
         return True
+
+    def is_dex_only(self):
+        return True
@@ -4,9 +4,8 @@
 __author__ = "Lars Baumgärtner, Nils Schmidt"
 __email__ = "{lbaumgaerner,schmidt89} at informatik.uni-marburg.de"
 
-from androlyze import is_dyn_code, is_native_code
-
 from androlyze.model.script.AndroScript import AndroScript
+from androlyze.model.script.util import AnaUtil
 
 CAT_SSL = "SSL"
 CAT_CODE_LOADING = "code loading"
@@ -55,15 +54,13 @@ class SSL(AndroScript):
             Only available if `needs_vmanalysis` returns True.
         gvm_analysis : GVMAnalysis
         '''
-        res = self.res
+        # do checks
+        self.do_usage_checks(vm_analysis)
 
-        # register key
+    def register_result_keys(self, res):
         res.register_bool_keys([CODE_LOADING_DYN, CODE_LOADING_NATIVE], CAT_CODE_LOADING)
         res.register_bool_keys(map(lambda t: t[1].lower(), self.CHECKS), CAT_SSL)
 
-        # do checks
-        self.do_usage_checks(vm_analysis)
-
     def do_usage_checks(self, dx):
         res = self.res
 
@@ -71,16 +68,20 @@ class SSL(AndroScript):
             ''' convenience function for logging '''
             res.log_true(key, CAT_SSL)
 
+        # scan the referenced classes only once for all checks
+        api_index = AnaUtil.ApiSearchIndex(dx)
+
         # run ssl checks
+        found = api_index.search_packages_many(check_val for check_val, _ in self.CHECKS)
         for check_val, check_name in self.CHECKS:
-            if dx.tainted_packages.search_packages(check_val) != []:
+            if found[check_val] != []:
                 # log
                 log(check_name.lower())
 
-        if is_dyn_code(dx):
+        if AnaUtil.is_dyn_code(api_index):
             res.log_true(CODE_LOADING_DYN, CAT_CODE_LOADING)
 
-        if is_native_code(dx):
+        if AnaUtil.is_native_code(api_index):
             res.log_true(CODE_LOADING_NATIVE, CAT_CODE_LOADING)
 
         return res
@@ -93,6 +94,9 @@ class SSL(AndroScript):
         ''' Create cross references '''
         return True
 
+    def is_dex_only(self):
+        return True
+
 def get_DynCode(dx):
     return dx.tainted_packages.search_packages( "Ldalvik/system/DexClassLoader")
 
@@ -4,6 +4,7 @@
 __author__ = "Nils Tobias Schmidt"
 __email__ = "schmidt89 at informatik.uni-marburg.de"
 
+from androlyze.analyze.ApkFacts import FACT_FILES
 from androlyze.model.script.AndroScript import AndroScript
 
 
@@ -22,4 +23,7 @@ class Files(AndroScript):
         res.register_keys([CAT_FILES])
         
         # files
-        res.log(CAT_FILES, apk.get_files())
+        res.log(CAT_FILES, kwargs["facts"][FACT_FILES])
+
+    def needed_facts(self):
+        return (FACT_FILES, )
@@ -4,6 +4,7 @@
 __author__ = "Nils Tobias Schmidt"
 __email__ = "schmidt89 at informatik.uni-marburg.de"
 
+from androlyze.analyze.ApkFacts import FACT_LIBRARIES
 from androlyze.model.script.AndroScript import AndroScript
 
 
@@ -21,4 +22,7 @@ class Libs(AndroScript):
         
         # libs
         res.register_keys([CAT_LIBS])
-        res.log(CAT_LIBS, apk.get_libraries())
+        res.log(CAT_LIBS, kwargs["facts"][FACT_LIBRARIES])
+
+    def needed_facts(self):
+        return (FACT_LIBRARIES, )
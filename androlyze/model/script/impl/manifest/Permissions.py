@@ -4,6 +4,7 @@
 __author__ = "Nils Tobias Schmidt"
 __email__ = "schmidt89 at informatik.uni-marburg.de"
 
+from androlyze.analyze.ApkFacts import FACT_PERMISSIONS
 from androlyze.model.script.AndroScript import AndroScript
 
 
@@ -22,5 +23,8 @@ class Permissions(AndroScript):
         res.register_keys([CAT_PERMISSIONS])
         
         # permissions
-        res.log(CAT_PERMISSIONS, sorted(apk.get_permissions()))
+        res.log(CAT_PERMISSIONS, sorted(kwargs["facts"][FACT_PERMISSIONS]))
+
+    def needed_facts(self):
+        return (FACT_PERMISSIONS, )
             
\ No newline at end of file
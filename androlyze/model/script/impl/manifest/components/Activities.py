@@ -4,6 +4,7 @@
 __author__ = "Nils Tobias Schmidt"
 __email__ = "schmidt89 at informatik.uni-marburg.de"
 
+from androlyze.analyze.ApkFacts import FACT_ACTIVITIES, FACT_MAIN_ACTIVITY
 from androlyze.model.script.AndroScript import AndroScript
 
 #categories
@@ -16,13 +17,18 @@ class Activities(AndroScript):
     
     VERSION = "0.1"
     
+    def register_result_keys(self, res):
+        # register basic structure
+        res.register_keys([CAT_ACTIVITIES_LISTING, CAT_ACTIVITIES_MAIN], CAT_ACTIVITIES)
+
     def _analyze(self, apk, dalvik_vm_format, vm_analysis, gvm_analysis, *args, **kwargs):    
         
         res = self.res
-        
-        # register basic structure
-        res.register_keys([CAT_ACTIVITIES_LISTING, CAT_ACTIVITIES_MAIN], CAT_ACTIVITIES)
+        facts = kwargs["facts"]
         
         # activities        
-        res.log(CAT_ACTIVITIES_LISTING, sorted(apk.get_activities()), CAT_ACTIVITIES)
-        res.log(CAT_ACTIVITIES_MAIN, apk.get_main_activity(), CAT_ACTIVITIES)
+        res.log(CAT_ACTIVITIES_LISTING, sorted(facts[FACT_ACTIVITIES]), CAT_ACTIVITIES)
+        res.log(CAT_ACTIVITIES_MAIN, facts[FACT_MAIN_ACTIVITY], CAT_ACTIVITIES)
+
+    def needed_facts(self):
+        return (FACT_ACTIVITIES, FACT_MAIN_ACTIVITY)
@@ -4,6 +4,7 @@
 __author__ = "Nils Tobias Schmidt"
 __email__ = "schmidt89 at informatik.uni-marburg.de"
 
+from androlyze.analyze.ApkFacts import FACT_RECEIVERS
 from androlyze.model.script.AndroScript import AndroScript
 
 CAT_RECEIVERS = "broadcast receivers" 
@@ -20,4 +21,7 @@ class BroadcastReceivers(AndroScript):
         res.register_keys([CAT_RECEIVERS])
         
         # receivers
-        res.log(CAT_RECEIVERS, apk.get_receivers())
+        res.log(CAT_RECEIVERS, kwargs["facts"][FACT_RECEIVERS])
+
+    def needed_facts(self):
+        return (FACT_RECEIVERS, )
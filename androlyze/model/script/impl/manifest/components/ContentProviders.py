@@ -4,6 +4,7 @@
 __author__ = "Nils Tobias Schmidt"
 __email__ = "schmidt89 at informatik.uni-marburg.de"
 
+from androlyze.analyze.ApkFacts import FACT_PROVIDERS
 from androlyze.model.script.AndroScript import AndroScript
 
 CAT_PROVIDERS = "content providers" 
@@ -18,4 +19,7 @@ class ContentProviders(AndroScript):
         res = self.res
         
         res.register_keys([CAT_PROVIDERS])
-        res.log(CAT_PROVIDERS, apk.get_providers())
+        res.log(CAT_PROVIDERS, kwargs["facts"][FACT_PROVIDERS])
+
+    def needed_facts(self):
+        return (FACT_PROVIDERS, )
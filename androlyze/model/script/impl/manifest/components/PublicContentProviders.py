@@ -4,6 +4,7 @@
 __author__ = "Nils Tobias Schmidt"
 __email__ = "schmidt89 at informatik.uni-marburg.de"
 
+from androlyze.analyze.ApkFacts import FACT_PUBLIC_COMPONENTS, FACT_PROVIDERS
 from androlyze.model.script.AndroScript import AndroScript
 
 CAT = "public_content_providers"
@@ -13,7 +14,7 @@ class PublicContentProviders(AndroScript):
     
     VERSION = "0.1"
         
-    def register_structure(self, res):
+    def register_result_keys(self, res):
         # register keys
         res.register_enum_keys([CAT])
         
@@ -31,13 +32,16 @@ class PublicContentProviders(AndroScript):
         gvm_analysis : GVMAnalysis
         '''
 
-        res = self.res
-        self.register_structure(res)
+        public_content_providers = self.res.get_handle(CAT)
         
-        public_components = apk.get_manifest_public_components()
-        for cp in apk.get_providers():
+        facts = kwargs["facts"]
+        public_components = facts[FACT_PUBLIC_COMPONENTS]
+        for cp in facts[FACT_PROVIDERS]:
             if cp in public_components:
-                res.log_append_to_enum(CAT, cp)
+                public_content_providers.log_append_to_enum(cp)
+
+    def needed_facts(self):
+        return (FACT_PUBLIC_COMPONENTS, FACT_PROVIDERS)
             
 # testing code
 if __name__ == '__main__':
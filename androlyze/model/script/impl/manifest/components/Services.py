@@ -4,6 +4,7 @@
 __author__ = "Nils Tobias Schmidt"
 __email__ = "schmidt89 at informatik.uni-marburg.de"
 
+from androlyze.analyze.ApkFacts import FACT_SERVICES
 from androlyze.model.script.AndroScript import AndroScript
 
 #categories
@@ -21,4 +22,7 @@ class Services(AndroScript):
         res.register_keys([CAT_SERVICES])
 
         # services
-        res.log(CAT_SERVICES, apk.get_services())
+        res.log(CAT_SERVICES, kwargs["facts"][FACT_SERVICES])
+
+    def needed_facts(self):
+        return (FACT_SERVICES, )
@@ -5,11 +5,45 @@ __author__ = "Nils Tobias Schmidt"
 __email__ = "schmidt89 at informatik.uni-marburg.de"
 
 from androguard.decompiler.dad import decompile
+from collections import OrderedDict
 import re
 
+from androlyze.analyze.AnalysisContext import MergedAnalysisObject
 from androlyze.log.Log import log
+from androlyze.util.AhoCorasick import AhoCorasick
 
 
+############################################################
+#---Multidex
+############################################################
+
+def get_dex_part(dalvik_vm_format, obj):
+    ''' Get the `DalvikVMFormat` of the .dex file `obj` (e.g. a `PathP`) belongs to.
+    Index based lookups have to be done on it for multidex apps (see :py:class:`.MergedAnalysisObject`).
+
+    Raises
+    ------
+    ValueError
+        If the .dex file of `obj` is unknown.
+    '''
+    # also works for the lazy proxies
+    get_part_for = getattr(dalvik_vm_format, "get_part_for", None)
+    if get_part_for is None:
+        return dalvik_vm_format
+    return get_part_for(obj)
+
+def get_method_by_pathp(dalvik_vm_format, pathp, caller = True):
+    ''' Get the `EncodedMethod` of the src (`caller`) or dst of the `pathp` from the .dex file the `pathp` belongs to.
+
+    Returns
+    -------
+    androguard.core.bytecodes.dvm.EncodedMethod
+    None
+        N/A
+    '''
+    idx = pathp.src_idx if caller else pathp.dst_idx
+    return get_dex_part(dalvik_vm_format, pathp).get_method_by_idx(idx)
+
 ############################################################
 #---Checks
 ############################################################
@@ -40,6 +74,10 @@ def check_method_contains_string(enoded_method, regexp, lowercase = True, all_fi
     all_findings : bool, optional (default is False)
         If true, return a list of all match objects
     
+    See Also
+    --------
+    StringHits : Searches many patterns in all methods at once.
+
     Returns
     -------
     re match object
@@ -126,8 +164,7 @@ def decompile_pathp(pathp, dalvik_vm_format, vm_analysis, caller = True, show_cl
         return v7;
     }
     '''
-    idx = pathp.src_idx if caller else pathp.dst_idx
-    encoded_method = dalvik_vm_format.get_method_by_idx(idx)
+    encoded_method = get_method_by_pathp(dalvik_vm_format, pathp, caller)
     
     if encoded_method is not None:
         method_analysis = vm_analysis.get_method(encoded_method)
@@ -280,8 +317,7 @@ def disassemble_pathp(pathp, dalvik_vm_format, caller = True):
         
     See :py:method:`.disassemble_encoded_method`
     '''
-    idx = pathp.src_idx if caller else pathp.dst_idx
-    encoded_method = dalvik_vm_format.get_method_by_idx(idx)
+    encoded_method = get_method_by_pathp(dalvik_vm_format, pathp, caller)
     
     if encoded_method is not None:
         return disassemble_encoded_method(encoded_method)
@@ -310,7 +346,7 @@ def filter_own_implementations(apk, dalvik_vm_format, pathp_list):
     
     for pathp in pathp_list:
                  
-        encoded_method = dalvik_vm_format.get_method_by_idx(pathp.src_idx)
+        encoded_method = get_method_by_pathp(dalvik_vm_format, pathp)
         
         # package name separated with "."
         apk_pn = apk.package_name.lower()
@@ -322,6 +358,337 @@ def filter_own_implementations(apk, dalvik_vm_format, pathp_list):
     
     return pathp_list_check
 
+############################################################
+#---API search
+############################################################
+
+# method calls used to load code dynamically (class, method name regex, descriptor regex)
+DYN_CODE_METHODS = [
+                    ("Ldalvik/system/DexClassLoader;", "<init>", "."),
+                    ("Ljava/security/ClassLoader;", "defineClass", "."),
+                    ("Ljava/security/SecureClassLoader;", "defineClass", ".")
+                    ]
+
+# method calls used to load native code (class, method name regex, descriptor regex)
+NATIVE_CODE_METHODS = [
+                       ("Ljava/lang/System;", "load.", "."),
+                       ("Ljava/lang/Runtime;", "load.", ".")
+                       ]
+
+class ApiSearchIndex(object):
+    '''
+    Index over the classes referenced by the code of an apk (the tainted packages of the `VMAnalysis`).
+
+    Answers the lookups for many class name patterns with a single scan over the referenced classes
+    instead of one scan per pattern (like `TaintedPackages.search_packages` does).
+
+    Patterns are literal substrings of the class name in dalvik notation (e.g. "Ljava/net/Socket"),
+    not regular expressions.
+
+    Examples
+    --------
+    >>> index = ApiSearchIndex(vm_analysis)
+    >>> found = index.search_packages_many(["Ljava/net/Socket", "Ljavax/net/ssl/SSLSocket"])
+    >>> found["Ljava/net/Socket"]
+    [<PathP>, ...]
+    '''
+
+    def __init__(self, vm_analysis):
+        '''
+        Parameters
+        ----------
+        vm_analysis : VMAnalysis
+            Dex analyzer (may be merged for multidex).
+        '''
+        # class name -> list<TaintedPackage> (one per .dex file)
+        self.__packages = OrderedDict()
+
+        tainted_packages = vm_analysis.tainted_packages
+        if isinstance(tainted_packages, MergedAnalysisObject):
+            tainted_packages = tainted_packages.get_parts()
+        else:
+            tainted_packages = [tainted_packages]
+
+        for tp in tainted_packages:
+            for package, _ in tp.get_packages():
+                self.__packages.setdefault(package.get_name(), []).append(package)
+
+    def get_class_names(self):
+        ''' Get the names of all referenced classes '''
+        return self.__packages.keys()
+
+    def __search(self, patterns, get_paths):
+        ''' Find the classes matching the `patterns` in one pass
+        and collect the paths of them with `get_paths` (`TaintedPackage`, pattern -> list<PathP>) '''
+        automaton = AhoCorasick(patterns)
+        res = OrderedDict((pattern, []) for pattern in patterns)
+        for class_name, packages in self.__packages.iteritems():
+            for pattern in automaton.find_all(class_name):
+                for package in packages:
+                    res[pattern].extend(get_paths(package, pattern))
+        return res
+
+    def search_packages_many(self, patterns):
+        ''' Search the calls of all classes whose name contains one of the `patterns`.
+
+        Parameters
+        ----------
+        patterns : iterable<str>
+
+        Returns
+        -------
+        OrderedDict<str, list<PathP>>
+            Pattern to the calls.
+        '''
+        return self.__search(list(patterns), lambda package, _: package.get_methods())
+
+    def search_packages(self, pattern):
+        ''' Like `TaintedPackages.search_packages`, but `pattern` is literal.
+
+        Returns
+        -------
+        list<PathP>
+        '''
+        return self.search_packages_many([pattern])[pattern]
+
+    def search_methods_many(self, queries):
+        ''' Search the calls of methods for all `queries` in one pass.
+
+        Parameters
+        ----------
+        queries : iterable<tuple<str, str, str>>
+            Class name pattern (literal), method name and descriptor (regex like `TaintedPackages.search_methods`).
+
+        Returns
+        -------
+        OrderedDict<tuple<str, str, str>, list<PathP>>
+            Query to the calls.
+        '''
+        queries = list(queries)
+        # queries by class name pattern
+        class_queries = OrderedDict()
+        for query in queries:
+            class_queries.setdefault(query[0], []).append(query)
+
+        def get_paths(package, class_pattern):
+            return [(query, path) for query in class_queries[class_pattern] for path in package.search_method(*query[1:])]
+
+        res = OrderedDict((query, []) for query in queries)
+        for query_paths in self.__search(class_queries.keys(), get_paths).values():
+            for query, path in query_paths:
+                res[query].append(path)
+        return res
+
+    def uses_any_method(self, queries):
+        ''' Check if any of the methods described by the `queries` is called.
+        See :py:meth:`.search_methods_many` '''
+        return any(self.search_methods_many(queries).values())
+
+def is_dyn_code(api_index):
+    ''' Like androguards `is_dyn_code`, but with an `ApiSearchIndex` '''
+    return api_index.uses_any_method(DYN_CODE_METHODS)
+
+def is_native_code(api_index):
+    ''' Like androguards `is_native_code`, but with an `ApiSearchIndex` '''
+    return api_index.uses_any_method(NATIVE_CODE_METHODS)
+
+############################################################
+#---Multi-pattern search
+############################################################
+
+# key of the `StringHits` in the `AnalysisContext.memo`
+MEMO_STRING_HITS = "string hits"
+
+# kinds of patterns (a literal string and a regular expression may have the same text)
+PATTERN_STRING = "string"
+PATTERN_REGEXP = "regexp"
+
+class MultiPatternMatcher(object):
+    '''
+    Matches many literal strings and regular expressions against a text at once.
+
+    The literal strings are searched with one `AhoCorasick` automaton.
+    The regular expressions are combined into one alternation which is used as pre-filter,
+    only texts matching it will be checked against each regular expression.
+    So the regular expressions must not contain numbered backreferences.
+    '''
+
+    def __init__(self, strings = (), regexps = (), lowercase = True):
+        '''
+        Parameters
+        ----------
+        strings : iterable<str>, optional (default is ())
+            Literal strings.
+        regexps : iterable<str>, optional (default is ())
+            Regular expressions.
+        lowercase : bool, optional (default is True)
+            Convert the text (and the literal strings) to lowercase before matching.
+        '''
+        self.__strings = list(strings)
+        self.__regexps = list(regexps)
+        self.__lowercase = lowercase
+
+        # matched string -> given strings
+        self.__original_strings = {}
+        for string in self.__strings:
+            self.__original_strings.setdefault(string.lower() if lowercase else string, []).append(string)
+        self.__automaton = AhoCorasick(self.__original_strings.keys())
+
+        self.__compiled_regexps = [(regexp, re.compile(regexp)) for regexp in self.__regexps]
+        self.__any_regexp = None
+        if self.__regexps:
+            self.__any_regexp = re.compile('|'.join('(?:%s)' % regexp for regexp in self.__regexps))
+
+    def get_patterns(self):
+        return [(PATTERN_STRING, string) for string in self.__strings] + [(PATTERN_REGEXP, regexp) for regexp in self.__regexps]
+
+    patterns = property(get_patterns, None, None, "list<tuple<str, str>> : Kind (`PATTERN_STRING` or `PATTERN_REGEXP`) and text of the strings and regular expressions.")
+
+    def matches(self, text):
+        ''' Get the patterns matching the `text`.
+
+        Parameters
+        ----------
+        text : str
+
+        Returns
+        -------
+        set<tuple<str, str>>
+            Kind and text of the patterns. See `patterns`.
+        '''
+        if self.__lowercase:
+            text = text.lower()
+
+        res = set()
+        for string in self.__automaton.find_all(text):
+            res.update((PATTERN_STRING, original) for original in self.__original_strings[string])
+
+        if self.__any_regexp is not None and self.__any_regexp.search(text):
+            res.update((PATTERN_REGEXP, regexp) for regexp, compiled_regexp in self.__compiled_regexps if compiled_regexp.search(text))
+
+        return res
+
+class StringHits(object):
+    '''
+    Finds the methods (their instructions) and the strings of the string pool matching many patterns with one pass over the code.
+
+    The hits are kept for each pattern, so scanning again only costs a pass over the code if new patterns are requested.
+    Use :py:func:`.get_string_hits` to share the hits between the scripts for the same apk.
+
+    Examples
+    --------
+    >>> string_hits = get_string_hits(dalvik_vm_format, kwargs.get("analysis_context"))
+    >>> hits = string_hits.scan_methods(strings = ["password", "secret"], regexps = [r"https?://"])
+    >>> hits[(PATTERN_STRING, "password")]
+    [<EncodedMethod>, ...]
+    '''
+
+    def __init__(self, dalvik_vm_format):
+        '''
+        Parameters
+        ----------
+        dalvik_vm_format : DalvikVMFormat
+            Parsed .dex file(s).
+        '''
+        self.__dalvik_vm_format = dalvik_vm_format
+        # (kind, pattern, lowercase) -> hits
+        self.__method_hits = {}
+        self.__string_pool_hits = {}
+
+    @staticmethod
+    def __keys(strings, regexps, lowercase):
+        return [(PATTERN_STRING, string, lowercase) for string in strings] + [(PATTERN_REGEXP, regexp, lowercase) for regexp in regexps]
+
+    def __scan(self, cache, strings, regexps, lowercase, items, get_texts):
+        ''' Scan the `items` (all texts of an item given by `get_texts`) for the patterns not yet in the `cache`
+
+        Returns
+        -------
+        OrderedDict<tuple<str, str>, list<object>>
+            Kind and text of the pattern -> items matching it.
+        '''
+        strings, regexps = list(strings), list(regexps)
+        keys = self.__keys(strings, regexps, lowercase)
+
+        missing = [key for key in keys if key not in cache]
+        if missing:
+            matcher = MultiPatternMatcher([p for kind, p, _ in missing if kind == PATTERN_STRING],
+                                          [p for kind, p, _ in missing if kind == PATTERN_REGEXP],
+                                          lowercase = lowercase)
+            hits = dict((pattern, []) for pattern in matcher.patterns)
+            cnt_patterns = len(hits)
+            for item in items():
+                matched = set()
+                for text in get_texts(item):
+                    matched.update(matcher.matches(text))
+                    # all patterns found in this item
+                    if len(matched) == cnt_patterns:
+                        break
+                for pattern in matched:
+                    hits[pattern].append(item)
+
+            for key in missing:
+                cache[key] = hits[key[:2]]
+
+        return OrderedDict((key[:2], cache[key]) for key in keys)
+
+    def scan_methods(self, strings = (), regexps = (), lowercase = True):
+        ''' Get the methods whose instructions (output) match the patterns.
+
+        Parameters
+        ----------
+        strings : iterable<str>, optional (default is ())
+            Literal strings.
+        regexps : iterable<str>, optional (default is ())
+            Regular expressions.
+        lowercase : bool, optional (default is True)
+            Convert the instruction output to lowercase before matching.
+
+        Returns
+        -------
+        OrderedDict<tuple<str, str>, list<androguard.core.bytecodes.dvm.EncodedMethod>>
+            Kind (`PATTERN_STRING` or `PATTERN_REGEXP`) and text of the pattern -> methods.
+        '''
+        return self.__scan(self.__method_hits, strings, regexps, lowercase,
+                           self.__dalvik_vm_format.get_methods,
+                           lambda encoded_method: (instr.get_output() for instr in encoded_method.get_instructions()))
+
+    def scan_string_pool(self, strings = (), regexps = (), lowercase = True):
+        ''' Get the strings of the string pool matching the patterns.
+
+        See :py:meth:`.scan_methods` for the parameters.
+
+        Returns
+        -------
+        OrderedDict<tuple<str, str>, list<str>>
+            Kind and text of the pattern -> strings.
+        '''
+        return self.__scan(self.__string_pool_hits, strings, regexps, lowercase,
+                           self.__dalvik_vm_format.get_strings,
+                           lambda string: (string, ))
+
+def get_string_hits(dalvik_vm_format, analysis_context = None):
+    ''' Get the `StringHits` for the apk.
+
+    Parameters
+    ----------
+    dalvik_vm_format : DalvikVMFormat
+    analysis_context : AnalysisContext, optional (default is None)
+        Passed to `AndroScript._analyze` as keyword argument.
+        If given, the hits will be shared by all scripts for the apk.
+
+    Returns
+    -------
+    StringHits
+    '''
+    if analysis_context is None:
+        return StringHits(dalvik_vm_format)
+
+    memo = analysis_context.memo
+    if MEMO_STRING_HITS not in memo:
+        memo[MEMO_STRING_HITS] = StringHits(dalvik_vm_format)
+    return memo[MEMO_STRING_HITS]
+
 ############################################################
 #---Abstract Syntax Tree (AST)
 ############################################################
@@ -349,8 +716,7 @@ def ast_for_pathp(pathp, dalvik_vm_format, vm_analysis, caller = True):
     None
         N/A
     '''
-    idx = pathp.src_idx if caller else pathp.dst_idx
-    encoded_method = dalvik_vm_format.get_method_by_idx(idx)
+    encoded_method = get_method_by_pathp(dalvik_vm_format, pathp, caller)
     
     if encoded_method is not None:
         return ast_for_method_analysis(vm_analysis.get_method(encoded_method))
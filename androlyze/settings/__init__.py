@@ -38,6 +38,9 @@ KEY_S3_STORAGE_AWS_SECRET_ACCESS_KEY = "aws_secret_access_key"
 KEY_S3_STORAGE_AWS_HOST_URL = "aws_s3_host"
 KEY_S3_STORAGE_AWS_APK_BUCKET = "aws_apk_bucket"
 
+SECTION_BLOB_STORAGE = "BlobStorage"
+KEY_BLOB_STORAGE_DIR = "blob_dir"
+
 SECTION_RESULT_DB = "ResultDatabase"
 KEY_RESULT_DB_IP = "mongodb_ip"
 KEY_RESULT_DB_PORT = "mongodb_port"
@@ -51,9 +54,39 @@ SECTION_PARALLELIZATION = "Parallelization"
 KEY_PARALLELIZATION_CONCURRENCY = "concurrency"
 KEY_PARALLELIZATION_THREADED = "threaded"
 KEY_PARALLELIZATION_QUEUE_SIZE = "queue_size"
+KEY_PARALLELIZATION_SCRIPT_CONCURRENCY = "script_concurrency"
+KEY_PARALLELIZATION_SCRIPT_CONCURRENCY_TIMEOUT = "script_concurrency_timeout"
+KEY_PARALLELIZATION_MAX_APKS_PER_WORKER = "max_apks_per_worker"
+KEY_PARALLELIZATION_MAX_WORKER_MEMORY = "max_worker_memory"
+KEY_PARALLELIZATION_ISOLATION_TIME_LIMIT = "isolation_time_limit"
+KEY_PARALLELIZATION_ISOLATION_MEMORY_LIMIT = "isolation_memory_limit"
+KEY_PARALLELIZATION_ISOLATION_BATCH_SIZE = "isolation_batch_size"
 
 KEY_PARALLELIZATION_MODE = "mode"
 
+SECTION_ANALYSIS_CACHE = "AnalysisCache"
+KEY_ANALYSIS_CACHE_ENABLED = "enabled"
+KEY_ANALYSIS_CACHE_DIR = "cache_dir"
+KEY_ANALYSIS_CACHE_MAX_SIZE = "max_size"
+
+SECTION_ANALYSIS_TRACE = "AnalysisTrace"
+KEY_ANALYSIS_TRACE_ENABLED = "enabled"
+KEY_ANALYSIS_TRACE_FILE = "trace_file"
+
+SECTION_LIBRARY_FILTER = "LibraryFilter"
+KEY_LIBRARY_FILTER_PREFIXES = "prefixes"
+
+SECTION_RESOURCE_BUDGET = "ResourceBudget"
+KEY_RESOURCE_BUDGET_APK_TIME_LIMIT = "apk_time_limit"
+KEY_RESOURCE_BUDGET_APK_MEMORY_LIMIT = "apk_memory_limit"
+KEY_RESOURCE_BUDGET_SCRIPT_TIME_LIMIT = "script_time_limit"
+KEY_RESOURCE_BUDGET_SCRIPT_MEMORY_LIMIT = "script_memory_limit"
+
+SECTION_QUARANTINE = "Quarantine"
+KEY_QUARANTINE_DATABASE = "quarantine_database"
+KEY_QUARANTINE_POLICY = "policy"
+KEY_QUARANTINE_THRESHOLD = "threshold"
+
 # possible values for parallelization mode
 PARALLELIZATION_MODE_PARALLEL = "parallel"
 PARALLELIZATION_MODE_NON_PARALLEL = "non-parallel"
@@ -87,6 +120,13 @@ KEY_ANALYSIS_STORE_RES_RETRY_CNT = "analysis_store_results_retry_cnt"
 KEY_ANALYSIS_SOFT_TIME_LIMIT = "soft_time_limit"
 KEY_ANALYSIS_HARD_TIME_LIMIT = "hard_time_limit"
 KEY_ANALYSIS_TASK_RECOVATION_ENABLED = "task_revocation"
+KEY_ANALYSIS_MAX_APKS_PER_WORKER = "max_apks_per_worker"
+KEY_ANALYSIS_MAX_WORKER_MEMORY = "max_worker_memory"
+KEY_ANALYSIS_APKS_PER_TASK = "apks_per_task"
+KEY_ANALYSIS_MAX_TASKS_IN_FLIGHT = "max_tasks_in_flight"
+KEY_ANALYSIS_BLOB_TRANSPORT = "blob_transport"
+KEY_ANALYSIS_PREFETCH_APKS = "prefetch_apks"
+KEY_ANALYSIS_PREFETCH_MAX_SIZE = "prefetch_max_size"
 
 # project deployment etc.
 SECTION_DEPLOYMENT = "Deployment"
@@ -17,6 +17,7 @@ from androlyze.model.analysis.result.StaticResultKeys import *
 from androlyze.model.android.apk.FastApk import FastApk
 from androlyze.model.script import ScriptUtil as ScriptUtil
 from androlyze.model.script.AndroScript import AndroScript
+from androlyze.model.script.ResultSink import is_result_sink, CHUNK_SIZE
 from androlyze.storage import Util as StorageUtil
 from androlyze.storage.ImportStorageInterface import ImportStorageInterface
 from androlyze.storage.ResultWritingInterface import ResultWritingInterface
@@ -155,7 +156,7 @@ class FileSysStorage(object, ImportStorageInterface, ResultWritingInterface, Apk
     #---ResultWritingInterface
     ############################################################
 
-    def store_result_for_apk(self, apk, script):
+    def store_result_for_apk(self, apk, script, result_dict = None, data = None):
         '''
         Store the results in the file system.
 
@@ -166,6 +167,10 @@ class FileSysStorage(object, ImportStorageInterface, ResultWritingInterface, Apk
         ----------
         apk: Apk
         script: AndroScript
+        result_dict : dict, optional (default is None)
+            See :py:meth:`.ResultWritingInterface.store_result_for_apk`.
+        data : str, optional (default is None)
+            See :py:meth:`.ResultWritingInterface.store_result_for_apk`.
 
         Raises
         ------
@@ -181,9 +186,16 @@ class FileSysStorage(object, ImportStorageInterface, ResultWritingInterface, Apk
             with open(res_filename, "w") as f:
                 log.debug("storing results for %s, %s to %s", apk.short_description(), script, res_filename)
                 if not script.uses_custom_result_object():
-                    f.write(script.res.write_to_json())
+                    if result_dict is None:
+                        result_dict = script.result_dict()
+                    f.write(ScriptUtil.dict2json(result_dict))
+                # stream big results
+                elif is_result_sink(script.cres):
+                    shutil.copyfileobj(script.cres.get_stream(), f, CHUNK_SIZE)
                 else:
-                    res = self.get_custom_res_obj_representation(script)
+                    res = data
+                    if res is None:
+                        res = self.get_custom_res_obj_representation(script)
                     # log json if custom res obj is `ResultObject
                     if ScriptUtil.is_result_object(res):
                         res = res.write_to_json()
@@ -7,6 +7,7 @@ __email__ = "schmidt89 at informatik.uni-marburg.de"
 from datetime import datetime
 
 from androlyze.log.Log import log
+from androlyze.model.script.ResultSink import is_result_sink
 from androlyze.storage.FileSysStorage import FileSysStorage
 from androlyze.storage.ImportStorageInterface import ImportStorageInterface
 from androlyze.storage.apk.ApkCopyInterface import ApkCopyInterface
@@ -354,8 +355,15 @@ class  RedundantStorage(object, ImportStorageInterface, ImportQueryInterface, Re
             raise StorageException("Data cannot be stored for: %s, %s! Your custom result object is None!" % (apk.short_description(), script.name))
 
         # above ensures script.cres is not None!
-        res = self.result_db_storage.store_result_for_apk(apk, script)
-        self.fs_storage.store_result_for_apk(apk, script)
+
+        # create the result only once for both storages
+        result_dict = script.result_dict(gen_id = False)
+        data = None
+        if script.uses_custom_result_object() and not is_result_sink(script.cres):
+            data = self.get_custom_res_obj_representation(script)
+
+        res = self.result_db_storage.store_result_for_apk(apk, script, result_dict = result_dict, data = data)
+        self.fs_storage.store_result_for_apk(apk, script, result_dict = result_dict, data = data)
         return res
 
     def delete_results(self, *args, **kwargs):
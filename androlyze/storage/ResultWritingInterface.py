@@ -6,13 +6,14 @@ __email__ = "schmidt89 at informatik.uni-marburg.de"
 
 from androlyze.model.script import ScriptUtil as ScriptUtil
 from androlyze.model.script.CustomResultObjInterface import CustomResultObjInterface
+from androlyze.model.script.ResultSink import is_result_sink
 
 class ResultWritingInterface:
     '''
     Interface for the writing of the analysis results.
     '''
 
-    def store_result_for_apk(self, apk, script):
+    def store_result_for_apk(self, apk, script, result_dict = None, data = None):
         ''' Store the `result` for the `apk` which has been analyzed with the `script`.
 
         Will overwrite already existing results of the `script` in the storage
@@ -25,6 +26,12 @@ class ResultWritingInterface:
         ----------
         apk: Apk
         script: AndroScript
+        result_dict : dict, optional (default is None)
+            The result of `script.result_dict()` if already created (e.g. for another storage).
+            Will not be modified.
+        data : str, optional (default is None)
+            The representation of the custom result object (see :py:meth:`.get_custom_res_obj_representation`)
+            if already created.
 
         Raises
         ------
@@ -45,4 +52,23 @@ class ResultWritingInterface:
             return cres.get_custom_result_obj_repr()
         elif ScriptUtil.is_result_object(cres):
             return cres.write_to_json()
-        return str(cres)
\ No newline at end of file
+        return str(cres)
+
+    @staticmethod
+    def get_custom_res_obj_data(script, data = None):
+        ''' Get the data of the custom result object that shall be stored.
+        A `ResultSink` will be streamed instead of being read into memory.
+
+        Returns
+        -------
+        file-like object
+            If the custom result object is a `ResultSink`.
+        str
+            Otherwise the representation (see :py:meth:`.get_custom_res_obj_representation`)
+            or `data` if given.
+        '''
+        if is_result_sink(script.cres):
+            return script.cres.get_stream()
+        if data is not None:
+            return data
+        return ResultWritingInterface.get_custom_res_obj_representation(script)
\ No newline at end of file
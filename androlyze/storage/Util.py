@@ -56,6 +56,76 @@ def get_apk_path_incl_filename(apk):
     return join(get_apk_path(apk.package_name, apk.version_name, apk.hash), apk.get_apk_filename_from_manifest())
 
 
+def escape_mongodb_key(k):
+    '''
+    Escape key `k` so that in conforms to mongodb's key restrictions.
+    Applying it to an escaped key doesn't change it.
+
+    See Also
+    --------
+    http://docs.mongodb.org/manual/faq/developers/#dollar-sign-operator-escaping
+    '''
+    replaced_key = k
+    DOT = '.'
+    DOT_REPL = '_'
+
+    DOLLAR = '$'
+    DOLLAR_REPL = '_$'
+
+    # replace dot
+    if DOT in k:
+        replaced_key = k.replace(DOT, DOT_REPL)
+
+    # replace starting dollar
+    if replaced_key.startswith(DOLLAR):
+        replaced_key = replaced_key.replace(DOLLAR, DOLLAR_REPL, 1)
+
+    return replaced_key
+
+def escape_keys_lazy(obj, escape_fct):
+    ''' Escape the keys of the dicts inside of `obj` (also inside of lists and tuples) with `escape_fct`.
+
+    Unlike :py:meth:`.escape_dict` nothing is copied if no key needs to be escaped.
+    Otherwise only the dicts (and the lists/tuples containing them) on the path to the changed keys are copied.
+
+    Parameters
+    ----------
+    obj : object
+    escape_fct : object -> object
+
+    Returns
+    -------
+    object
+        `obj` itself if nothing had to be escaped.
+    '''
+    if isinstance(obj, dict):
+        items = None
+        for idx, (key, val) in enumerate(obj.iteritems()):
+            key_esc = escape_fct(key) if isinstance(key, basestring) else key
+            val_esc = escape_keys_lazy(val, escape_fct)
+            if items is None and (key_esc is not key or val_esc is not val):
+                # first change, copy the items before
+                items = obj.items()[:idx]
+            if items is not None:
+                items.append((key_esc, val_esc))
+        if items is None:
+            return obj
+        return obj.__class__(items) if isinstance(obj, collections.OrderedDict) else dict(items)
+
+    elif isinstance(obj, (list, tuple)):
+        elms = None
+        for idx, elm in enumerate(obj):
+            elm_esc = escape_keys_lazy(elm, escape_fct)
+            if elms is None and elm_esc is not elm:
+                elms = list(obj[:idx])
+            if elms is not None:
+                elms.append(elm_esc)
+        if elms is None:
+            return obj
+        return elms if isinstance(obj, list) else tuple(elms)
+
+    return obj
+
 def escape_dict(_dict, escape_fct, escape_keys = True, escape_values = False):
     ''' Escape the keys and/or values  in the `_dict` with `escape_fct`.
 
@@ -62,4 +62,8 @@ class ApkCopyInterface:
     def is_mongodb(self):
         from androlyze.storage.resultdb.ResultDatabaseStorage import ResultDatabaseStorage
         return isinstance(self, ResultDatabaseStorage)
+
+    def is_blob_storage(self):
+        from androlyze.storage.blob.BlobStorage import BlobStorage
+        return isinstance(self, BlobStorage)
     
\ No newline at end of file
@@ -6,6 +6,7 @@ __email__ = "schmidt89 at informatik.uni-marburg.de"
 
 from androlyze.log.Log import log
 from androlyze.storage.resultdb import ResultDatabaseStorage
+from androlyze.storage.blob import BlobStorage
 from androlyze.storage.s3 import S3Storage
 
 def get_apk_storage(settings):
@@ -23,5 +24,7 @@ def get_apk_storage(settings):
         return S3Storage.factory_from_config(settings)
     elif storage_engine == s.SECTION_RESULT_DB:
         return ResultDatabaseStorage.factory_from_config(settings)
+    elif storage_engine == s.SECTION_BLOB_STORAGE:
+        return BlobStorage.factory_from_config(settings)
     else:
         raise RuntimeError("No Storage engine defined! But requested!")
\ No newline at end of file
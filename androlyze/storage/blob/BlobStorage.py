@@ -0,0 +1,179 @@
+
+# encoding: utf-8
+
+__author__ = "Nils Tobias Schmidt"
+__email__ = "schmidt89 at informatik.uni-marburg.de"
+
+import errno
+import os
+from os.path import join, exists
+import shutil
+import sys
+from tempfile import NamedTemporaryFile
+
+from androlyze.analyze import AnalyzeUtil
+from androlyze.log.Log import log
+from androlyze.storage.apk.ApkCopyInterface import ApkCopyInterface
+from androlyze.storage.exception import FileSysStoreException, \
+    FileSysLoadException, FileSysCreateStorageStructureException
+
+class BlobStorage(object, ApkCopyInterface):
+    '''
+    Content-addressed storage for APKs in a (shared) directory, e.g. a NFS mount.
+
+    Each .apk is stored under its hash (sha256), so the same .apk is only stored once.
+    Blobs are written to a temporary file first and then renamed,
+    so concurrent writers of the same .apk do not corrupt it and readers never see partial data.
+
+    The meta infos are not stored, they have to be supplied by the `FastApk` when loading.
+    '''
+
+    def __init__(self, blob_dir):
+        '''
+        Parameters
+        ----------
+        blob_dir : str
+            The directory under which the blobs are stored.
+
+        Raises
+        ------
+        FileSysCreateStorageStructureException
+            If the directory could not be created.
+        '''
+        self.__blob_dir = os.path.abspath(blob_dir)
+        try:
+            if not exists(self.blob_dir):
+                os.makedirs(self.blob_dir)
+        except OSError as e:
+            # may have been created concurrently
+            if e.errno != errno.EEXIST:
+                raise FileSysCreateStorageStructureException(self.blob_dir, self, caused_by = e), None, sys.exc_info()[2]
+
+        log.info("opening %s", self)
+
+    def __str__(self):
+        return repr(self)
+
+    def __repr__(self):
+        return '%s(%s)' % (self.__class__.__name__, self.blob_dir)
+
+    def get_blob_dir(self):
+        return self.__blob_dir
+
+    blob_dir = property(get_blob_dir, None, None, "str : The directory under which the blobs are stored.")
+
+    ############################################################
+    #---Blobs
+    ############################################################
+
+    def get_blob_path(self, _hash):
+        ''' Get the path of the blob for `_hash`.
+        The first two characters of the hash are used as sub directory to keep the directories small. '''
+        return join(self.blob_dir, _hash[:2], _hash)
+
+    def contains(self, _hash):
+        ''' Check if the blob for `_hash` is stored '''
+        return exists(self.get_blob_path(_hash))
+
+    def put(self, _hash, file_like_obj):
+        ''' Store the data from `file_like_obj` under `_hash` (if not already stored).
+
+        Raises
+        ------
+        FileSysStoreException
+
+        Returns
+        -------
+        bool
+            If the blob has been written.
+        '''
+        blob_path = self.get_blob_path(_hash)
+        if exists(blob_path):
+            log.debug("%s already in %s", _hash, self)
+            return False
+
+        blob_sub_dir = os.path.dirname(blob_path)
+        tmp_file = None
+        try:
+            if not exists(blob_sub_dir):
+                try:
+                    os.makedirs(blob_sub_dir)
+                except OSError as e:
+                    if e.errno != errno.EEXIST:
+                        raise
+
+            file_like_obj.seek(0)
+            with NamedTemporaryFile(dir = blob_sub_dir, prefix = ".%s." % _hash, delete = False) as tmp_file:
+                shutil.copyfileobj(file_like_obj, tmp_file)
+            # atomic, last writer wins (same content)
+            os.rename(tmp_file.name, blob_path)
+            log.debug("put %s into %s", _hash, self)
+            return True
+        except (IOError, OSError) as e:
+            if tmp_file is not None and exists(tmp_file.name):
+                os.remove(tmp_file.name)
+            raise FileSysStoreException(blob_path, _hash, self, caused_by = e), None, sys.exc_info()[2]
+
+    def get(self, _hash):
+        ''' Get the data of the blob for `_hash`.
+
+        Raises
+        ------
+        FileSysLoadException
+        '''
+        blob_path = self.get_blob_path(_hash)
+        try:
+            with open(blob_path, "rb") as f:
+                return f.read()
+        except IOError as e:
+            raise FileSysLoadException(blob_path, self, caused_by = e), None, sys.exc_info()[2]
+
+    ############################################################
+    #---ApkCopyInterface
+    ############################################################
+
+    def copy_apk(self, apk, file_like_obj, **kwargs):
+        ''' See doc of :py:meth:`.ApkCopyInterface.copy_apk`.
+
+        Copy the apk into the blob storage (if not already stored).
+
+        Returns
+        -------
+        str
+            The path of the blob.
+        '''
+        self.put(apk.hash, file_like_obj)
+        return self.get_blob_path(apk.hash)
+
+    def get_apk(self, _hash, apk = None, **kwargs):
+        '''
+        Get the `EAndroApk` from `_hash`.
+
+        Parameters
+        ----------
+        _hash : str
+            Hash of the .apk (sha256)
+        apk : Apk, optional (default is None)
+            Carries the meta infos of the apk.
+
+        Raises
+        ------
+        FileSysLoadException
+
+        Returns
+        -------
+        EAndroApk
+            Apk constructed from raw data and meta infos.
+        '''
+        log.info("getting apk: %s from %s ...", _hash, self)
+        return AnalyzeUtil.open_apk(self.get(_hash), apk, raw = True)
+
+def factory_from_config(settings):
+    ''' Get a `BlobStorage` object from the distributed config file.
+
+    Parameters
+    ----------
+    settings : Settings
+    '''
+    from androlyze.settings import SECTION_BLOB_STORAGE, KEY_BLOB_STORAGE_DIR
+    return BlobStorage(settings[(SECTION_BLOB_STORAGE, KEY_BLOB_STORAGE_DIR)])
@@ -35,7 +35,8 @@ class ImportDatabaseStorage(object, ImportStorageInterface, ImportQueryInterface
     %s timestamp NOT NULL,
     %s TEXT,
     %s INTEGER DEFAULT 0,
-    %s timestamp NOT NULL
+    %s timestamp NOT NULL,
+    %s TEXT
     )''' % (TABLE_APK_IMPORT,
                     TABLE_APK_IMPORT_KEY_HASH,
                     TABLE_APK_IMPORT_KEY_PACKAGE_NAME,
@@ -44,11 +45,12 @@ class ImportDatabaseStorage(object, ImportStorageInterface, ImportQueryInterface
                     TABLE_APK_IMPORT_KEY_IMPORT_DATE,
                     TABLE_APK_IMPORT_KEY_TAG,
                     TABLE_APK_IMPORT_KEY_SIZE_APP_CODE,
-                    TABLE_APK_IMPORT_KEY_BUILD_DATE
+                    TABLE_APK_IMPORT_KEY_BUILD_DATE,
+                    TABLE_APK_IMPORT_KEY_DEX_HASH
                     )
 
-    INSERT_STMT = ''' INSERT INTO %s(%s, %s, %s, %s, %s, %s, %s, %s)
-         VALUES (?, ?, ?, ?, ?, ?, ?, ?)''' % (TABLE_APK_IMPORT,
+    INSERT_STMT = ''' INSERT INTO %s(%s, %s, %s, %s, %s, %s, %s, %s, %s)
+         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''' % (TABLE_APK_IMPORT,
                                       TABLE_APK_IMPORT_KEY_HASH,
                                       TABLE_APK_IMPORT_KEY_PACKAGE_NAME,
                                       TABLE_APK_IMPORT_KEY_VERSION_NAME,
@@ -56,10 +58,11 @@ class ImportDatabaseStorage(object, ImportStorageInterface, ImportQueryInterface
                                       TABLE_APK_IMPORT_KEY_IMPORT_DATE,
                                       TABLE_APK_IMPORT_KEY_TAG,
                                       TABLE_APK_IMPORT_KEY_SIZE_APP_CODE,
-                                      TABLE_APK_IMPORT_KEY_BUILD_DATE
+                                      TABLE_APK_IMPORT_KEY_BUILD_DATE,
+                                      TABLE_APK_IMPORT_KEY_DEX_HASH
                                       )
 
-    UPDATE_STMT = ''' UPDATE %s SET %s = ?, %s = ?, %s = ?, %s = ?, %s = ?, %s = ?, %s = ? WHERE %s = ?
+    UPDATE_STMT = ''' UPDATE %s SET %s = ?, %s = ?, %s = ?, %s = ?, %s = ?, %s = ?, %s = ?, %s = ? WHERE %s = ?
          ''' % (TABLE_APK_IMPORT,
               TABLE_APK_IMPORT_KEY_PACKAGE_NAME,
               TABLE_APK_IMPORT_KEY_VERSION_NAME,
@@ -68,6 +71,7 @@ class ImportDatabaseStorage(object, ImportStorageInterface, ImportQueryInterface
               TABLE_APK_IMPORT_KEY_TAG,
               TABLE_APK_IMPORT_KEY_SIZE_APP_CODE,
               TABLE_APK_IMPORT_KEY_BUILD_DATE,
+              TABLE_APK_IMPORT_KEY_DEX_HASH,
               TABLE_APK_IMPORT_KEY_HASH,
               )
 
@@ -76,6 +80,9 @@ class ImportDatabaseStorage(object, ImportStorageInterface, ImportQueryInterface
 
     # statement to add the build time column
     ADD_COLUMN_BUILD_DATE = "ALTER TABLE %s ADD COLUMN %s timestamp NOT NULL" % (TABLE_APK_IMPORT, TABLE_APK_IMPORT_KEY_BUILD_DATE)
+
+    # statement to add the dex hash column
+    ADD_COLUMN_DEX_HASH = "ALTER TABLE %s ADD COLUMN %s TEXT" % (TABLE_APK_IMPORT, TABLE_APK_IMPORT_KEY_DEX_HASH)
     
     DELETE_STMT = ' DELETE FROM %s WHERE %s = ?' % (TABLE_APK_IMPORT, TABLE_APK_IMPORT_KEY_HASH)
 
@@ -118,7 +125,7 @@ class ImportDatabaseStorage(object, ImportStorageInterface, ImportQueryInterface
         ''' Upgrade the db to the latest layout '''
         
         # try to execute all update statements
-        for sql_stmt in (self.ADD_COLUMN_APP_CODE_SIZE, self.ADD_COLUMN_BUILD_DATE):
+        for sql_stmt in (self.ADD_COLUMN_APP_CODE_SIZE, self.ADD_COLUMN_BUILD_DATE, self.ADD_COLUMN_DEX_HASH):
             
             try:
                 self.conn.execute(sql_stmt)
@@ -246,7 +253,9 @@ class ImportDatabaseStorage(object, ImportStorageInterface, ImportQueryInterface
                               import_date = apk_dict[TABLE_APK_IMPORT_KEY_IMPORT_DATE],
                               tag = apk_dict[TABLE_APK_IMPORT_KEY_TAG],
                               size_app_code = apk_dict[TABLE_APK_IMPORT_KEY_SIZE_APP_CODE],
-                              build_date = apk_dict.get(TABLE_APK_IMPORT_KEY_BUILD_DATE)
+                              build_date = apk_dict.get(TABLE_APK_IMPORT_KEY_BUILD_DATE),
+                              # not available for apks imported before the column existed
+                              dex_hash = apk_dict.get(TABLE_APK_IMPORT_KEY_DEX_HASH)
                             )
 
         except (sqlite3.Error, KeyError) as e:
@@ -309,15 +318,15 @@ class ImportDatabaseStorage(object, ImportStorageInterface, ImportQueryInterface
             # does committing and rollback in case of exception
             # but we also have autocommit for sql dml
             with self.conn as _conn:
-                _hash, pn, vn, path, import_date, size_app_code, build_date = apk.hash, apk.package_name, apk.version_name, apk.path, apk.import_date, apk.size_app_code, apk.get_build_date()
+                _hash, pn, vn, path, import_date, size_app_code, build_date, dex_hash = apk.hash, apk.package_name, apk.version_name, apk.path, apk.import_date, apk.size_app_code, apk.get_build_date(), apk.dex_hash
                 c = _conn.cursor()
                 in_storage = self.contains(apk)
                 # if already in db, update the entry
                 if in_storage and update:
-                    c.execute(self.UPDATE_STMT, (pn, vn, path, import_date, tag, size_app_code, build_date, _hash))
+                    c.execute(self.UPDATE_STMT, (pn, vn, path, import_date, tag, size_app_code, build_date, dex_hash, _hash))
                 # otherwise insert it
                 elif not in_storage:
-                    c.execute(self.INSERT_STMT, (_hash, pn, vn, path, import_date, tag, size_app_code, build_date))
+                    c.execute(self.INSERT_STMT, (_hash, pn, vn, path, import_date, tag, size_app_code, build_date, dex_hash))
         except (sqlite3.Error, CouldNotOpenApk) as e:
             raise DatabaseStoreException(self, apk, e), None, sys.exc_info()[2]
 
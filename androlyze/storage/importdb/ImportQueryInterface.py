@@ -14,10 +14,12 @@ TABLE_APK_IMPORT_KEY_IMPORT_DATE = "import_date"
 TABLE_APK_IMPORT_KEY_TAG = "tag"
 TABLE_APK_IMPORT_KEY_SIZE_APP_CODE = "size_app_code"
 TABLE_APK_IMPORT_KEY_BUILD_DATE = "build_date"
+TABLE_APK_IMPORT_KEY_DEX_HASH = "dex_hash"
 TABLE_APK_IMPORT_KEYS = set([TABLE_APK_IMPORT_KEY_HASH, TABLE_APK_IMPORT_KEY_PACKAGE_NAME,
                          TABLE_APK_IMPORT_KEY_VERSION_NAME, TABLE_APK_IMPORT_KEY_PATH,
                          TABLE_APK_IMPORT_KEY_IMPORT_DATE, TABLE_APK_IMPORT_KEY_TAG,
-                         TABLE_APK_IMPORT_KEY_SIZE_APP_CODE, TABLE_APK_IMPORT_KEY_BUILD_DATE
+                         TABLE_APK_IMPORT_KEY_SIZE_APP_CODE, TABLE_APK_IMPORT_KEY_BUILD_DATE,
+                         TABLE_APK_IMPORT_KEY_DEX_HASH
                          ])
 
 class ImportQueryInterface:
@@ -0,0 +1,402 @@
+
+# encoding: utf-8
+
+__author__ = "Nils Tobias Schmidt"
+__email__ = "schmidt89 at informatik.uni-marburg.de"
+
+from datetime import datetime
+import os
+import sqlite3
+import sys
+
+from androlyze.log.Log import log
+from androlyze.storage.exception import DatabaseStoreException, DatabaseOpenError, \
+    DatabaseLoadException, DatabaseDeleteException
+
+# database structure constants
+TABLE_QUARANTINE = "quarantine"
+TABLE_QUARANTINE_KEY_HASH = "hash"
+TABLE_QUARANTINE_KEY_SCRIPTS = "scripts"
+TABLE_QUARANTINE_KEY_FAILURE = "failure"
+TABLE_QUARANTINE_KEY_COUNT = "count"
+TABLE_QUARANTINE_KEY_DETAILS = "details"
+TABLE_QUARANTINE_KEY_FIRST_DATE = "first_date"
+TABLE_QUARANTINE_KEY_LAST_DATE = "last_date"
+
+# kinds of failures
+FAILURE_TIME = "time"
+FAILURE_MEMORY = "memory"
+FAILURE_CRASH = "crash"
+FAILURE_DEX = "dex error"
+
+# what to do with quarantined apks
+POLICY_OFF = "off"
+POLICY_SKIP = "skip"
+POLICY_DEPRIORITIZE = "deprioritize"
+POLICIES = (POLICY_OFF, POLICY_SKIP, POLICY_DEPRIORITIZE)
+
+# number of failures after which an apk is quarantined
+DEFAULT_THRESHOLD = 2
+
+# separator for the script names
+SCRIPTS_SEP = ","
+
+class QuarantineStorage(object):
+    '''
+    Registry for apks which repeatedly crashed or exceeded the limits (time, memory) during the analysis ("poison apks").
+
+    The registry is a sqlite3 database (like the import database) and therefore shared across runs.
+    It is local to the host, so the workers of the distributed analysis send their failures back to the master
+    (see :py:func:`.collect_failures`) which records them.
+    Each failure is recorded together with the scripts the apk has been analyzed with.
+    An apk is quarantined for a set of scripts if it failed at least `threshold` times
+    with a subset of these scripts (running more scripts will not make it better).
+
+    What happens with the quarantined apks is up to the policy (see `POLICIES`).
+    '''
+
+    CREATE_STMT = ''' CREATE TABLE IF NOT EXISTS %s (
+    %s TEXT NOT NULL,
+    %s TEXT NOT NULL,
+    %s TEXT NOT NULL,
+    %s INTEGER DEFAULT 0,
+    %s TEXT,
+    %s timestamp NOT NULL,
+    %s timestamp NOT NULL,
+    PRIMARY KEY (%s, %s, %s)
+    )''' % (TABLE_QUARANTINE,
+            TABLE_QUARANTINE_KEY_HASH,
+            TABLE_QUARANTINE_KEY_SCRIPTS,
+            TABLE_QUARANTINE_KEY_FAILURE,
+            TABLE_QUARANTINE_KEY_COUNT,
+            TABLE_QUARANTINE_KEY_DETAILS,
+            TABLE_QUARANTINE_KEY_FIRST_DATE,
+            TABLE_QUARANTINE_KEY_LAST_DATE,
+            TABLE_QUARANTINE_KEY_HASH, TABLE_QUARANTINE_KEY_SCRIPTS, TABLE_QUARANTINE_KEY_FAILURE
+            )
+
+    UPDATE_STMT = ''' UPDATE %s SET %s = %s + 1, %s = ?, %s = ? WHERE %s = ? AND %s = ? AND %s = ?
+    ''' % (TABLE_QUARANTINE,
+           TABLE_QUARANTINE_KEY_COUNT, TABLE_QUARANTINE_KEY_COUNT,
+           TABLE_QUARANTINE_KEY_DETAILS,
+           TABLE_QUARANTINE_KEY_LAST_DATE,
+           TABLE_QUARANTINE_KEY_HASH, TABLE_QUARANTINE_KEY_SCRIPTS, TABLE_QUARANTINE_KEY_FAILURE
+           )
+
+    INSERT_STMT = ''' INSERT INTO %s(%s, %s, %s, %s, %s, %s, %s)
+    VALUES (?, ?, ?, 1, ?, ?, ?)''' % (TABLE_QUARANTINE,
+                                       TABLE_QUARANTINE_KEY_HASH,
+                                       TABLE_QUARANTINE_KEY_SCRIPTS,
+                                       TABLE_QUARANTINE_KEY_FAILURE,
+                                       TABLE_QUARANTINE_KEY_COUNT,
+                                       TABLE_QUARANTINE_KEY_DETAILS,
+                                       TABLE_QUARANTINE_KEY_FIRST_DATE,
+                                       TABLE_QUARANTINE_KEY_LAST_DATE
+                                       )
+
+    # time to wait e.g. for the file lock to disappear (the workers record concurrently)
+    TIMEOUT = 60
+
+    def __init__(self, db_name, threshold = DEFAULT_THRESHOLD):
+        '''
+        Open the database and create the table if not already existing.
+
+        Parameters
+        ----------
+        db_name : str
+            Name of the database to use.
+        threshold : int, optional (default is `DEFAULT_THRESHOLD`)
+            Number of failures after which an apk is quarantined.
+
+        Raises
+        ------
+        DatabaseOpenError
+            If the database could not be opened or set up.
+        '''
+        log.debug("Opening database %s", db_name)
+        self.__db_name = db_name
+        self.__threshold = threshold
+        self.__conn = None
+        try:
+            self.__conn = sqlite3.connect(db_name,
+                timeout = self.TIMEOUT,
+                # needed for date storage
+                detect_types = sqlite3.PARSE_DECLTYPES
+                )
+            self.__conn.row_factory = sqlite3.Row
+            self.__conn.execute(self.CREATE_STMT)
+        except sqlite3.Error as e:
+            raise DatabaseOpenError(db_name, caused_by = e), None, sys.exc_info()[2]
+
+    def __del__(self):
+        ''' Close database '''
+        try:
+            if self.conn is not None:
+                self.conn.close()
+        except sqlite3.Error as e:
+            log.warn(e)
+
+    def __str__(self):
+        return self.db_name
+
+    def __repr__(self):
+        return '%s(%s, threshold: %s)' % (self.__class__.__name__, self, self.threshold)
+
+    def get_db_name(self):
+        return self.__db_name
+
+    def get_threshold(self):
+        return self.__threshold
+
+    def get_conn(self):
+        return self.__conn
+
+    db_name = property(get_db_name, None, None, "str : Name of the database to use.")
+    threshold = property(get_threshold, None, None, "int : Number of failures after which an apk is quarantined.")
+    conn = property(get_conn, None, None, "sqlite3.Connection : The established connection to the database")
+
+    ############################################################
+    #---Recording
+    ############################################################
+
+    def record(self, apk_hash, script_names, failure, details = None):
+        ''' Record a failure of the apk with `apk_hash`.
+
+        Parameters
+        ----------
+        apk_hash : str
+        script_names : iterable<str>
+            The names of the scripts the apk has been analyzed with.
+        failure : str
+            Kind of the failure, see the variables prefixed with "FAILURE_".
+        details : str, optional (default is None)
+            Description of the last failure.
+
+        Raises
+        ------
+        DatabaseStoreException
+        '''
+        scripts = scripts_2_str(script_names)
+        now = datetime.now()
+        try:
+            # commits (or rolls back) the upsert as one transaction
+            with self.conn as _conn:
+                c = _conn.execute(self.UPDATE_STMT, (details, now, apk_hash, scripts, failure))
+                if c.rowcount == 0:
+                    _conn.execute(self.INSERT_STMT, (apk_hash, scripts, failure, details, now, now))
+            log.info("Recorded failure (%s) of %s in %s", failure, apk_hash, self)
+        except sqlite3.Error as e:
+            raise DatabaseStoreException(self, apk_hash, e), None, sys.exc_info()[2]
+
+    ############################################################
+    #---Querying
+    ############################################################
+
+    def get_entries(self, hashes = None):
+        ''' Get the recorded failures (most recent first).
+
+        Parameters
+        ----------
+        hashes : iterable<str>, optional (default is None)
+            Only get the entries of these apks. Otherwise all.
+
+        Returns
+        -------
+        list<dict>
+            Each column name maps to the value.
+            The scripts are a list of script names.
+
+        Raises
+        ------
+        DatabaseLoadException
+        '''
+        SQL_STMT = 'SELECT * FROM %s' % TABLE_QUARANTINE
+        args = ()
+        if hashes is not None:
+            args = tuple(hashes)
+            SQL_STMT += ' WHERE %s IN (%s)' % (TABLE_QUARANTINE_KEY_HASH, ', '.join('?' * len(args)))
+        SQL_STMT += ' ORDER BY %s DESC' % TABLE_QUARANTINE_KEY_LAST_DATE
+
+        try:
+            res = []
+            for row in self.conn.execute(SQL_STMT, args):
+                entry = dict(zip(row.keys(), row))
+                entry[TABLE_QUARANTINE_KEY_SCRIPTS] = str_2_scripts(entry[TABLE_QUARANTINE_KEY_SCRIPTS])
+                res.append(entry)
+            return res
+        except sqlite3.Error as e:
+            data = ', '.join(hashes) if hashes is not None else "all entries"
+            raise DatabaseLoadException(self, data, e), None, sys.exc_info()[2]
+
+    def get_quarantined(self, script_names):
+        ''' Get the apks which are quarantined for the scripts with `script_names`.
+
+        Parameters
+        ----------
+        script_names : iterable<str>
+
+        Returns
+        -------
+        dict<str, list<str>>
+            Hash of the quarantined apk to the kinds of its failures.
+
+        Raises
+        ------
+        DatabaseLoadException
+        '''
+        script_names = set(script_names)
+        SQL_STMT = 'SELECT %s, %s, %s FROM %s WHERE %s >= ?' % (TABLE_QUARANTINE_KEY_HASH,
+                                                                TABLE_QUARANTINE_KEY_SCRIPTS,
+                                                                TABLE_QUARANTINE_KEY_FAILURE,
+                                                                TABLE_QUARANTINE,
+                                                                TABLE_QUARANTINE_KEY_COUNT)
+        try:
+            res = {}
+            for apk_hash, scripts, failure in self.conn.execute(SQL_STMT, (self.threshold, )):
+                # failed with a subset of the scripts
+                if set(str_2_scripts(scripts)) <= script_names:
+                    res.setdefault(apk_hash, []).append(failure)
+            return res
+        except sqlite3.Error as e:
+            raise DatabaseLoadException(self, "quarantined apks", e), None, sys.exc_info()[2]
+
+    ############################################################
+    #---Deletion
+    ############################################################
+
+    def clear(self, hashes = None):
+        ''' Delete the entries of the apks with `hashes` (all if None).
+
+        Returns
+        -------
+        int
+            Number of deleted entries.
+
+        Raises
+        ------
+        DatabaseDeleteException
+        '''
+        SQL_STMT = 'DELETE FROM %s' % TABLE_QUARANTINE
+        args = ()
+        if hashes is not None:
+            args = tuple(hashes)
+            SQL_STMT += ' WHERE %s IN (%s)' % (TABLE_QUARANTINE_KEY_HASH, ', '.join('?' * len(args)))
+        try:
+            with self.conn as _conn:
+                return _conn.execute(SQL_STMT, args).rowcount
+        except sqlite3.Error as e:
+            data = ', '.join(hashes) if hashes is not None else "all entries"
+            raise DatabaseDeleteException(self, data, e), None, sys.exc_info()[2]
+
+def scripts_2_str(script_names):
+    ''' Create the (order independent) representation of the script set '''
+    return SCRIPTS_SEP.join(sorted(set(script_names)))
+
+def str_2_scripts(scripts):
+    ''' Inverse of `scripts_2_str` '''
+    return scripts.split(SCRIPTS_SEP) if scripts else []
+
+def failure_from_budget(budget):
+    ''' Get the kind of failure for the exceeded `ResourceBudget` '''
+    from androlyze.analyze.ResourceBudget import RESOURCE_MEMORY
+    return FAILURE_MEMORY if budget.exceeded == RESOURCE_MEMORY else FAILURE_TIME
+
+############################################################
+#---Settings
+############################################################
+
+# per process instance (sqlite connections must not be shared with forked processes)
+_quarantine = None
+_quarantine_pid = None
+
+# failures collected instead of recorded (see `collect_failures`)
+_collected_failures = None
+
+def get_quarantine_settings():
+    ''' Get the quarantine settings.
+
+    Returns
+    -------
+    tuple<str, str, int>
+        The database, the policy and the threshold.
+        The database is None if the quarantine is disabled.
+    '''
+    from androlyze import settings
+    from androlyze.settings import SECTION_QUARANTINE, KEY_QUARANTINE_DATABASE, KEY_QUARANTINE_POLICY, \
+        KEY_QUARANTINE_THRESHOLD
+
+    s = settings.singleton
+    if s is None:
+        return None, POLICY_OFF, DEFAULT_THRESHOLD
+
+    db_name = s.__getitem__((SECTION_QUARANTINE, KEY_QUARANTINE_DATABASE), default = None) or None
+    policy = s.__getitem__((SECTION_QUARANTINE, KEY_QUARANTINE_POLICY), default = POLICY_DEPRIORITIZE)
+    if policy not in POLICIES:
+        log.warn("Unknown quarantine policy: %s, choose between: %s. Using: %s", policy, ', '.join(POLICIES), POLICY_DEPRIORITIZE)
+        policy = POLICY_DEPRIORITIZE
+    threshold = s.get_int((SECTION_QUARANTINE, KEY_QUARANTINE_THRESHOLD), default = DEFAULT_THRESHOLD)
+
+    return db_name, policy, threshold
+
+def get_quarantine():
+    ''' Get the `QuarantineStorage` as configured in the settings.
+
+    Returns
+    -------
+    QuarantineStorage
+    None
+        If the quarantine is not enabled or could not be opened (error will be logged).
+    '''
+    global _quarantine, _quarantine_pid
+
+    pid = os.getpid()
+    if _quarantine_pid != pid:
+        _quarantine_pid = pid
+        _quarantine = None
+        db_name, _, threshold = get_quarantine_settings()
+        if db_name is not None:
+            try:
+                _quarantine = QuarantineStorage(db_name, threshold)
+            except DatabaseOpenError as e:
+                log.warn(e)
+
+    return _quarantine
+
+def record_failure(apk_hash, script_names, failure, details = None):
+    ''' Record the failure in the configured `QuarantineStorage` (if enabled).
+    Errors will be logged. See :py:meth:`.QuarantineStorage.record` '''
+    if _collected_failures is not None:
+        if apk_hash is not None:
+            _collected_failures.append((apk_hash, list(script_names), failure, details))
+        return
+
+    quarantine = get_quarantine()
+    if quarantine is not None and apk_hash is not None:
+        try:
+            quarantine.record(apk_hash, script_names, failure, details)
+        except DatabaseStoreException as e:
+            log.warn(e)
+
+def record_failures(failures):
+    ''' Record the `failures` (see :py:func:`.pop_collected_failures`) '''
+    for apk_hash, script_names, failure, details in failures or ():
+        record_failure(apk_hash, script_names, failure, details)
+
+def collect_failures():
+    ''' Collect the failures of this process instead of recording them
+    until :py:func:`.pop_collected_failures` is called.
+    Used by the workers of the distributed analysis. '''
+    global _collected_failures
+    _collected_failures = []
+
+def pop_collected_failures():
+    ''' Stop collecting the failures.
+
+    Returns
+    -------
+    list<tuple<str, list<str>, str, str>>
+        The failures collected (apk hash, script names, kind of failure, details).
+    '''
+    global _collected_failures
+    failures, _collected_failures = _collected_failures or [], None
+    return failures
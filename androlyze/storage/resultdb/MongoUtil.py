@@ -29,22 +29,7 @@ def escape_key(k):
     --------
     http://docs.mongodb.org/manual/faq/developers/#dollar-sign-operator-escaping
     '''
-    replaced_key = k
-    DOT = '.'
-    DOT_REPL = '_'
-
-    DOLLAR = '$'
-    DOLLAR_REPL = '_$'
-
-    # replace dot
-    if DOT in k:
-        replaced_key = k.replace(DOT, DOT_REPL)
-
-    # replace starting dollar
-    if k.startswith(DOLLAR):
-        replaced_key = k.replace(DOLLAR, DOLLAR_REPL, 1)
-
-    return replaced_key
+    return Util.escape_mongodb_key(k)
 
 def escape_keys(_dict):
     ''' Escape the keys in the `_dict` so that the `_dict` can be inserted into mongodb.
@@ -62,6 +47,22 @@ def escape_keys(_dict):
     '''
     return Util.escape_dict(_dict, escape_key, escape_keys = True, escape_values = False)
 
+def escape_keys_lazy(_dict):
+    ''' Escape the keys in the `_dict` so that the `_dict` can be inserted into mongodb.
+
+    Only the parts of the `_dict` with keys to escape are copied (see :py:func:`.Util.escape_keys_lazy`),
+    so it is the `_dict` itself if nothing has to be escaped.
+
+    Parameters
+    ----------
+    _dict : dict
+
+    Returns
+    -------
+    dict
+    '''
+    return Util.escape_keys_lazy(_dict, escape_key)
+
 
 ############################################################
 #---MongoDB query builder helper functions
@@ -17,7 +17,7 @@ from androlyze.storage.apk.ApkCopyInterface import ApkCopyInterface
 from androlyze.storage.exception import DatabaseOpenError, \
     DatabaseDeleteException, DatabaseStoreException, DatabaseLoadException
 from androlyze.storage.resultdb import MongoUtil
-from androlyze.storage.resultdb.MongoUtil import escape_keys, \
+from androlyze.storage.resultdb.MongoUtil import escape_keys, escape_keys_lazy, \
     MONGODB_IN_OPERATOR
 from androlyze.storage.resultdb.ResultsStorageInterface import ResultStorageInterface
 from bson.errors import BSONError
@@ -55,6 +55,9 @@ CONNECTION_FAIL_ERRORS = (ConnectionFailure, )
 
 MAX_BSON_SIZE = 16770000
 
+# max number of ids for a single $in query
+IN_QUERY_CHUNK_SIZE = 10000
+
 class ResultDatabaseStorage(object, ResultStorageInterface, ApkCopyInterface):
     ''' Class for storing documents and/or binary data in mongodb. '''
 
@@ -266,9 +269,12 @@ class ResultDatabaseStorage(object, ResultStorageInterface, ApkCopyInterface):
     #---ResultStorageInterface
     ############################################################
 
-    def store_result_for_apk(self, apk, script):
+    def store_result_for_apk(self, apk, script, result_dict = None, data = None):
         ''' See doc of :py:meth:`.ResultWritingInterface.store_result_for_apk`.
 
+        The keys are escaped only in a copy of the parts of the results which need it,
+        so the `result_dict` may be shared with the other storages (which store the keys unescaped).
+
         Returns
         -------
         tuple<str, bool>
@@ -278,14 +284,18 @@ class ResultDatabaseStorage(object, ResultStorageInterface, ApkCopyInterface):
             If an error occurred.
         '''
         try:
+            res_obj_dict = result_dict
+            if res_obj_dict is None:
+                res_obj_dict = script.result_dict(gen_id = False)
             # escape keys for mongodb insert
-            res_obj_dict = escape_keys(script.result_dict(gen_id = False))
+            res_obj_dict = escape_keys_lazy(res_obj_dict)
             _id = script.gen_unique_id()
 
             # if data is to big or custom result object used -> store with gridfs
             if script.uses_custom_result_object() or script.is_big_res():
                 log.debug("storing results for %s, %s in %s (id: %s)", apk.short_description(), script, self.grid_fs, _id)
-                result = self.get_custom_res_obj_representation(script)
+                # str or file-like object (streamed)
+                result = self.get_custom_res_obj_data(script, data)
 
                 gridfs = self.grid_fs
 
@@ -304,6 +314,8 @@ class ResultDatabaseStorage(object, ResultStorageInterface, ApkCopyInterface):
             else:
                 log.debug("storing results for %s, %s in %s db(id: %s)", apk.short_description(), script, self.res_coll, _id)
                 # set id so we don't have multiple results for same script and apk
+                # (on a shallow copy, the dict may be shared with other storages)
+                res_obj_dict = OrderedDict(res_obj_dict)
                 res_obj_dict[RESOBJ_ID] = _id
                 # update or insert if not existing
                 self.res_coll.update({RESOBJ_ID : _id}, res_obj_dict, upsert = True)
@@ -705,6 +717,47 @@ class ResultDatabaseStorage(object, ResultStorageInterface, ApkCopyInterface):
         '''
         return self.get_ids(non_document = True, where = where) + self.get_ids(non_document = False, where = where)
 
+    def get_script_hashes_for_ids(self, ids, exclude_partial = False):
+        '''
+        Get the hash of the script which created the result for each of the `ids`.
+        Looks into both, the document collection and gridfs.
+
+        The ids are queried in chunks of `IN_QUERY_CHUNK_SIZE`.
+
+        Parameters
+        ----------
+        ids : iterable<str>
+        exclude_partial : bool, optional (default is False)
+            Treat partial results (the script exceeded its `ResourceBudget`) as not stored.
+
+        Returns
+        -------
+        dict<str, str>
+            Id of the result to script hash.
+            Ids which are not in the database (or partial if `exclude_partial`) are not included.
+
+        Raises
+        ------
+        DatabaseLoadException
+        '''
+        ids = list(ids)
+        res = {}
+        for non_document in (False, True):
+            hash_attr = MongoUtil.get_attr_str(RESOBJ_SCRIPT_META, RESOBJ_SCRIPT_META_HASH, gridfs = non_document)
+            budget_attr = MongoUtil.get_attr_str(RESOBJ_SCRIPT_META, RESOBJ_SCRIPT_META_BUDGET_EXCEEDED, gridfs = non_document)
+
+            for i in xrange(0, len(ids), IN_QUERY_CHUNK_SIZE):
+                where = {RESOBJ_ID : {MONGODB_IN_OPERATOR : ids[i:i + IN_QUERY_CHUNK_SIZE]}}
+                for res_dict in self.get_results(where = where, include_fields = [hash_attr, budget_attr],
+                                                 non_document = non_document, remove_id_field = False, sort = False):
+                    script_meta = res_dict.get(GRIDFS_FILES_METADATA, {}) if non_document else res_dict
+                    script_meta = script_meta.get(RESOBJ_SCRIPT_META, {})
+                    if exclude_partial and script_meta.get(RESOBJ_SCRIPT_META_BUDGET_EXCEEDED) is not None:
+                        continue
+                    res[res_dict[RESOBJ_ID]] = script_meta.get(RESOBJ_SCRIPT_META_HASH)
+
+        return res
+
     def __recreate_collections(self, gridfs = False, res_collection = False):
         '''
         Drop and recreate collections.
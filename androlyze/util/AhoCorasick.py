@@ -0,0 +1,118 @@
+# encoding: utf-8
+
+__author__ = "Nils Tobias Schmidt"
+__email__ = "schmidt89 at informatik.uni-marburg.de"
+
+from collections import deque
+
+class AhoCorasick(object):
+    ''' Aho-Corasick automaton for finding many (literal) patterns in a text with one pass over the text.
+
+    The cost of a search only depends on the length of the text and the number of matches,
+    not on the number of patterns.
+
+    Examples
+    --------
+    >>> ac = AhoCorasick(["Ljava/net/Socket", "SSLSocket", "Lcom/adobe/air"])
+    >>> sorted(ac.find_all("Ljavax/net/ssl/SSLSocketFactory;"))
+    ['SSLSocket']
+    '''
+
+    def __init__(self, patterns):
+        '''
+        Parameters
+        ----------
+        patterns : iterable<str>
+            The patterns to search for. Empty patterns are ignored.
+        '''
+        self.__patterns = []
+        # transitions, failure link and matched patterns (indices) of each state, state 0 is the root
+        self.__goto = [{}]
+        self.__fail = [0]
+        self.__out = [[]]
+
+        for pattern in patterns:
+            self.__add_pattern(pattern)
+        self.__build_failure_links()
+
+    def __str__(self):
+        return '%s(%d patterns)' % (self.__class__.__name__, len(self.patterns))
+
+    def get_patterns(self):
+        return self.__patterns
+
+    patterns = property(get_patterns, None, None, "list<str> : The patterns.")
+
+    def __add_pattern(self, pattern):
+        if not pattern or pattern in self.__patterns:
+            return
+
+        goto = self.__goto
+        state = 0
+        for char in pattern:
+            next_state = goto[state].get(char)
+            if next_state is None:
+                goto.append({})
+                self.__fail.append(0)
+                self.__out.append([])
+                next_state = len(goto) - 1
+                goto[state][char] = next_state
+            state = next_state
+
+        self.__out[state].append(len(self.__patterns))
+        self.__patterns.append(pattern)
+
+    def __build_failure_links(self):
+        ''' Breadth first, the failure links of the states with depth 1 point to the root '''
+        goto, fail, out = self.__goto, self.__fail, self.__out
+
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in goto[state].iteritems():
+                queue.append(next_state)
+
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[next_state] = goto[fallback].get(char, 0)
+                # patterns which are a suffix of this one
+                out[next_state] = out[next_state] + out[fail[next_state]]
+
+    def iter_matches(self, text):
+        ''' Iterate over all occurrences of the patterns in `text`.
+
+        Parameters
+        ----------
+        text : str
+
+        Returns
+        -------
+        generator<tuple<int, str>>
+            Start index and pattern of each occurrence.
+        '''
+        goto, fail, out, patterns = self.__goto, self.__fail, self.__out, self.__patterns
+
+        state = 0
+        for pos, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for idx in out[state]:
+                pattern = patterns[idx]
+                yield pos - len(pattern) + 1, pattern
+
+    def find_all(self, text):
+        ''' Get the patterns occurring in `text`.
+
+        Returns
+        -------
+        set<str>
+        '''
+        return set(pattern for _, pattern in self.iter_matches(text))
+
+    def search(self, text):
+        ''' Check if any pattern occurs in `text` '''
+        for _ in self.iter_matches(text):
+            return True
+        return False
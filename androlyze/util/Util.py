@@ -10,6 +10,7 @@ Utility module
 
 from Queue import Empty
 import itertools
+import os
 from os.path import splitext
 import re
 import sys
@@ -38,6 +39,54 @@ def sha256(data):
     hasher.update(data)
     return hasher.hexdigest()
 
+def get_peak_rss():
+    '''
+    Get the peak resident set size of the current process.
+
+    Returns
+    -------
+    int
+        Peak RSS in KB.
+    None
+        If not available on this platform.
+    '''
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on mac os
+    if sys.platform == "darwin":
+        peak_rss /= 1024
+    return peak_rss
+
+def get_rss(pid = None):
+    '''
+    Get the current resident set size of the current process (or the process with `pid`).
+    Falls back to the peak RSS of the current process if not available on this platform.
+
+    Parameters
+    ----------
+    pid : int, optional (default is None)
+        Process id, the current process if not given.
+
+    Returns
+    -------
+    int
+        RSS in KB.
+    None
+        If not available on this platform or if the process doesn't exist.
+    '''
+    try:
+        with open("/proc/%s/statm" % ("self" if pid is None else pid)) as f:
+            # second field is the rss in pages
+            return int(f.read().split()[1]) * (os.sysconf("SC_PAGE_SIZE") / 1024)
+    except (IOError, OSError, ValueError, IndexError, AttributeError):
+        if pid is None:
+            return get_peak_rss()
+        return None
+
 def cs_classnames(class_list, sort = True):
     ''' Returns a comma separated str build from the name attribute '''
     class_names = [c.__name__ for c in class_list]
@@ -335,6 +384,21 @@ def split_n_uniform_distri(l, n = 10):
     '''
     return [l[i::n] for i in range(0, n)]
 
+def chunks(iterable, n):
+    ''' Split the `iterable` into lists of `n` consecutive elements (the last one may be shorter).
+
+    Examples
+    --------
+    >>> list(chunks(range(5), 2))
+    [[0, 1], [2, 3], [4]]
+    '''
+    it = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(it, n))
+        if not chunk:
+            break
+        yield chunk
+
 def clear_queue(queue):
     ''' Clear the queue by removing all elements (without blocking)
 
@@ -15,10 +15,11 @@ http://celery.readthedocs.org/en/latest/configuration.html
 from kombu.entity import Queue
 
 from androlyze.celery.CeleryConstants import CELERY_RETRY_INFINITE, \
-    get_analyze_task_name
+    get_analyze_task_name, get_analyze_chunk_task_name
 from androlyze.celery.celerysettings import settings as s
 from androlyze.settings import SECTION_BROKER, KEY_BROKER_URL, \
-    SECTION_ANALYSIS, KEY_ANALYSIS_SOFT_TIME_LIMIT, KEY_ANALYSIS_HARD_TIME_LIMIT
+    SECTION_ANALYSIS, KEY_ANALYSIS_SOFT_TIME_LIMIT, KEY_ANALYSIS_HARD_TIME_LIMIT, \
+    KEY_ANALYSIS_MAX_APKS_PER_WORKER, KEY_ANALYSIS_MAX_WORKER_MEMORY
 
 ############################################################
 #---Broker SSL
@@ -76,7 +77,8 @@ CELERY_QUEUES = (
 )
 
 # task -> queue routing
-CELERY_ROUTES = {get_analyze_task_name(): {'queue': CELERY_QUEUE_ANALYZE_APK}}
+CELERY_ROUTES = {get_analyze_task_name(): {'queue': CELERY_QUEUE_ANALYZE_APK},
+                 get_analyze_chunk_task_name(): {'queue': CELERY_QUEUE_ANALYZE_APK}}
 
 # create missing queues
 CELERY_CREATE_MISSING_QUEUES = True
@@ -118,8 +120,16 @@ CELERYD_TASK_TIME_LIMIT = s.get_int((SECTION_ANALYSIS, KEY_ANALYSIS_HARD_TIME_LI
 if CELERYD_TASK_TIME_LIMIT is not None:
     CELERYD_TASK_TIME_LIMIT *= 60
 
-# reuse processes
-CELERYD_MAX_TASKS_PER_CHILD = None
+# replace a worker process after it executed this number of tasks
+# None means reuse processes forever
+CELERYD_MAX_TASKS_PER_CHILD = s.get_int((SECTION_ANALYSIS, KEY_ANALYSIS_MAX_APKS_PER_WORKER), default = None)
+
+# replace a worker process after its resident memory exceeded this value (in KB)
+# (celery >= 4.0, ignored by older versions)
+CELERYD_MAX_MEMORY_PER_CHILD = s.get_int((SECTION_ANALYSIS, KEY_ANALYSIS_MAX_WORKER_MEMORY), default = None)
+if CELERYD_MAX_MEMORY_PER_CHILD is not None:
+    # MB -> KB
+    CELERYD_MAX_MEMORY_PER_CHILD *= 1024
 
 ############################################################
 #---Task publishing
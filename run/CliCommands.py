@@ -20,10 +20,16 @@ SUBCOMMAND_QUERY_IMPORT = "import"
 SUBCOMMAND_QUERY_RESULT = "result"
 
 COMMAND_DELETE = "delete"
+COMMAND_QUARANTINE = "quarantine"
 COMMANDS_ALL = (COMMAND_ANALYZE, COMMAND_IMPORT,
                 COMMAND_QUERY, COMMAND_SYNC,
-                COMMAND_DELETE, COMMAND_EVAL)
+                COMMAND_DELETE, COMMAND_EVAL,
+                COMMAND_QUARANTINE)
 
 # available commands for delete
 SUBCOMMAND_DELETE_IMPORT = "import"
-SUBCOMMAND_DELETE_RESULT = "result"
\ No newline at end of file
+SUBCOMMAND_DELETE_RESULT = "result"
+
+# available commands for quarantine
+SUBCOMMAND_QUARANTINE_LIST = "list"
+SUBCOMMAND_QUARANTINE_CLEAR = "clear"
@@ -8,7 +8,8 @@ import itertools
 
 from CliCommands import COMMANDS_ALL, COMMAND_QUERY, COMMAND_SYNC, \
     COMMAND_IMPORT, COMMAND_ANALYZE, COMMAND_EVAL, COMMAND_DELETE, SUBCOMMAND_QUERY_IMPORT, \
-    SUBCOMMAND_QUERY_RESULT, SUBCOMMAND_DELETE_IMPORT, SUBCOMMAND_DELETE_RESULT
+    SUBCOMMAND_QUERY_RESULT, SUBCOMMAND_DELETE_IMPORT, SUBCOMMAND_DELETE_RESULT, \
+    COMMAND_QUARANTINE, SUBCOMMAND_QUARANTINE_LIST, SUBCOMMAND_QUARANTINE_CLEAR
 from androlyze import settings, ANALYZE_MODE_DISTRIBUTED, \
     ANALYZE_MODE_NON_PARALLEL, ANALYZE_MODE_PARALLEL, Constants
 import androlyze
@@ -194,6 +195,9 @@ class AndroLyzeLabRunner(object):
             if cmd == COMMAND_QUERY:
                 self.action_query(hashes, package_names, tags, yes)
 
+            elif cmd == COMMAND_QUARANTINE:
+                self.action_quarantine(parser, hashes, yes)
+
             # dblyze -> do the analysis results evaluation            
             elif cmd == COMMAND_EVAL:
                 dblyze_scripts = ScriptUtil.import_scripts(args.scripts, clazz_name = "Eval")
@@ -254,7 +258,8 @@ No update of already present apks in database will be done!''')
                         analyze_mode = ANALYZE_MODE_PARALLEL
                     action_analyze(self.storage, scripts, apks_or_paths,
                                    mode = analyze_mode, concurrency = concurrency,
-                                   serialize_apks = not send_id)
+                                   serialize_apks = not send_id, incremental = args.incremental,
+                                   dedup_dex = args.dedup_dex)
                 # delete command
                 elif cmd == COMMAND_DELETE:
                     self.action_delete(parser, hashes, package_names, tags, yes)
@@ -377,6 +382,26 @@ class CliRunner(AndroLyzeLabRunner):
             # log results
             print_query_result_db(res, distict_generator=distinct_key is not None, count=args.count, raw=raw, interactive = not args.not_interactive)
 
+    def action_quarantine(self, parser, hashes, yes):
+        ''' List or clear the quarantine '''
+        from androlyze.storage.quarantine.QuarantineStorage import get_quarantine
+
+        args = self.args
+        quarantine = get_quarantine()
+        if quarantine is None:
+            raise CLIError('The quarantine is disabled (or could not be opened)! See section "Quarantine" in the config file.', parser)
+
+        if args.quarantine == SUBCOMMAND_QUARANTINE_LIST:
+            entries = androlyze.action_quarantine_list(quarantine, hashes)
+            clilog.info('\n'.join(entries) if entries else "Quarantine is empty")
+        elif args.quarantine == SUBCOMMAND_QUARANTINE_CLEAR:
+            whole_db = args.all
+            n = cli_check_n_exec(androlyze.action_quarantine_clear,
+                                 prompt_prefix = "Do you really want to release all apks from the quarantine?",
+                                 circumvent_check = yes or not whole_db,
+                                 args = (quarantine, hashes, whole_db))
+            clilog.info("Deleted %s entries from %s" % (n, quarantine))
+
     def action_delete(self, parser, hashes, package_names, tags, yes):
         ''' Delete from the database specified by `parser` args '''
 